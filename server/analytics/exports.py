@@ -0,0 +1,228 @@
+"""
+Columnar exports for BI.
+
+Order lines (one row per OrderItem with its order's columns) are written as a
+hive-partitioned Parquet or Arrow IPC dataset, order_lines/order_date=YYYY-MM-DD/, and the
+product dimension as a full snapshot, products/. Rows are read in keyset chunks and
+converted straight to typed Arrow columns, so memory stays bounded by the chunk size.
+
+Runs are incremental from a watermark on Order.updated_at: an order changed since the
+last run is exported again, in a new file of its partition. Readers keep the row with the
+latest order_updated_at per order_item_id.
+"""
+import logging
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from order.models import Order, OrderItem, OrderStatusChoices, PaymentStatusChoices
+from products.models import Product
+from .models import RollupWatermark
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # pyarrow is optional, only needed for the exports
+    pa = ds = None
+
+logger = logging.getLogger(__name__)
+
+WATERMARK = 'bi_export_order_lines'
+LOCK_KEY = 'analytics:bi_export:lock'
+LOCK_TIMEOUT = 60 * 60
+OVERLAP = timedelta(minutes=5)
+FORMATS = {'parquet': 'parquet', 'arrow': 'ipc'}
+
+default_settings = {
+    'DIR': Path(settings.BASE_DIR) / 'data' / 'exports',
+    'FORMAT': 'parquet',
+    'CHUNK_SIZE': 50000,  # order lines per Arrow table
+}
+
+ORDER_LINE_FIELDS = (
+    ('order_item_id', 'id'),
+    ('order_id', 'order_id'),
+    ('order_number', 'order__order_number'),
+    ('user_id', 'order__user_id'),
+    ('product_id', 'product_id'),
+    ('sku_id', 'sku_id'),
+    ('category_id', 'product__category_id'),
+    ('brand_id', 'product__brand_id'),
+    ('quantity', 'quantity'),
+    ('unit_price', 'unit_price'),
+    ('subtotal', 'subtotal'),
+    ('order_status', 'order__status'),
+    ('payment_status', 'order__payment_status'),
+    ('city', 'order__city'),
+    ('voucher_id', 'order__voucher_id'),
+    ('order_discount', 'order__discount_amount'),
+    ('order_created_at', 'order__created_at'),
+    ('order_updated_at', 'order__updated_at'),
+)
+
+PRODUCT_FIELDS = (
+    ('product_id', 'id'),
+    ('name', 'name'),
+    ('category_id', 'category_id'),
+    ('category', 'category__label'),
+    ('brand_id', 'brand_id'),
+    ('brand', 'brand__name'),
+    ('base_price', 'base_price'),
+    ('discount_price', 'discount_price'),
+    ('stock_quantity', 'stock_quantity'),
+    ('weight', 'weight'),
+)
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+def get_export_settings():
+    return {**default_settings, **getattr(settings, 'BI_EXPORT', {})}
+
+
+def money():
+    return pa.decimal128(10, 2)
+
+
+def timestamp():
+    return pa.timestamp('us', tz='UTC')
+
+
+def status_type():
+    # categorical: stored once per column chunk, read as pandas Categorical
+    return pa.dictionary(pa.int8(), pa.string())
+
+
+def order_line_schema():
+    return pa.schema([
+        ('order_item_id', pa.int64()),
+        ('order_id', pa.int64()),
+        ('order_number', pa.string()),
+        ('user_id', pa.int64()),
+        ('product_id', pa.int64()),
+        ('sku_id', pa.int64()),
+        ('category_id', pa.int64()),
+        ('brand_id', pa.int64()),
+        ('quantity', pa.int32()),
+        ('unit_price', money()),
+        ('subtotal', money()),
+        ('order_status', status_type()),
+        ('payment_status', status_type()),
+        ('city', pa.string()),
+        ('voucher_id', pa.int64()),
+        ('order_discount', money()),
+        ('order_created_at', timestamp()),
+        ('order_updated_at', timestamp()),
+        ('order_date', pa.string()),
+    ])
+
+
+def product_schema():
+    return pa.schema([
+        ('product_id', pa.int64()),
+        ('name', pa.string()),
+        ('category_id', pa.int64()),
+        ('category', pa.string()),
+        ('brand_id', pa.int64()),
+        ('brand', pa.string()),
+        ('base_price', money()),
+        ('discount_price', money()),
+        ('stock_quantity', pa.int64()),
+        ('weight', pa.decimal128(8, 3)),
+    ])
+
+
+def labels(values, choices):
+    names = dict(choices.choices)
+    return [names.get(value) for value in values]
+
+
+def order_lines_table(rows):
+    columns = dict(zip((name for name, _ in ORDER_LINE_FIELDS), map(list, zip(*rows))))
+    columns['order_status'] = labels(columns['order_status'], OrderStatusChoices)
+    columns['payment_status'] = labels(columns['payment_status'], PaymentStatusChoices)
+    columns['order_date'] = [timezone.localtime(created).date().isoformat() for created in columns['order_created_at']]
+    schema = order_line_schema()
+    return pa.table([pa.array(columns[field.name], type=field.type) for field in schema], schema=schema)
+
+
+def changed_order_ids(since, until, chunk_size):
+    """
+    Ids of the orders changed in (since, until], in id order, chunk by chunk (keyset).
+    """
+    orders = Order.objects.filter(updated_at__lte=until)
+    if since is not None:
+        orders = orders.filter(updated_at__gt=since - OVERLAP)
+    last_id = 0
+    while True:
+        ids = list(orders.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def write(table, base_dir, file_format, basename, partitioning=None):
+    ds.write_dataset(
+        table, base_dir, format=FORMATS[file_format], partitioning=partitioning, partitioning_flavor='hive',
+        basename_template=f'{basename}-{{i}}.{file_format}', existing_data_behavior='overwrite_or_ignore',
+    )
+
+
+def export_products(base_dir, file_format):
+    rows = list(Product.objects.order_by('id').values_list(*(field for _, field in PRODUCT_FIELDS)))
+    schema = product_schema()
+    columns = list(zip(*rows)) or [[] for _ in schema]
+    table = pa.table([pa.array(list(column), type=field.type) for column, field in zip(columns, schema)], schema=schema)
+    # a full snapshot, replacing the previous one
+    ds.write_dataset(table, base_dir / 'products', format=FORMATS[file_format],
+                     basename_template=f'products-{{i}}.{file_format}', existing_data_behavior='delete_matching')
+    return table.num_rows
+
+
+def export_order_lines(full=False, file_format=None, base_dir=None, chunk_size=None):
+    """
+    Export the order lines changed since the last run (all of them with `full`) and a
+    fresh product snapshot. Returns {'order_lines': n, 'products': n}, None when another
+    export is running.
+    """
+    if pa is None:
+        raise ExportUnavailable("pyarrow is required for BI exports: pip install pyarrow")
+    conf = get_export_settings()
+    file_format = file_format or conf['FORMAT']
+    base_dir = Path(base_dir or conf['DIR'])
+    chunk_size = chunk_size or conf['CHUNK_SIZE']
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown export format {file_format}, use one of {', '.join(FORMATS)}")
+
+    if not cache.add(LOCK_KEY, 1, timeout=LOCK_TIMEOUT):
+        return None
+    try:
+        watermark, _ = RollupWatermark.objects.get_or_create(name=WATERMARK)
+        until = timezone.now()
+        run_id = f"{until:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+        exported = chunk = 0
+        # an order has a few lines: chunk the orders so a table holds about chunk_size lines
+        for order_ids in changed_order_ids(None if full else watermark.value, until, max(chunk_size // 4, 1)):
+            rows = list(OrderItem.objects.filter(order_id__in=order_ids).order_by('order_id', 'id')
+                        .values_list(*(field for _, field in ORDER_LINE_FIELDS)))
+            if not rows:
+                continue
+            write(order_lines_table(rows), base_dir / 'order_lines', file_format, f'{run_id}-{chunk}', ['order_date'])
+            exported += len(rows)
+            chunk += 1
+
+        products = export_products(base_dir, file_format)
+        watermark.value = until
+        watermark.save(update_fields=['value', 'updated_at'])
+        logger.info(f"BI export {run_id}: {exported} order lines, {products} products")
+        return {'order_lines': exported, 'products': products}
+    finally:
+        cache.delete(LOCK_KEY)
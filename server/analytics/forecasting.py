@@ -0,0 +1,162 @@
+"""
+Demand forecasts and reorder suggestions.
+
+Daily units sold per stock item over the history window are loaded with one grouped
+query into an (items x days) NumPy matrix. The forecast (simple moving average or
+exponential smoothing), the demand deviation, the reorder point and the order quantity
+are then computed for all items at once with array operations, so the cost is a few
+passes over the matrix however many SKUs there are.
+
+    reorder point = demand * lead time + z * std * sqrt(lead time)
+    order up to   = reorder point + demand * review period
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from order.models import OrderItem, OrderStatusChoices
+from products.models import Product, SKU
+from .models import ReorderSuggestion
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only needed for the forecasts
+    np = None
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('sma', 'ema')
+EXCLUDED_STATUSES = (OrderStatusChoices.CANCELLED, OrderStatusChoices.REFUNDED)
+WRITE_BATCH_SIZE = 5000
+
+default_settings = {
+    'HISTORY_DAYS': 56,
+    'METHOD': 'ema',
+    'ALPHA': 0.3,  # exponential smoothing weight of the newest day
+    'SMA_DAYS': 14,
+    'LEAD_TIME_DAYS': 7,  # supplier delivery time
+    'REVIEW_DAYS': 7,  # time until the next purchasing round
+    'SERVICE_Z': 1.65,  # safety stock factor, 1.65 ~ 95% service level
+}
+
+
+class ForecastUnavailable(Exception):
+    pass
+
+
+def get_forecast_settings():
+    return {**default_settings, **getattr(settings, 'FORECAST', {})}
+
+
+def load_daily_sales(start, days):
+    """
+    ([(product_id, sku_id)], units matrix of shape (items, days)) of the items sold since
+    `start`, day 0 being `start`.
+    """
+    rows = list(
+        OrderItem.objects.order_by()
+        .filter(order__created_at__gte=start)
+        .exclude(order__status__in=EXCLUDED_STATUSES)
+        .values_list('product_id', 'sku_id', TruncDate('order__created_at'))
+        .annotate(units=Sum('quantity'))
+    )
+    items = list(dict.fromkeys((product_id, sku_id) for product_id, sku_id, _, _ in rows))
+    index = {item: i for i, item in enumerate(items)}
+    sales = np.zeros((len(items), days), dtype=np.float32)
+    if rows:
+        item_idx = np.fromiter((index[(product_id, sku_id)] for product_id, sku_id, _, _ in rows), dtype=np.int64, count=len(rows))
+        day_idx = np.fromiter(((day - start.date()).days for _, _, day, _ in rows), dtype=np.int64, count=len(rows))
+        units = np.fromiter((units for _, _, _, units in rows), dtype=np.float32, count=len(rows))
+        inside = (day_idx >= 0) & (day_idx < days)
+        np.add.at(sales, (item_idx[inside], day_idx[inside]), units[inside])
+    return items, sales
+
+
+def forecast_demand(sales, method, alpha, sma_days):
+    """
+    Daily demand forecast per row of `sales`.
+    """
+    if method == 'sma':
+        return sales[:, -sma_days:].mean(axis=1)
+    level = sales[:, 0].copy()
+    for day in range(1, sales.shape[1]):
+        level += alpha * (sales[:, day] - level)
+    return level
+
+
+def current_stock(items):
+    """
+    Stock per item, NaN where none is tracked.
+    """
+    sku_stock = dict(SKU.objects.filter(id__in={sku_id for _, sku_id in items if sku_id})
+                     .values_list('id', 'stock_quantity'))
+    product_stock = dict(Product.objects.filter(id__in={product_id for product_id, sku_id in items if not sku_id})
+                         .values_list('id', 'stock_quantity'))
+    stock = (sku_stock.get(sku_id) if sku_id else product_stock.get(product_id) for product_id, sku_id in items)
+    return np.fromiter((np.nan if value is None else value for value in stock), dtype=np.float64, count=len(items))
+
+
+def reorder_plan(sales, stock, conf):
+    """
+    Vectorized forecast and reorder maths for all items, returns a dict of arrays.
+    """
+    demand = forecast_demand(sales, conf['METHOD'], conf['ALPHA'], conf['SMA_DAYS']).astype(np.float64)
+    std = sales.std(axis=1).astype(np.float64)
+    lead_time = conf['LEAD_TIME_DAYS']
+    reorder_point = np.ceil(demand * lead_time + conf['SERVICE_Z'] * std * np.sqrt(lead_time))
+    order_up_to = reorder_point + np.ceil(demand * conf['REVIEW_DAYS'])
+    suggested = np.where(stock <= reorder_point, np.maximum(order_up_to - stock, 0), 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(demand > 0, stock / demand, np.nan)
+    return {
+        'demand': demand,
+        'std': std,
+        'reorder_point': reorder_point,
+        'suggested': suggested,
+        'days_of_cover': days_of_cover,
+    }
+
+
+def compute_reorder_suggestions(method=None):
+    """
+    Recompute every suggestion from the sales of the last HISTORY_DAYS days and replace
+    the ReorderSuggestion table. Returns the number of suggestions written.
+    """
+    if np is None:
+        raise ForecastUnavailable("numpy is required for demand forecasts: pip install numpy")
+    conf = get_forecast_settings()
+    if method:
+        conf['METHOD'] = method
+    if conf['METHOD'] not in METHODS:
+        raise ValueError(f"Unknown forecast method {conf['METHOD']}, use one of {', '.join(METHODS)}")
+
+    now = timezone.now()
+    days = conf['HISTORY_DAYS']
+    start = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+    items, sales = load_daily_sales(start, days)
+    stock = current_stock(items)
+    tracked = ~np.isnan(stock)
+    plan = reorder_plan(sales[tracked], stock[tracked], conf)
+    items = [item for item, keep in zip(items, tracked) if keep]
+    stock = stock[tracked]
+
+    suggestions = [
+        ReorderSuggestion(
+            product_id=product_id, sku_id=sku_id, stock_quantity=int(stock[i]),
+            daily_demand=round(float(plan['demand'][i]), 3), demand_std=round(float(plan['std'][i]), 3),
+            reorder_point=int(plan['reorder_point'][i]), suggested_quantity=int(plan['suggested'][i]),
+            days_of_cover=None if np.isnan(plan['days_of_cover'][i]) else round(float(plan['days_of_cover'][i]), 1),
+            method=conf['METHOD'], computed_at=now,
+        )
+        for i, (product_id, sku_id) in enumerate(items)
+    ]
+    with transaction.atomic():
+        ReorderSuggestion.objects.all().delete()
+        ReorderSuggestion.objects.bulk_create(suggestions, batch_size=WRITE_BATCH_SIZE)
+    logger.info(f"Reorder suggestions: {len(suggestions)} items, {int((plan['suggested'] > 0).sum())} to reorder")
+    return len(suggestions)
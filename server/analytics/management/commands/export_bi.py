@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.exports import export_order_lines, ExportUnavailable, FORMATS
+
+
+class Command(BaseCommand):
+    help = "Export order lines and the product dimension as a partitioned Parquet/Arrow dataset for BI."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Export every order, not only those changed since the last run.")
+        parser.add_argument('--format', choices=list(FORMATS), help="Defaults to BI_EXPORT['FORMAT'].")
+        parser.add_argument('--output', help="Dataset directory, defaults to BI_EXPORT['DIR'].")
+        parser.add_argument('--chunk-size', type=int, help="Order lines per file.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            result = export_order_lines(full=options['full'], file_format=options['format'],
+                                        base_dir=options['output'], chunk_size=options['chunk_size'])
+        except ExportUnavailable as e:
+            raise CommandError(str(e))
+        if result is None:
+            raise CommandError("Another export is running.")
+        self.stdout.write(f"Exported {result['order_lines']} order lines and {result['products']} products "
+                          f"in {time.monotonic() - started:.1f}s")
@@ -0,0 +1,83 @@
+from django.db import models
+
+
+class GranularityChoices(models.TextChoices):
+    HOUR = 'hour', 'Hour'
+    DAY = 'day', 'Day'
+
+
+class DimensionChoices(models.TextChoices):
+    STORE = 'store', 'Store'
+    PRODUCT = 'product', 'Product'
+    CATEGORY = 'category', 'Category'
+    BRAND = 'brand', 'Brand'
+    VOUCHER = 'voucher', 'Voucher'
+
+
+class SalesRollup(models.Model):
+    """
+    Sales of one product/category/brand/voucher (or the whole store, dimension_id 0) in one
+    hour or day, kept up to date by analytics.rollups. Cancelled and refunded orders are
+    left out.
+    """
+    granularity = models.CharField(max_length=10, choices=GranularityChoices.choices)
+    bucket = models.DateTimeField(help_text="Start of the hour/day (local time).")
+    dimension = models.CharField(max_length=20, choices=DimensionChoices.choices)
+    dimension_id = models.BigIntegerField()
+    label = models.CharField(max_length=255, blank=True, default='',
+                             help_text="Product name, category label, brand name or voucher code.")
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['granularity', 'dimension', 'dimension_id', 'bucket'],
+                                    name='sales_rollup_unique_bucket'),
+        ]
+        indexes = [
+            # dashboard reads: one dimension over a time range
+            models.Index(fields=['granularity', 'dimension', 'bucket'], name='sales_rollup_range_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension} {self.dimension_id} {self.granularity} {self.bucket:%Y-%m-%d %H:%M}"
+
+
+class RollupWatermark(models.Model):
+    """
+    How far an incremental job has read its source: rows changed after `value` are
+    still to be processed.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    value = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class ReorderSuggestion(models.Model):
+    """
+    Forecast demand and restock advice for one stock item (a SKU, or a product sold
+    without SKUs), rewritten by every analytics.forecasting run.
+    """
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='+')
+    sku = models.ForeignKey('products.SKU', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    stock_quantity = models.IntegerField()
+    daily_demand = models.FloatField(help_text="Forecast units sold per day.")
+    demand_std = models.FloatField(help_text="Standard deviation of daily sales over the history window.")
+    reorder_point = models.PositiveIntegerField(help_text="Restock when stock falls to this level.")
+    suggested_quantity = models.PositiveIntegerField(help_text="Units to order now, 0 when stock is sufficient.")
+    days_of_cover = models.FloatField(null=True, blank=True, help_text="Days the current stock lasts at forecast demand.")
+    method = models.CharField(max_length=10)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-suggested_quantity', 'days_of_cover'], name='reorder_suggestion_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.sku_id or self.product_id}: order {self.suggested_quantity}"
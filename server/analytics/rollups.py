@@ -0,0 +1,173 @@
+"""
+Incremental sales rollups.
+
+Every run reads the orders created or changed since the watermark (updated_at), finds the
+hours they were created in and recomputes exactly those hourly buckets from the source
+tables, then the days containing them from the hourly rows. Recomputing whole buckets
+instead of adding deltas makes a run idempotent: status changes (a cancelled order
+leaving the totals) and runs overlapping each other come out right.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum, Max, Q, F
+from django.db.models.functions import TruncHour, TruncDay
+from django.utils import timezone
+
+from order.models import Order, OrderItem, OrderStatusChoices
+from .models import SalesRollup, RollupWatermark, GranularityChoices, DimensionChoices
+
+logger = logging.getLogger(__name__)
+
+WATERMARK = 'sales_rollups'
+LOCK_KEY = 'analytics:sales_rollups:lock'
+LOCK_TIMEOUT = 60 * 30
+# re-read this much before the watermark: rows committed late carry an older updated_at
+OVERLAP = timedelta(minutes=5)
+CHUNK_DAYS = 7
+EXCLUDED_STATUSES = (OrderStatusChoices.CANCELLED, OrderStatusChoices.REFUNDED)
+
+# (dimension, id field, label field) on OrderItem
+ITEM_DIMENSIONS = (
+    (DimensionChoices.PRODUCT, 'product_id', 'product__name'),
+    (DimensionChoices.CATEGORY, 'product__category_id', 'product__category__label'),
+    (DimensionChoices.BRAND, 'product__brand_id', 'product__brand__name'),
+    (DimensionChoices.VOUCHER, 'order__voucher_id', 'order__voucher__code'),
+)
+STORE_ID = 0
+ZERO = Decimal('0.00')
+
+
+def dirty_hours(since):
+    """
+    Local hours holding orders created or changed after `since` (all orders when None).
+    """
+    orders = Order.objects.order_by()
+    if since is not None:
+        orders = orders.filter(updated_at__gt=since - OVERLAP)
+    return sorted(set(orders.values_list(TruncHour('created_at'), flat=True).distinct()))
+
+
+def hour_ranges(hours):
+    """
+    Merge sorted hour starts into [start, end) ranges.
+    """
+    ranges = []
+    for hour in hours:
+        if ranges and ranges[-1][1] == hour:
+            ranges[-1][1] = hour + timedelta(hours=1)
+        else:
+            ranges.append([hour, hour + timedelta(hours=1)])
+    return ranges
+
+
+def in_ranges(field, ranges):
+    query = Q()
+    for start, end in ranges:
+        query |= Q(**{f'{field}__gte': start, f'{field}__lt': end})
+    return query
+
+
+def compute_hourly(ranges):
+    """
+    Hourly rollup rows of the hours in `ranges`: one grouped query per dimension.
+    """
+    rows = {}
+
+    def row(dimension, dimension_id, hour, label=''):
+        key = (dimension, dimension_id, hour)
+        if key not in rows:
+            rows[key] = SalesRollup(granularity=GranularityChoices.HOUR, bucket=hour, dimension=dimension,
+                                    dimension_id=dimension_id, label=label or '', revenue=ZERO, discount=ZERO)
+        return rows[key]
+
+    items = (OrderItem.objects.order_by()
+             .filter(in_ranges('order__created_at', ranges))
+             .exclude(order__status__in=EXCLUDED_STATUSES)
+             .annotate(hour=TruncHour('order__created_at')))
+    totals = {'orders': Count('order_id', distinct=True), 'units': Sum('quantity'), 'revenue': Sum('subtotal')}
+
+    for values in items.values('hour').annotate(**totals):
+        rollup = row(DimensionChoices.STORE, STORE_ID, values['hour'])
+        rollup.orders, rollup.units, rollup.revenue = values['orders'], values['units'], values['revenue']
+
+    for dimension, id_field, label_field in ITEM_DIMENSIONS:
+        grouped = (items.filter(**{f'{id_field}__isnull': False})
+                   .values('hour', dimension_id=F(id_field))
+                   .annotate(label=Max(label_field), **totals))
+        for values in grouped:
+            rollup = row(dimension, values['dimension_id'], values['hour'], values['label'])
+            rollup.orders, rollup.units, rollup.revenue = values['orders'], values['units'], values['revenue']
+
+    # discounts are per order, not per item
+    discounts = (Order.objects.order_by()
+                 .filter(in_ranges('created_at', ranges), voucher__isnull=False)
+                 .exclude(status__in=EXCLUDED_STATUSES)
+                 .values(hour=TruncHour('created_at'), dimension_id=F('voucher_id'))
+                 .annotate(discount=Sum('discount_amount')))
+    for values in discounts:
+        row(DimensionChoices.STORE, STORE_ID, values['hour']).discount += values['discount']
+        row(DimensionChoices.VOUCHER, values['dimension_id'], values['hour']).discount += values['discount']
+
+    return list(rows.values())
+
+
+def compute_daily(day_ranges):
+    """
+    Daily rows of the days in `day_ranges`, summed from their (already current) hourly rows.
+    """
+    grouped = (SalesRollup.objects.order_by()
+               .filter(in_ranges('bucket', day_ranges), granularity=GranularityChoices.HOUR)
+               .values('dimension', 'dimension_id', day=TruncDay('bucket'))
+               .annotate(label=Max('label'), orders=Sum('orders'), units=Sum('units'),
+                         revenue=Sum('revenue'), discount=Sum('discount')))
+    return [
+        SalesRollup(granularity=GranularityChoices.DAY, bucket=values.pop('day'), **values)
+        for values in grouped
+    ]
+
+
+def rebuild_buckets(hours):
+    """
+    Replace the hourly rollups of `hours` and the daily rollups of their days, atomically.
+    """
+    ranges = hour_ranges(hours)
+    days = sorted({timezone.localtime(hour).replace(hour=0) for hour in hours})
+    day_ranges = [(day, day + timedelta(days=1)) for day in days]
+    with transaction.atomic():
+        SalesRollup.objects.filter(in_ranges('bucket', ranges), granularity=GranularityChoices.HOUR).delete()
+        SalesRollup.objects.bulk_create(compute_hourly(ranges))
+        SalesRollup.objects.filter(in_ranges('bucket', day_ranges), granularity=GranularityChoices.DAY).delete()
+        SalesRollup.objects.bulk_create(compute_daily(day_ranges))
+
+
+def update_sales_rollups():
+    """
+    Bring the rollups up to date with the orders changed since the last run, CHUNK_DAYS of
+    touched days per transaction. Returns the number of hours recomputed, None when
+    another run holds the lock.
+    """
+    if not cache.add(LOCK_KEY, 1, timeout=LOCK_TIMEOUT):
+        return None
+    try:
+        watermark, _ = RollupWatermark.objects.get_or_create(name=WATERMARK)
+        started = timezone.now()
+        hours = dirty_hours(watermark.value)
+
+        by_day = defaultdict(list)
+        for hour in hours:
+            by_day[timezone.localtime(hour).date()].append(hour)
+        days = sorted(by_day)
+        for i in range(0, len(days), CHUNK_DAYS):
+            rebuild_buckets([hour for day in days[i:i + CHUNK_DAYS] for hour in by_day[day]])
+
+        watermark.value = started
+        watermark.save(update_fields=['value', 'updated_at'])
+        logger.info(f"Sales rollups: recomputed {len(hours)} hours over {len(days)} days")
+        return len(hours)
+    finally:
+        cache.delete(LOCK_KEY)
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import SalesRollup, ReorderSuggestion, GranularityChoices, DimensionChoices
+
+
+class SalesRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SalesRollup
+        fields = ['bucket', 'dimension_id', 'label', 'orders', 'units', 'revenue', 'discount']
+
+
+class SalesRankingSerializer(serializers.Serializer):
+    dimension_id = serializers.IntegerField()
+    label = serializers.CharField()
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=16, decimal_places=2)
+    discount = serializers.DecimalField(max_digits=16, decimal_places=2)
+
+
+class SalesQuerySerializer(serializers.Serializer):
+    dimension = serializers.ChoiceField(choices=DimensionChoices.choices, default=DimensionChoices.STORE)
+    granularity = serializers.ChoiceField(choices=GranularityChoices.choices, default=GranularityChoices.DAY)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    ids = serializers.CharField(required=False, help_text="Comma separated dimension ids.")
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=100, default=10)
+
+    max_days = {GranularityChoices.HOUR: 31, GranularityChoices.DAY: 366 * 2}
+
+    def validate_ids(self, value):
+        try:
+            return [int(pk) for pk in value.split(',') if pk.strip()]
+        except ValueError:
+            raise serializers.ValidationError("Ids must be integers.")
+
+    def validate(self, attrs):
+        attrs.setdefault('date_to', timezone.localdate())
+        attrs.setdefault('date_from', attrs['date_to'] - timedelta(days=29))
+        days = (attrs['date_to'] - attrs['date_from']).days + 1
+        if days < 1:
+            raise serializers.ValidationError("date_from must not be after date_to.")
+        if days > self.max_days[attrs['granularity']]:
+            raise serializers.ValidationError(
+                f"At most {self.max_days[attrs['granularity']]} days of {attrs['granularity']} buckets per request."
+            )
+        return attrs
+
+
+class ReorderSuggestionSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    sku_code = serializers.CharField(source='sku.sku_code', read_only=True, default=None)
+
+    class Meta:
+        model = ReorderSuggestion
+        fields = ['id', 'product', 'product_name', 'sku', 'sku_code', 'stock_quantity', 'daily_demand', 'demand_std',
+                  'reorder_point', 'suggested_quantity', 'days_of_cover', 'method', 'computed_at']
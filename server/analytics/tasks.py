@@ -0,0 +1,29 @@
+from celery import shared_task
+
+from analytics.exports import export_order_lines
+from analytics.forecasting import compute_reorder_suggestions
+from analytics.rollups import update_sales_rollups
+
+
+@shared_task(name='update_sales_rollups')
+def update_sales_rollups_task():
+    """
+    Fold orders changed since the last run into the sales rollups, see analytics.rollups.
+    """
+    return update_sales_rollups()
+
+
+@shared_task(name='export_order_lines')
+def export_order_lines_task(full=False):
+    """
+    Write order lines changed since the last export to the BI dataset, see analytics.exports.
+    """
+    return export_order_lines(full=full)
+
+
+@shared_task(name='compute_reorder_suggestions')
+def compute_reorder_suggestions_task():
+    """
+    Recompute demand forecasts and reorder suggestions, see analytics.forecasting.
+    """
+    return compute_reorder_suggestions()
@@ -0,0 +1,13 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import SalesViewSet, ReorderSuggestionViewSet
+
+app_name = 'analytics'
+
+router = DefaultRouter()
+router.register(r'sales', SalesViewSet, basename='sales')
+router.register(r'reorder-suggestions', ReorderSuggestionViewSet, basename='reorder-suggestions')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
@@ -0,0 +1,84 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Sum, Max
+from django.utils import timezone
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from core.Utiilties.enum import PermissionEnum
+from core.Utiilties.permission_chacker import HasPermissionMixin
+from .models import SalesRollup, ReorderSuggestion, GranularityChoices
+from .serializers import SalesRollupSerializer, SalesRankingSerializer, SalesQuerySerializer, ReorderSuggestionSerializer
+
+
+def bucket_range(date_from, date_to):
+    start = timezone.make_aware(datetime.combine(date_from, time.min))
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+    return start, end
+
+
+class SalesViewSet(HasPermissionMixin, viewsets.GenericViewSet):
+    """
+    Sales dashboard, read from the rollup tables only (analytics.rollups): a request
+    costs one index range scan whatever the order history size.
+    """
+    serializer_class = SalesRollupSerializer
+    permission_classes = [IsAuthenticated]
+    required_permissions = PermissionEnum.analytics_view
+
+    def get_query(self, request):
+        serializer = SalesQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data
+        start, end = bucket_range(query['date_from'], query['date_to'])
+        rollups = SalesRollup.objects.filter(
+            granularity=query['granularity'], dimension=query['dimension'], bucket__gte=start, bucket__lt=end,
+        )
+        if query.get('ids'):
+            rollups = rollups.filter(dimension_id__in=query['ids'])
+        return query, rollups
+
+    def list(self, request):
+        """
+        Time series: one row per bucket and dimension id.
+        """
+        query, rollups = self.get_query(request)
+        return Response({
+            'dimension': query['dimension'],
+            'granularity': query['granularity'],
+            'results': SalesRollupSerializer(rollups.order_by('bucket', 'dimension_id'), many=True).data,
+        })
+
+    @action(detail=False, methods=['get'])
+    def top(self, request):
+        """
+        Dimension ids ranked by revenue over the date range.
+        """
+        query, rollups = self.get_query(request)
+        if query['granularity'] != GranularityChoices.DAY:
+            return Response({'granularity': ['Rankings are read from daily buckets.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        ranking = (rollups.values('dimension_id')
+                   .annotate(label=Max('label'), orders=Sum('orders'), units=Sum('units'),
+                             revenue=Sum('revenue'), discount=Sum('discount'))
+                   .order_by('-revenue')[:query['limit']])
+        return Response({'dimension': query['dimension'], 'results': SalesRankingSerializer(ranking, many=True).data})
+
+
+class ReorderSuggestionViewSet(HasPermissionMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Reorder suggestions of the last forecast run (analytics.forecasting), most urgent
+    first. ?needs_reorder=true keeps the items with a suggested quantity.
+    """
+    serializer_class = ReorderSuggestionSerializer
+    permission_classes = [IsAuthenticated]
+    required_permissions = PermissionEnum.analytics_view
+
+    def get_queryset(self):
+        suggestions = (ReorderSuggestion.objects.select_related('product', 'sku')
+                       .order_by('-suggested_quantity', 'days_of_cover', 'id'))
+        if self.request.query_params.get('needs_reorder') in ('true', '1'):
+            suggestions = suggestions.filter(suggested_quantity__gt=0)
+        return suggestions
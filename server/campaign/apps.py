@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CampaignConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'campaign'
+
+    def ready(self):
+        try:
+            import campaign.signals
+        except Exception as e:
+            print(f"Error registering signals: {e}")
@@ -0,0 +1,4 @@
+from core.Utiilties.cache import invalidate_on_change
+from campaign.models import Campaign
+
+invalidate_on_change(Campaign, lambda instance: ['campaign'])
@@ -1,13 +1,16 @@
 # views.py
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
+
+from core.Utiilties.cache import CacheResponseMixin, cache_action
 from .models import Campaign
 from .serializers import CampaignSerializer
 from rest_framework.decorators import action
 
-class CampaignViewSet(ModelViewSet):
+class CampaignViewSet(CacheResponseMixin, ModelViewSet):
     queryset = Campaign.objects.all()
     serializer_class = CampaignSerializer
+    cache_tags = ('campaign',)
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -45,6 +48,7 @@ class CampaignViewSet(ModelViewSet):
 
 
     @action(detail=False, methods=['get'])
+    @cache_action(tags=('campaign',))
     def dashboard(self, request, pk=None):
         if request.method == 'GET':
             campaign = Campaign.objects.first()
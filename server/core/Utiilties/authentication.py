@@ -2,7 +2,7 @@ import logging
 import jwt
 from functools import wraps
 from django.conf import settings
-from django.core.cache import cache
+from core.Utiilties.cache import tiered_cache
 from django.contrib.auth import get_user_model
 from typing import Dict, List, Union, Optional
 
@@ -18,17 +18,24 @@ user_model = get_user_model()
 
 
 
+def role_permissions_cache_key(role_id: int):
+    return f"core:role:{role_id}:permissions"
+
+
 def get_user_role_permissions(role_id: int):
-    permissions = cache.get(role_id)
-    if not permissions:
+    cache_key = role_permissions_cache_key(role_id)
+    permissions = tiered_cache.get(cache_key)
+    if permissions is None:
+        tags = [f'role:{role_id}']
+        versions = tiered_cache.tag_versions(tags)
         try:
             role = Role.objects.get(id=role_id)
         except Role.DoesNotExist:
             raise ValueError(f"No role found with ID {role_id}")
 
-        permissions = role.permissions
-        cache.set(role.id, permissions, timeout=settings.CACHE_TTL)
-    return permissions or []
+        permissions = role.permissions or []
+        tiered_cache.set(cache_key, permissions, timeout=settings.CACHE_TTL, tags=tags, versions=versions)
+    return permissions
 
 def get_user_permissions(user: user_model):
     role_permissions = get_user_role_permissions(user.role.id)
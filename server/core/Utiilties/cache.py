@@ -0,0 +1,431 @@
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from core.Utiilties.compression import build_compressed_entry, response_from_compressed_entry, wants_browsable_api
+from core.Utiilties.invalidation import get_invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+default_settings = {
+    'ALIAS': 'default',
+    'L1_MAX_ENTRIES': 2048,
+    'L1_TIMEOUT': 5,
+    'L1_FALLBACK_TIMEOUT': 5,
+    'INVALIDATION_BUS': None,
+    'INVALIDATION_CHANNEL': 'cache:invalidation',
+}
+TAG_KEY = 'cache:tag:{}'
+MISSING = object()
+
+
+def get_cache_settings():
+    return {**default_settings, **getattr(settings, 'TIERED_CACHE', {})}
+
+
+class LocalLRUCache:
+    """
+    Bounded, thread-safe in-process cache (L1). Entries remember their tags so a tag
+    invalidation can drop them without scanning the whole cache.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tag_index = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value, tags = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout, tags=()):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + timeout, value, tuple(tags))
+            for tag in tags:
+                self._tag_index[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+
+    def evict_tags(self, *tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tag_index.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tag_index.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_index[tag]
+
+
+class CacheMetrics:
+    """
+    Per-process hit/miss counters, grouped by key namespace (the part before the first ':').
+    """
+    COUNTERS = ('l1_hits', 'l2_hits', 'misses', 'sets', 'invalidations')
+
+    def __init__(self):
+        self._counters = defaultdict(lambda: dict.fromkeys(self.COUNTERS, 0))
+        self._lock = threading.Lock()
+
+    def incr(self, key, counter, amount=1):
+        namespace = key.split(':', 1)[0]
+        with self._lock:
+            self._counters[namespace][counter] += amount
+
+    def snapshot(self):
+        with self._lock:
+            stats = {}
+            for namespace, counters in self._counters.items():
+                lookups = counters['l1_hits'] + counters['l2_hits'] + counters['misses']
+                hits = counters['l1_hits'] + counters['l2_hits']
+                stats[namespace] = {**counters, 'hit_ratio': round(hits / lookups, 4) if lookups else None}
+            return stats
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class TieredCache:
+    """
+    Per-worker LRU (L1) in front of the shared Django cache (L2, Redis).
+
+    Every L2 entry stores the version of each tag it was built from. Invalidating a tag
+    replaces its version, so all L2 entries that used it stop validating, drops the
+    local L1 entries carrying it and publishes the tags on the invalidation bus so the
+    other workers drop theirs too. L1 entries are not re-validated on read; they live at
+    most L1_TIMEOUT seconds, or L1_FALLBACK_TIMEOUT while the bus is not connected.
+    Cached values are shared, treat them as read-only.
+    """
+
+    def __init__(self, alias=None, l1_max_entries=None, l1_timeout=None, bus=MISSING):
+        conf = get_cache_settings()
+        self.alias = alias or conf['ALIAS']
+        self.l1_timeout = l1_timeout if l1_timeout is not None else conf['L1_TIMEOUT']
+        self.l1_fallback_timeout = min(conf['L1_FALLBACK_TIMEOUT'], self.l1_timeout)
+        self.local = LocalLRUCache(l1_max_entries or conf['L1_MAX_ENTRIES'])
+        self.metrics = CacheMetrics()
+        if bus is MISSING:
+            bus = get_invalidation_bus(conf['INVALIDATION_BUS'], self.alias, conf['INVALIDATION_CHANNEL'])
+        self.bus = bus
+        self._subscribed = False
+
+    def local_timeout(self):
+        if self.bus is None or self.bus.healthy:
+            return self.l1_timeout
+        return self.l1_fallback_timeout
+
+    def listen(self):
+        """
+        Subscribe this process to the invalidation bus (idempotent, restarts after a fork).
+        """
+        if self.bus is None:
+            return
+        if not self._subscribed:
+            self._subscribed = True
+            self.bus.subscribe(self._on_invalidation)
+        else:
+            self.bus.start()
+
+    def _on_invalidation(self, message):
+        if message.get('reset'):
+            self.local.clear()
+        else:
+            self.local.evict_tags(*message['tags'])
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        self.listen()
+        found = {}
+        remote_keys = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is MISSING:
+                remote_keys.append(key)
+            else:
+                found[key] = value
+                self.metrics.incr(key, 'l1_hits')
+
+        if remote_keys:
+            entries = self.shared.get_many(remote_keys)
+            versions = self._tag_versions({tag for entry in entries.values() for tag in entry['t']})
+            for key in remote_keys:
+                entry = entries.get(key)
+                if entry is None or any(versions.get(tag) != version for tag, version in entry['t'].items()):
+                    self.metrics.incr(key, 'misses')
+                    continue
+                found[key] = entry['v']
+                self.local.set(key, entry['v'], self.local_timeout(), entry['t'])
+                self.metrics.incr(key, 'l2_hits')
+        return found
+
+    def set(self, key, value, timeout=None, tags=(), versions=None):
+        self.set_many({key: value}, timeout=timeout, tags=tags, versions=versions)
+
+    def tag_versions(self, tags):
+        """
+        Snapshot of the current versions of `tags`. Take it before reading what is going
+        to be cached and pass it to set()/set_many(): a tag invalidated in between then
+        keeps the stale value out of the cache.
+        """
+        self.listen()
+        return self._tag_versions(set(tags), create=True)
+
+    def set_many(self, mapping, timeout=None, tags=(), versions=None):
+        """
+        Store several values. `tags` is either one iterable applied to every key
+        or a callable returning the tags of a given key. Values whose tags changed since
+        the `versions` snapshot (see tag_versions) are not stored.
+        """
+        if not mapping:
+            return
+        self.listen()
+        timeout = timeout or settings.CACHE_TTL
+        tags_for = tags if callable(tags) else (lambda key: tags)
+        key_tags = {key: tuple(tags_for(key)) for key in mapping}
+        current = self._tag_versions({tag for key_tag in key_tags.values() for tag in key_tag}, create=True)
+        snapshot = {**current, **(versions or {})}
+
+        entries = {}
+        for key, value in mapping.items():
+            if any(snapshot[tag] != current[tag] for tag in key_tags[key]):
+                # built from rows a concurrent write has changed since
+                continue
+            entry_tags = {tag: current[tag] for tag in key_tags[key]}
+            entries[key] = {'v': value, 't': entry_tags}
+            self.local.set(key, value, min(self.local_timeout(), timeout), entry_tags)
+            self.metrics.incr(key, 'sets')
+        if entries:
+            self.shared.set_many(entries, timeout=timeout)
+
+    def get_or_set(self, key, loader, timeout=None, tags=()):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            versions = self.tag_versions(tags)
+            value = loader()
+            self.set(key, value, timeout=timeout, tags=tags, versions=versions)
+        return value
+
+    def delete(self, *keys):
+        self.local.delete(*keys)
+        self.shared.delete_many(list(keys))
+
+    def invalidate_tags(self, *tags):
+        tags = {tag for tag in tags if tag}
+        if not tags:
+            return
+        self.shared.set_many({TAG_KEY.format(tag): self._new_version() for tag in tags}, timeout=None)
+        self.local.evict_tags(*tags)
+        for tag in tags:
+            self.metrics.incr(tag, 'invalidations')
+        if self.bus is not None:
+            self.bus.publish(sorted(tags))
+
+    def clear_local(self):
+        self.local.clear()
+
+    def stats(self):
+        return {
+            'l1_entries': len(self.local),
+            'bus_healthy': self.bus.healthy if self.bus is not None else None,
+            'namespaces': self.metrics.snapshot(),
+        }
+
+    def _tag_versions(self, tags, create=False):
+        if not tags:
+            return {}
+        keys = {TAG_KEY.format(tag): tag for tag in tags}
+        versions = {keys[key]: version for key, version in self.shared.get_many(list(keys)).items()}
+        if create:
+            for tag in tags - versions.keys():
+                tag_key = TAG_KEY.format(tag)
+                version = self._new_version()
+                if not self.shared.add(tag_key, version, timeout=None):
+                    version = self.shared.get(tag_key, version)
+                versions[tag] = version
+        return versions
+
+    @staticmethod
+    def _new_version():
+        # Never reuse a version: an evicted tag key must not resurrect old entries.
+        return uuid.uuid4().hex[:16]
+
+
+tiered_cache = TieredCache()
+
+
+def invalidate_on_change(sender, tags):
+    """
+    Invalidate the tags returned by `tags(instance)` whenever `sender` is saved or deleted.
+    Inside a transaction the tags are invalidated again on commit: a worker that reloaded
+    the entry in between would otherwise have cached the pre-commit rows.
+    """
+
+    def handler(sender, instance, **kwargs):
+        instance_tags = tuple(tags(instance))
+        tiered_cache.invalidate_tags(*instance_tags)
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: tiered_cache.invalidate_tags(*instance_tags))
+
+    post_save.connect(handler, sender=sender, weak=False)
+    post_delete.connect(handler, sender=sender, weak=False)
+    return handler
+
+
+def resolve_tags(tags, view, request, kwargs, data=None):
+    if callable(tags):
+        return tuple(tags(view, request, data))
+    return tuple(tag.format(**kwargs) for tag in tags)
+
+
+def response_cache_key(view, request, vary_on_user=False):
+    user_part = request.user.id if vary_on_user and request.user.is_authenticated else 'any'
+    url_hash = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f"views:{view.basename}:{view.action}:{user_part}:{url_hash}"
+
+
+def cached_view_response(view, handler, request, *args, timeout=None, tags=(), vary_on_user=False, **kwargs):
+    """
+    Serve a ViewSet handler from the tiered cache. The rendered body is stored with every
+    encoding precomputed (see core.Utiilties.compression), so a hit costs no rendering and
+    no compression.
+    """
+    if request.method != 'GET' or wants_browsable_api(request):
+        return handler(request, *args, **kwargs)
+
+    key = response_cache_key(view, request, vary_on_user)
+    entry = tiered_cache.get(key)
+    cache_status = 'HIT'
+    if entry is None:
+        cache_status = 'MISS'
+        # tags derived from the response data can only be read afterwards
+        versions = None if callable(tags) else tiered_cache.tag_versions(resolve_tags(tags, view, request, kwargs))
+        response = handler(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        data = getattr(response, 'data', None)
+        response = view.finalize_response(request, response, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        entry = build_compressed_entry(response, precompress=not vary_on_user)
+        tiered_cache.set(key, entry, timeout=timeout, tags=resolve_tags(tags, view, request, kwargs, data),
+                         versions=versions)
+
+    response = response_from_compressed_entry(request, entry)
+    response['X-Cache'] = cache_status
+    return response
+
+
+def cache_compressed_page(key, timeout=None, tags=()):
+    """
+    Decorator for public function-based views (apply it above @api_view).
+    The rendered body is cached with every encoding precomputed, so a cache hit only
+    picks the right bytes instead of paying JSON rendering and compression again.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or wants_browsable_api(request):
+                return view_func(request, *args, **kwargs)
+
+            cache_key = key(request, *args, **kwargs) if callable(key) else key
+            entry = tiered_cache.get(cache_key)
+            if entry is None:
+                versions = tiered_cache.tag_versions(tags)
+                response = view_func(request, *args, **kwargs)
+                if hasattr(response, 'render'):
+                    response.render()
+                if response.status_code != 200 or response.streaming:
+                    return response
+                entry = build_compressed_entry(response)
+                tiered_cache.set(cache_key, entry, timeout=timeout, tags=tags, versions=versions)
+            return response_from_compressed_entry(request, entry)
+
+        return wrapper
+
+    return decorator
+
+
+def cache_action(timeout=None, tags=(), vary_on_user=False):
+    """
+    Decorator for ViewSet actions. `tags` is a list of format strings filled from the
+    URL kwargs (e.g. 'product:{pk}') or a callable (view, request, data) -> tags.
+    Put it below permission decorators so cache hits are still permission checked.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            handler = lambda req, *a, **kw: func(self, req, *a, **kw)
+            return cached_view_response(self, handler, request, *args, timeout=timeout, tags=tags,
+                                        vary_on_user=vary_on_user, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class CacheResponseMixin:
+    """
+    Caches list/retrieve of a ViewSet in the tiered cache. Invalidation is driven by
+    model signals on `cache_tags` (see invalidate_on_change), not by the ViewSet itself,
+    so writes made outside the API are picked up too.
+    """
+    cache_tags = ()
+    cache_timeout = None
+    cache_vary_on_user = False
+
+    def list(self, request, *args, **kwargs):
+        return cached_view_response(self, super().list, request, *args, timeout=self.cache_timeout,
+                                    tags=self.cache_tags, vary_on_user=self.cache_vary_on_user, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_view_response(self, super().retrieve, request, *args, timeout=self.cache_timeout,
+                                    tags=self.cache_tags, vary_on_user=self.cache_vary_on_user, **kwargs)
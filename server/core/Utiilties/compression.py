@@ -0,0 +1,188 @@
+import logging
+import re
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_CONTENT_TYPES = (
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/vnd.oai.openapi',
+    'image/svg+xml',
+    'text/',
+)
+ACCEPT_ENCODING_RE = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+def get_min_size():
+    return getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+
+def get_max_random_bytes():
+    return getattr(settings, 'COMPRESSION_MAX_RANDOM_BYTES', 100)
+
+
+def supported_encodings():
+    """
+    Encodings the server can produce, in order of preference.
+    """
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def carries_secrets(request, response):
+    """
+    Whether the response may reflect a secret next to attacker influenced content (BREACH):
+    requests with credentials (session/CSRF cookies, Authorization) and responses setting
+    cookies.
+    """
+    return bool(response.cookies or request.META.get('HTTP_COOKIE') or request.META.get('HTTP_AUTHORIZATION'))
+
+
+def negotiate_encoding(request, encodings=None):
+    """
+    Pick the best encoding from the request's Accept-Encoding header, or None for identity.
+    """
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if not header:
+        return None
+
+    accepted = {}
+    for name, quality in ACCEPT_ENCODING_RE.findall(header):
+        try:
+            accepted[name.lower()] = float(quality) if quality else 1.0
+        except ValueError:
+            continue
+
+    best, best_quality = None, 0.0
+    for encoding in encodings or supported_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(content_type):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_CONTENT_TYPES)
+
+
+def compress_body(content, encoding, max_random_bytes=None):
+    if encoding == 'br':
+        return brotli.compress(content, quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+    return compress_string(content, max_random_bytes=max_random_bytes)
+
+
+def compress_stream(sequence, encoding, max_random_bytes=None):
+    if encoding != 'br':
+        yield from compress_sequence(sequence, max_random_bytes=max_random_bytes)
+        return
+
+    compressor = brotli.Compressor(quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+    for chunk in sequence:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def weaken_etag(response):
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response.headers['ETag'] = 'W/' + etag
+
+
+def compress_response(request, response):
+    """
+    Compress a response in place with the encoding negotiated for this request.
+
+    As a BREACH mitigation, gzip output gets a random length filename header (like
+    Django's GZipMiddleware), and responses carrying secrets are never brotli compressed,
+    brotli having no such padding.
+    """
+    if response.has_header('Content-Encoding') or not is_compressible(response.get('Content-Type')):
+        return response
+
+    patch_vary_headers(response, ('Accept-Encoding',))
+    encoding = negotiate_encoding(request, ('gzip',) if carries_secrets(request, response) else None)
+    if encoding is None:
+        return response
+    max_random_bytes = get_max_random_bytes()
+
+    if response.streaming:
+        if getattr(response, 'is_async', False):
+            return response
+        response.streaming_content = compress_stream(response.streaming_content, encoding, max_random_bytes)
+        del response.headers['Content-Length']
+    else:
+        if len(response.content) < get_min_size():
+            return response
+        compressed = compress_body(response.content, encoding, max_random_bytes)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+
+    weaken_etag(response)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class CompressionMiddleware:
+    """
+    Negotiates brotli/gzip per request. Bodies below COMPRESSION_MIN_SIZE are sent as is,
+    streaming responses are compressed chunk by chunk and responses that already carry a
+    Content-Encoding (e.g. precompressed cache hits) are passed through untouched.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return compress_response(request, response)
+
+
+def build_compressed_entry(response, precompress=True):
+    """
+    Turn a rendered response into a cache entry holding the body in every supported encoding.
+    Per-user responses are kept uncompressed (precompress=False): served as is, they are
+    compressed per request by CompressionMiddleware with its BREACH padding.
+    """
+    content = response.content
+    entry = {
+        'content_type': response.get('Content-Type'),
+        'status': response.status_code,
+        'identity': content,
+    }
+    if precompress and len(content) >= get_min_size() and is_compressible(entry['content_type']):
+        for encoding in supported_encodings():
+            compressed = compress_body(content, encoding)
+            if len(compressed) < len(content):
+                entry[encoding] = compressed
+    return entry
+
+
+def response_from_compressed_entry(request, entry):
+    encoding = negotiate_encoding(request)
+    body = entry.get(encoding) if encoding else None
+
+    response = HttpResponse(body or entry['identity'], content_type=entry['content_type'],
+                            status=entry.get('status', 200))
+    if body is not None:
+        response.headers['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+    return response
+
+
+def wants_browsable_api(request):
+    return 'text/html' in request.META.get('HTTP_ACCEPT', '')
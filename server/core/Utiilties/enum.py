@@ -86,6 +86,17 @@ class PermissionEnum(str, Enum):
     voucher_delete = 'voucher_delete'
     voucher_details = 'voucher_details'
 
+    # Shipping & tax rules
+    shipping_rule_create = 'shipping_rule_create'
+    shipping_rule_update = 'shipping_rule_update'
+    shipping_rule_delete = 'shipping_rule_delete'
+    tax_rule_create = 'tax_rule_create'
+    tax_rule_update = 'tax_rule_update'
+    tax_rule_delete = 'tax_rule_delete'
+
+    # Analytics
+    analytics_view = 'analytics_view'
+
     # Roles
     roles_create = 'roles_create'
     roles_update = 'roles_update'
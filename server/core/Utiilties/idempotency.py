@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest, HttpResponse
+from django.http.request import RawPostDataException
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+# delete the lock only if it still holds our token, in one step
+RELEASE_LOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+default_settings = {
+    'ALIAS': 'default',
+    'TTL': 60 * 60 * 24,  # how long a response is replayed for
+    'LOCK_TIMEOUT': 60,  # upper bound for one execution of the wrapped view
+    'WAIT_TIMEOUT': 10,  # how long a concurrent duplicate waits for the first request
+}
+
+
+def get_idempotency_settings():
+    return {**default_settings, **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+def find_request(args):
+    for arg in args:
+        if isinstance(arg, (Request, HttpRequest)):
+            return arg
+    return None
+
+
+def request_fingerprint(request):
+    try:
+        body = request.body
+    except RawPostDataException:
+        body = json.dumps(request.data, sort_keys=True, default=str).encode()
+    return hashlib.sha256(b'\n'.join([request.method.encode(), request.path.encode(), body])).hexdigest()
+
+
+def idempotency_cache_key(request, scope, key):
+    user = getattr(request, 'user', None)
+    owner = user.id if user is not None and user.is_authenticated else 'anon'
+    digest = hashlib.md5(f"{scope or request.path}:{owner}:{key}".encode()).hexdigest()
+    return f"idempotency:{digest}"
+
+
+def store_record(response, fingerprint):
+    record = {'fingerprint': fingerprint, 'status': response.status_code,
+              'headers': {name: response[name] for name in ('Location', 'X-Cart-Token') if response.has_header(name)}}
+    if isinstance(response, Response) and not response.is_rendered:
+        record['data'] = response.data
+    else:
+        record['content'] = response.content
+        record['content_type'] = response.get('Content-Type')
+    return record
+
+
+def redis_connection(alias):
+    """
+    Raw client of a django-redis cache, None for other backends.
+    """
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection(alias)
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def acquire_lock(cache, connection, lock_key, token, timeout):
+    if connection is None:
+        return cache.add(lock_key, token, timeout=timeout)
+    # raw SET NX, so the stored token is comparable by the release script
+    return bool(connection.set(cache.make_key(lock_key), token, nx=True, ex=timeout))
+
+
+def release_lock(cache, connection, lock_key, token):
+    """
+    Release the lock unless it expired and another request holds it now.
+    """
+    if connection is None:
+        # local caches (tests, development) are not shared between processes
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+        return
+    connection.eval(RELEASE_LOCK_SCRIPT, 1, cache.make_key(lock_key), token)
+
+
+def replay(record):
+    if 'data' in record:
+        response = Response(record['data'], status=record['status'])
+    else:
+        response = HttpResponse(record['content'], status=record['status'], content_type=record['content_type'])
+    for name, value in record['headers'].items():
+        response[name] = value
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def mismatch_response():
+    return Response(
+        {'detail': f'{IDEMPOTENCY_HEADER} was already used for a different request.'},
+        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+    )
+
+
+def idempotent(scope=None, ttl=None):
+    """
+    Honor the Idempotency-Key header on a view or ViewSet method.
+
+    The first request with a key takes a lock (SET NX) and runs the view; its response
+    and a fingerprint of the request are kept for `ttl` seconds. Retries get that response
+    back without running the view again, while it is still running concurrent duplicates
+    wait for it. Reusing a key for a different request is answered with 422. Responses
+    with a 5xx status or an exception are not kept, so the request can be retried.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            request = find_request(args)
+            key = request.headers.get(IDEMPOTENCY_HEADER) if request is not None else None
+            if not key:
+                return func(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response({'detail': f'{IDEMPOTENCY_HEADER} is too long.'}, status=status.HTTP_400_BAD_REQUEST)
+
+            conf = get_idempotency_settings()
+            cache = caches[conf['ALIAS']]
+            connection = redis_connection(conf['ALIAS'])
+            cache_key = idempotency_cache_key(request, scope, key)
+            lock_key = f"{cache_key}:lock"
+            fingerprint = request_fingerprint(request)
+            deadline = time.monotonic() + conf['WAIT_TIMEOUT']
+
+            while True:
+                record = cache.get(cache_key)
+                if record is not None:
+                    return replay(record) if record['fingerprint'] == fingerprint else mismatch_response()
+
+                token = uuid.uuid4().hex
+                if acquire_lock(cache, connection, lock_key, token, conf['LOCK_TIMEOUT']):
+                    # the first request may have stored its response and released the
+                    # lock between our read and the lock
+                    record = cache.get(cache_key)
+                    if record is None:
+                        break
+                    release_lock(cache, connection, lock_key, token)
+                    return replay(record) if record['fingerprint'] == fingerprint else mismatch_response()
+                if time.monotonic() >= deadline:
+                    return Response(
+                        {'detail': f'A request with this {IDEMPOTENCY_HEADER} is still being processed.'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                time.sleep(POLL_INTERVAL)
+
+            try:
+                response = func(*args, **kwargs)
+                if response.status_code < 500:
+                    cache.set(cache_key, store_record(response, fingerprint), timeout=ttl or conf['TTL'])
+                return response
+            finally:
+                release_lock(cache, connection, lock_key, token)
+
+        return wrapper
+
+    return decorator
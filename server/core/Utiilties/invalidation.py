@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+_origin = {}
+
+
+def process_origin():
+    """
+    Unique id of the current process; recomputed after a fork (gunicorn/celery prefork).
+    """
+    pid = os.getpid()
+    if pid not in _origin:
+        _origin.clear()
+        _origin[pid] = f"{socket.gethostname()}:{pid}:{uuid.uuid4().hex[:8]}"
+    return _origin[pid]
+
+
+class LocalInvalidationBus:
+    """
+    In-memory stand-in for tests and single-process setups: messages are delivered
+    synchronously to the subscribers of this process, including the publisher.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+
+    @property
+    def healthy(self):
+        return True
+
+    def publish(self, tags):
+        message = {'origin': None, 'tags': list(tags)}
+        for callback in list(self._subscribers):
+            callback(message)
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def start(self):
+        pass
+
+
+class RedisInvalidationBus:
+    """
+    Publishes invalidated tags on a Redis pub/sub channel. Every process runs one
+    daemon listener thread that hands incoming messages to its subscribers. After a
+    (re)connect subscribers get a `reset` message, since anything published while
+    the listener was away has been missed.
+    """
+    RECONNECT_DELAY = 1
+
+    def __init__(self, alias='default', channel='cache:invalidation'):
+        self.alias = alias
+        self.channel = channel
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._listener = None
+        self._listener_pid = None
+        self._connected = threading.Event()
+
+    @property
+    def healthy(self):
+        return self._connected.is_set() and self._listener_pid == os.getpid()
+
+    def connection(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection(self.alias)
+
+    def publish(self, tags):
+        message = json.dumps({'origin': process_origin(), 'tags': list(tags)})
+        try:
+            self.connection().publish(self.channel, message)
+        except Exception as e:
+            logger.error(f"Failed to publish cache invalidation for {tags}: {e}")
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+        self.start()
+
+    def start(self):
+        pid = os.getpid()
+        if self._listener_pid == pid and self._listener is not None and self._listener.is_alive():
+            return
+        with self._lock:
+            if self._listener_pid == pid and self._listener is not None and self._listener.is_alive():
+                return
+            # A thread started before a fork does not exist in the child.
+            self._connected.clear()
+            self._listener_pid = pid
+            self._listener = threading.Thread(target=self._listen, name='cache-invalidation-bus', daemon=True)
+            self._listener.start()
+
+    def _dispatch(self, message):
+        for callback in list(self._subscribers):
+            try:
+                callback(message)
+            except Exception as e:
+                logger.error(f"Cache invalidation subscriber failed: {e}")
+
+    def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.connection().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self._connected.set()
+                self._dispatch({'origin': None, 'reset': True, 'tags': []})
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None or message.get('type') != 'message':
+                        continue
+                    payload = json.loads(message['data'])
+                    if payload.get('origin') == process_origin():
+                        continue
+                    self._dispatch(payload)
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener disconnected: {e}")
+                if self._connected.is_set():
+                    self._connected.clear()
+                    self._dispatch({'origin': None, 'reset': True, 'tags': []})
+                time.sleep(self.RECONNECT_DELAY)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+def get_invalidation_bus(kind, alias='default', channel='cache:invalidation'):
+    if kind == 'redis':
+        return RedisInvalidationBus(alias=alias, channel=channel)
+    if kind == 'local':
+        return LocalInvalidationBus()
+    return None
@@ -0,0 +1,142 @@
+"""
+Transactional outbox.
+
+Code changing state calls emit() inside its transaction: the event row commits or rolls
+back with the change itself, so a side effect is never lost nor sent for a change that
+did not happen. dispatch_outbox() (Celery task core.tasks.dispatch_outbox, kicked after
+each commit and run by beat as a safety net) delivers pending events in batches to the
+handlers registered with @outbox_handler(topic). Delivery is at least once: handlers must
+be idempotent.
+
+Events are claimed in a short transaction (their available_at pushed CLAIM_TIMEOUT ahead
+and the attempt counted) and delivered after it committed, so slow handlers (SMTP...)
+never hold row locks. An event whose dispatcher died is delivered again once its claim
+runs out.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+default_settings = {
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 10,  # events failing this often are left for inspection
+    'RETRY_DELAY': 30,  # seconds, doubled after every failed attempt
+    'CLAIM_TIMEOUT': 300,  # seconds a dispatcher has to deliver the events it claimed
+}
+
+handlers = defaultdict(list)
+
+
+def get_outbox_settings():
+    return {**default_settings, **getattr(settings, 'OUTBOX', {})}
+
+
+def outbox_handler(topic):
+    """
+    Register func(payload) to be called for every event of `topic`.
+    """
+
+    def decorator(func):
+        handlers[topic].append(func)
+        return func
+
+    return decorator
+
+
+def kick_dispatcher():
+    try:
+        from core.tasks import dispatch_outbox_events
+        dispatch_outbox_events.delay()
+    except Exception as e:
+        # the periodic run picks the events up
+        logger.warning(f"Could not schedule the outbox dispatcher: {e}")
+
+
+def emit_many(events):
+    """
+    Record (topic, payload) events in the current transaction, dispatched once it commits.
+    """
+    events = OutboxEvent.objects.bulk_create([OutboxEvent(topic=topic, payload=payload) for topic, payload in events])
+    if events:
+        transaction.on_commit(kick_dispatcher)
+    return events
+
+
+def emit(topic, payload):
+    return emit_many([(topic, payload)])[0]
+
+
+def deliver(event):
+    """
+    Run every handler of the event, each in its own transaction so one failing handler
+    neither undoes nor blocks the others. Raises the first error once all have run.
+    """
+    error = None
+    for handler in handlers.get(event.topic, ()):
+        try:
+            with transaction.atomic():
+                handler(event.payload)
+        except Exception as e:
+            logger.exception(f"Outbox handler {handler.__name__} failed for {event}")
+            error = error or e
+    if error is not None:
+        raise error
+
+
+def claim_batch(conf):
+    """
+    Claim one batch of due events for this dispatcher. Rows are locked with SKIP LOCKED
+    only for this transaction: any number of dispatchers can run side by side.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, available_at__lte=now, attempts__lt=conf['MAX_ATTEMPTS'])
+            .order_by('available_at', 'id')[:conf['BATCH_SIZE']]
+        )
+        for event in events:
+            event.attempts += 1
+            event.available_at = now + timedelta(seconds=conf['CLAIM_TIMEOUT'])
+        OutboxEvent.objects.bulk_update(events, ['attempts', 'available_at'])
+    return events
+
+
+def dispatch_batch(conf):
+    """
+    Claim one batch of due events, then deliver them outside of any transaction.
+    """
+    events = claim_batch(conf)
+    for event in events:
+        try:
+            deliver(event)
+            event.processed_at = timezone.now()
+            event.last_error = ''
+        except Exception as e:
+            event.last_error = f"{type(e).__name__}: {e}"
+            event.available_at = timezone.now() + timedelta(seconds=conf['RETRY_DELAY'] * 2 ** (event.attempts - 1))
+    OutboxEvent.objects.bulk_update(events, ['processed_at', 'last_error', 'available_at'])
+    return events
+
+
+def dispatch_outbox(max_batches=None):
+    """
+    Deliver due events batch by batch until none are left. Returns how many were handled.
+    """
+    conf = get_outbox_settings()
+    handled = batches = 0
+    while max_batches is None or batches < max_batches:
+        events = dispatch_batch(conf)
+        handled += len(events)
+        batches += 1
+        if len(events) < conf['BATCH_SIZE']:
+            break
+    return handled
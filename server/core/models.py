@@ -151,3 +151,26 @@ class Address(models.Model):
 
     def __str__(self):
         return f"{self.name} - {self.address_line1}, {self.city}"
+
+
+class OutboxEvent(models.Model):
+    """
+    A side effect (email, stock release, analytics...) written in the same transaction as
+    the change causing it and delivered afterwards by core.Utiilties.outbox.
+    """
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now, help_text="Not delivered before this time (retries back off).")
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            # the dispatcher only ever scans undelivered events
+            models.Index(fields=['available_at', 'id'], name='outbox_pending_idx', condition=models.Q(processed_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.id}"
@@ -1,10 +1,17 @@
 from django.db.models.signals import post_save, post_migrate
-from django.dispatch import receiver
+from django.dispatch import receiver, Signal
 from core.models import Role
+from core.Utiilties.cache import invalidate_on_change
 from core.Utiilties.roles import default_roles
 from django.contrib.auth import get_user_model
 User = get_user_model()
 
+# Sent by the JWT login view with `request` and `user`; it does not go through
+# django.contrib.auth.login, so Django's own user_logged_in is never sent.
+user_logged_in = Signal()
+
+invalidate_on_change(Role, lambda instance: [f'role:{instance.id}'])
+
 @receiver(post_save, sender=User)
 def assign_default_role(sender, instance, created, **kwargs):
     if created:
@@ -0,0 +1,11 @@
+from celery import shared_task
+
+from core.Utiilties.outbox import dispatch_outbox
+
+
+@shared_task(name='dispatch_outbox_events')
+def dispatch_outbox_events(max_batches=50):
+    """
+    Deliver pending transactional outbox events, see core.Utiilties.outbox.
+    """
+    return dispatch_outbox(max_batches=max_batches)
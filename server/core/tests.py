@@ -0,0 +1,152 @@
+import gzip
+from datetime import timedelta
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.utils import timezone
+
+from core.Utiilties import outbox
+from core.Utiilties.cache import TieredCache
+from core.Utiilties.compression import compress_response
+from core.models import OutboxEvent
+
+TOPIC = 'test.event'
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'core-tests'}}
+
+
+class CompressionTestCase(TestCase):
+    def respond(self, **headers):
+        request = RequestFactory().get('/api/test/', HTTP_ACCEPT_ENCODING='br, gzip', **headers)
+        return compress_response(request, HttpResponse(b'{"token": "secret"}' * 200, content_type='application/json'))
+
+    def test_responses_with_credentials_are_padded_gzip(self):
+        lengths = set()
+        for _ in range(5):
+            response = self.respond(HTTP_AUTHORIZATION='Bearer token')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.content), b'{"token": "secret"}' * 200)
+            lengths.add(len(response.content))
+        # the random filename header varies the length
+        self.assertGreater(len(lengths), 1)
+
+    def test_anonymous_responses_use_the_best_encoding(self):
+        response = self.respond()
+        self.assertIn(response['Content-Encoding'], ('br', 'gzip'))
+
+
+@override_settings(CACHES=CACHES)
+class TieredCacheTestCase(TestCase):
+    def setUp(self):
+        # two workers sharing L2, without an invalidation bus
+        self.cache = TieredCache(alias='default', bus=None)
+        self.other = TieredCache(alias='default', bus=None)
+
+    def tearDown(self):
+        self.cache.shared.clear()
+
+    def test_tag_invalidation_drops_tagged_entries_only(self):
+        self.cache.set('product:1', 'one', tags=['products', 'product:1'])
+        self.cache.set('product:2', 'two', tags=['products', 'product:2'])
+        self.cache.set('home', 'home', tags=['products'])
+
+        self.cache.invalidate_tags('product:1')
+        self.assertIsNone(self.cache.get('product:1'))
+        self.assertEqual(self.cache.get_many(['product:2', 'home']), {'product:2': 'two', 'home': 'home'})
+
+        self.cache.invalidate_tags('products')
+        self.assertEqual(self.cache.get_many(['product:2', 'home']), {})
+
+    def test_invalidation_reaches_other_workers_through_l2(self):
+        self.cache.set('product:1', 'one', tags=['product:1'])
+        self.assertEqual(self.other.get('product:1'), 'one')
+
+        self.cache.invalidate_tags('product:1')
+        # the other worker's L1 copy lives until it is evicted (by the bus, or L1_TIMEOUT)
+        self.other.clear_local()
+        self.assertIsNone(self.other.get('product:1'))
+
+    def test_entries_built_after_invalidation_are_valid(self):
+        self.cache.invalidate_tags('product:1')
+        loader = mock.Mock(return_value='one')
+        self.assertEqual(self.cache.get_or_set('product:1', loader, tags=['product:1']), 'one')
+        self.assertEqual(self.cache.get_or_set('product:1', loader, tags=['product:1']), 'one')
+        self.cache.clear_local()
+        self.assertEqual(self.cache.get('product:1'), 'one')
+        loader.assert_called_once()
+
+    def test_value_read_before_an_invalidation_is_not_stored(self):
+        def loader():
+            # a write commits while the value is being built
+            self.other.invalidate_tags('product:1')
+            return 'stale'
+
+        self.assertEqual(self.cache.get_or_set('product:1', loader, tags=['product:1']), 'stale')
+        self.assertIsNone(self.cache.get('product:1'))
+        self.assertIsNone(self.other.get('product:1'))
+
+    def test_set_many_skips_only_changed_entries(self):
+        versions = self.cache.tag_versions(['product:1', 'product:2'])
+        self.cache.invalidate_tags('product:2')
+        self.cache.set_many({'product:1': 'one', 'product:2': 'two'}, tags=lambda key: [key], versions=versions)
+        self.assertEqual(self.cache.get_many(['product:1', 'product:2']), {'product:1': 'one'})
+
+
+class OutboxTestCase(TestCase):
+    def setUp(self):
+        self.conf = {**outbox.get_outbox_settings(), 'BATCH_SIZE': 10, 'MAX_ATTEMPTS': 3}
+        patcher = mock.patch.dict(outbox.handlers, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_events_are_claimed_before_delivery(self):
+        seen = []
+
+        @outbox.outbox_handler(TOPIC)
+        def handler(payload):
+            # the claim is already written when handlers run
+            seen.append(OutboxEvent.objects.values_list('attempts', 'available_at').get(payload=payload))
+
+        event = outbox.emit(TOPIC, {'n': 1})
+        self.assertEqual(len(outbox.dispatch_batch(self.conf)), 1)
+
+        attempts, available_at = seen[0]
+        self.assertEqual(attempts, 1)
+        self.assertGreater(available_at, timezone.now())
+        event.refresh_from_db()
+        self.assertIsNotNone(event.processed_at)
+        # claimed or delivered events are not picked up again
+        self.assertEqual(outbox.dispatch_batch(self.conf), [])
+
+    def test_failed_delivery_is_retried_later(self):
+        @outbox.outbox_handler(TOPIC)
+        def handler(payload):
+            raise RuntimeError('smtp down')
+
+        event = outbox.emit(TOPIC, {})
+        outbox.dispatch_batch(self.conf)
+        event.refresh_from_db()
+        self.assertIsNone(event.processed_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertIn('smtp down', event.last_error)
+        self.assertGreater(event.available_at, timezone.now())
+
+        # once due again it is retried, until MAX_ATTEMPTS
+        for _ in range(5):
+            OutboxEvent.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+            outbox.dispatch_batch(self.conf)
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, self.conf['MAX_ATTEMPTS'])
+
+    def test_expired_claim_is_delivered_again(self):
+        delivered = []
+        outbox.outbox_handler(TOPIC)(delivered.append)
+
+        event = outbox.emit(TOPIC, {'n': 1})
+        # a dispatcher claimed the event and died before delivering it
+        outbox.claim_batch(self.conf)
+        self.assertEqual(outbox.dispatch_batch(self.conf), [])
+
+        OutboxEvent.objects.filter(id=event.id).update(available_at=timezone.now() - timedelta(seconds=1))
+        outbox.dispatch_batch(self.conf)
+        self.assertEqual(delivered, [{'n': 1}])
@@ -9,6 +9,7 @@ from core.Utiilties.permission_chacker import has_permissions, HasPermissionMixi
 from core.Utiilties.utilities_functions import token_generator, activation_email_sender, reset_password_email_sender
 from core.serializers import *
 from core.Utiilties.enum import TokenType
+from core.signals import user_logged_in
 
 config_data = ConfData.get_data()
 
@@ -25,6 +26,7 @@ def user_login(request):
     if user is not None:
         if (user.is_active and is_active_required) or is_active_required is False:
             if check_password(password, user.password):
+                user_logged_in.send(sender=user.__class__, request=request, user=user)
                 return Response({'id':user.id,'type':user.role_name,'token': token_generator(user_id=user.id, token_type=TokenType.access)},
                                 status=status.HTTP_200_OK)
             else:
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+from fulfillment.picking import create_batch, generate_documents, NothingToPick
+
+
+def aware_datetime(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise CommandError(f"Invalid date/time {value}, use YYYY-MM-DD HH:MM.")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = "Batch the unpicked PROCESSING orders of a window and generate their picking list and packing slips."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=aware_datetime, help="Orders created from this time on, default: all.")
+        parser.add_argument('--until', type=aware_datetime, help="Orders created before this time, default: now.")
+        parser.add_argument('--sync', action='store_true', help="Generate the documents here instead of on a worker.")
+
+    def handle(self, *args, **options):
+        try:
+            batch = create_batch(window_start=options['since'], window_end=options['until'])
+        except NothingToPick as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Picking batch #{batch.id}: {batch.order_count} orders")
+        if options['sync']:
+            batch = generate_documents(batch.id)
+            if batch.error:
+                raise CommandError(batch.error)
+            self.stdout.write(f"{batch.wave_count} waves, {batch.line_count} picking lines: "
+                              + ', '.join(getattr(batch, name).path for name in ('picking_csv', 'packing_csv', 'picking_pdf')
+                                          if getattr(batch, name)))
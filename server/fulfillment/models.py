@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils.functional import cached_property
+
+
+class PrivateStorage(FileSystemStorage):
+    """
+    Files under PRIVATE_MEDIA_ROOT: they have no URL and are only served by views.
+    """
+
+    @cached_property
+    def base_location(self):
+        return settings.PRIVATE_MEDIA_ROOT
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting == 'PRIVATE_MEDIA_ROOT':
+            self.__dict__.pop('base_location', None)
+            self.__dict__.pop('location', None)
+
+    def url(self, name):
+        raise ValueError("Private files have no URL, serve them through a view.")
+
+
+def private_storage():
+    return PrivateStorage()
+
+
+class PickingBatchStatusChoices(models.IntegerChoices):
+    PENDING = 1, 'Pending'
+    READY = 2, 'Ready'
+    FAILED = 3, 'Failed'
+
+
+class PickingBatch(models.Model):
+    """
+    PROCESSING orders taken together to the warehouse floor: grouped into waves by
+    delivery area, with picking and packing documents generated in the background by
+    fulfillment.picking. An order belongs to one batch. The documents are kept in private
+    storage and only served by PickingBatchViewSet.download.
+    """
+    status = models.IntegerField(choices=PickingBatchStatusChoices.choices, default=PickingBatchStatusChoices.PENDING)
+    window_start = models.DateTimeField(null=True, blank=True, help_text="Orders created from this time on.")
+    window_end = models.DateTimeField(help_text="Orders created before this time.")
+    orders = models.ManyToManyField('order.Order', related_name='picking_batches')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    order_count = models.PositiveIntegerField(default=0)
+    line_count = models.PositiveIntegerField(default=0, help_text="Picking lines: distinct products/SKUs per wave.")
+    wave_count = models.PositiveIntegerField(default=0)
+
+    picking_csv = models.FileField(upload_to='fulfillment/', storage=private_storage, blank=True)
+    packing_csv = models.FileField(upload_to='fulfillment/', storage=private_storage, blank=True)
+    picking_pdf = models.FileField(upload_to='fulfillment/', storage=private_storage, blank=True, help_text="Only generated when reportlab is installed.")
+    error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Picking batch #{self.id} ({self.order_count} orders)"
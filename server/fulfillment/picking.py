@@ -0,0 +1,201 @@
+"""
+Picking lists and packing slips.
+
+create_batch() claims the PROCESSING orders of a time window into a PickingBatch (each
+order is picked once) and schedules generate_documents() on a Celery worker. There the
+orders are split into waves by delivery city/area, at most WAVE_SIZE orders each, so a
+picker collects the goods of neighbouring deliveries in one walk. The quantities to pick
+come from one grouped query over OrderItem per (wave, product, SKU), sorted by category
+and product so a wave's list follows the shelves; the packing slips list every order's
+lines by wave. Documents are written as CSV, plus a printable PDF when reportlab is
+installed.
+"""
+import csv
+import io
+import logging
+from itertools import groupby
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Case, When, Value, IntegerField, Sum, Count, Max
+from django.utils import timezone
+
+from order.models import Order, OrderItem, OrderStatusChoices
+from .models import PickingBatch, PickingBatchStatusChoices
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+except ImportError:  # reportlab is optional, only needed for the PDF picking list
+    SimpleDocTemplate = None
+
+logger = logging.getLogger(__name__)
+
+default_settings = {
+    'WAVE_SIZE': 40,  # orders per wave, about one picking cart
+}
+
+DOCUMENTS = ('picking_csv', 'packing_csv', 'picking_pdf')
+PICKING_HEADER = ['wave', 'city', 'area', 'category', 'product_id', 'product', 'sku_id', 'sku_code', 'quantity', 'orders']
+PACKING_HEADER = ['wave', 'order_number', 'city', 'area', 'address', 'phone_number', 'product', 'sku_code', 'variants', 'quantity']
+
+
+class NothingToPick(Exception):
+    pass
+
+
+def get_fulfillment_settings():
+    return {**default_settings, **getattr(settings, 'FULFILLMENT', {})}
+
+
+def pickable_orders(window_start, window_end):
+    orders = Order.objects.filter(status=OrderStatusChoices.PROCESSING, created_at__lt=window_end)
+    if window_start is not None:
+        orders = orders.filter(created_at__gte=window_start)
+    # NOT EXISTS rather than an outer join, which FOR UPDATE can't lock
+    return orders.exclude(picking_batches__isnull=False)
+
+
+def create_batch(window_start=None, window_end=None, user=None):
+    """
+    Claim the unbatched PROCESSING orders created in [window_start, window_end) (all of
+    them up to now by default) and schedule their documents. Orders locked by a
+    concurrent batch are left to it. Raises NothingToPick.
+    """
+    window_end = window_end or timezone.now()
+    with transaction.atomic():
+        order_ids = list(pickable_orders(window_start, window_end).select_for_update(skip_locked=True)
+                         .order_by('id').values_list('id', flat=True))
+        if not order_ids:
+            raise NothingToPick("No processing orders to pick in this window.")
+        batch = PickingBatch.objects.create(window_start=window_start, window_end=window_end, created_by=user,
+                                            order_count=len(order_ids))
+        PickingBatch.orders.through.objects.bulk_create([
+            PickingBatch.orders.through(pickingbatch_id=batch.id, order_id=order_id) for order_id in order_ids
+        ])
+        transaction.on_commit(lambda: schedule_documents(batch.id))
+    return batch
+
+
+def schedule_documents(batch_id):
+    try:
+        from .tasks import generate_picking_documents
+        generate_picking_documents.delay(batch_id)
+    except Exception as e:
+        logger.error(f"Could not schedule the documents of picking batch {batch_id}: {e}")
+
+
+def assign_waves(batch, wave_size):
+    """
+    [(wave number, city, area, [order ids])] of the batch's orders.
+    """
+    orders = batch.orders.order_by('city', 'area', 'id').values_list('id', 'city', 'area')
+    waves = []
+    for (city, area), rows in groupby(orders, key=lambda row: (row[1], row[2])):
+        order_ids = [order_id for order_id, _, _ in rows]
+        for i in range(0, len(order_ids), wave_size):
+            waves.append((len(waves) + 1, city, area, order_ids[i:i + wave_size]))
+    return waves
+
+
+def picking_lines(waves):
+    """
+    Units to pick per wave and product/SKU, in one grouped query.
+    """
+    wave_of = Case(*[When(order_id__in=order_ids, then=Value(number)) for number, _, _, order_ids in waves],
+                   output_field=IntegerField())
+    return list(
+        OrderItem.objects.order_by()
+        .filter(order_id__in=[order_id for *_, order_ids in waves for order_id in order_ids])
+        .annotate(wave=wave_of)
+        .values('wave', 'product_id', 'sku_id')
+        .annotate(quantity=Sum('quantity'), orders=Count('order_id', distinct=True),
+                  product_name=Max('product__name'), sku_code=Max('sku__sku_code'),
+                  category=Max('product__category__label'))
+        .order_by('wave', 'category', 'product_name', 'sku_code')
+    )
+
+
+def packing_rows(waves):
+    wave_of = {order_id: (number, city, area) for number, city, area, order_ids in waves for order_id in order_ids}
+    items = (OrderItem.objects.filter(order_id__in=wave_of)
+             .values_list('order_id', 'order__order_number', 'order__address_line1', 'order__address_line2',
+                          'order__phone_number', 'product__name', 'variant_info', 'quantity')
+             .order_by('order_id', 'id'))
+    rows = []
+    for order_id, order_number, line1, line2, phone, product, info, quantity in items:
+        number, city, area = wave_of[order_id]
+        variants = ', '.join(f"{name}: {value}" for name, value in (info.get('variants') or {}).items())
+        rows.append([number, order_number, city, area, ', '.join(filter(None, [line1, line2])), phone,
+                     info.get('product_name') or product, info.get('sku_code') or '', variants, quantity])
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+
+def to_csv(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return ContentFile(buffer.getvalue().encode())
+
+
+def picking_pdf(batch, waves, lines):
+    styles = getSampleStyleSheet()
+    buffer = io.BytesIO()
+    story = []
+    by_wave = {number: list(rows) for number, rows in groupby(lines, key=lambda line: line['wave'])}
+    for number, city, area, order_ids in waves:
+        if story:
+            story.append(PageBreak())
+        story.append(Paragraph(escape(f"Batch #{batch.id} - wave {number}: {city} / {area} ({len(order_ids)} orders)"),
+                               styles['Heading2']))
+        story.append(Spacer(1, 8))
+        table = Table(
+            [['', 'Category', 'Product', 'SKU', 'Qty', 'Orders']]
+            + [['[ ]', line['category'] or '', line['product_name'], line['sku_code'] or '', line['quantity'], line['orders']]
+               for line in by_wave.get(number, [])],
+            repeatRows=1,
+        )
+        table.setStyle(TableStyle([
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ]))
+        story.append(table)
+    SimpleDocTemplate(buffer, pagesize=A4, title=f"Picking batch {batch.id}").build(story)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_documents(batch_id):
+    """
+    Write the picking list and packing slips of a batch. A batch whose documents are
+    already there is left alone.
+    """
+    batch = PickingBatch.objects.get(pk=batch_id)
+    if batch.status == PickingBatchStatusChoices.READY:
+        return batch
+    try:
+        waves = assign_waves(batch, get_fulfillment_settings()['WAVE_SIZE'])
+        lines = picking_lines(waves)
+        areas = {number: (city, area) for number, city, area, _ in waves}
+        batch.picking_csv.save(f'picking-{batch.id}.csv', to_csv(PICKING_HEADER, [
+            [line['wave'], *areas[line['wave']], line['category'] or '', line['product_id'], line['product_name'],
+             line['sku_id'] or '', line['sku_code'] or '', line['quantity'], line['orders']]
+            for line in lines
+        ]), save=False)
+        batch.packing_csv.save(f'packing-{batch.id}.csv', to_csv(PACKING_HEADER, packing_rows(waves)), save=False)
+        if SimpleDocTemplate is not None:
+            batch.picking_pdf.save(f'picking-{batch.id}.pdf', picking_pdf(batch, waves, lines), save=False)
+        batch.line_count, batch.wave_count = len(lines), len(waves)
+        batch.status, batch.error = PickingBatchStatusChoices.READY, ''
+        batch.completed_at = timezone.now()
+    except Exception as e:
+        logger.exception(f"Failed to generate the documents of picking batch {batch_id}")
+        batch.status, batch.error = PickingBatchStatusChoices.FAILED, f"{type(e).__name__}: {e}"
+    batch.save()
+    return batch
@@ -0,0 +1,28 @@
+from rest_framework import serializers
+
+from .models import PickingBatch
+from .picking import DOCUMENTS
+
+
+class PickingBatchSerializer(serializers.ModelSerializer):
+    documents = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PickingBatch
+        fields = ['id', 'status', 'window_start', 'window_end', 'order_count', 'line_count', 'wave_count',
+                  'documents', 'error', 'created_by', 'created_at', 'completed_at']
+        read_only_fields = fields
+
+    def get_documents(self, obj):
+        # files are downloaded through the download action, never from public media
+        return [name for name in DOCUMENTS if getattr(obj, name)]
+
+
+class PickingBatchCreateSerializer(serializers.Serializer):
+    window_start = serializers.DateTimeField(required=False, allow_null=True, default=None)
+    window_end = serializers.DateTimeField(required=False, allow_null=True, default=None)
+
+    def validate(self, attrs):
+        if attrs['window_start'] and attrs['window_end'] and attrs['window_start'] >= attrs['window_end']:
+            raise serializers.ValidationError("window_start must be before window_end.")
+        return attrs
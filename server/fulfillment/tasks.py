@@ -0,0 +1,11 @@
+from celery import shared_task
+
+from fulfillment.picking import generate_documents
+
+
+@shared_task(name='generate_picking_documents')
+def generate_picking_documents(batch_id):
+    """
+    Write the picking list and packing slips of a batch, see fulfillment.picking.
+    """
+    return generate_documents(batch_id).status
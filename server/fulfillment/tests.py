@@ -0,0 +1,72 @@
+import os
+import tempfile
+from decimal import Decimal
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.Utiilties.enum import PermissionEnum, TokenType
+from core.Utiilties.utilities_functions import token_generator
+from core.models import User
+from order.models import Order, OrderItem, OrderStatusChoices
+from products.models import Category, Product
+from .models import PickingBatch, PickingBatchStatusChoices
+from .picking import create_batch, generate_documents
+
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'fulfillment-tests'}}
+
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Bearer ' + token_generator(user.id, TokenType.access))
+    return client
+
+
+class PickingDocumentsTestCase(TestCase):
+    def setUp(self):
+        private_root = tempfile.TemporaryDirectory()
+        self.addCleanup(private_root.cleanup)
+        override = override_settings(PRIVATE_MEDIA_ROOT=private_root.name, FULFILLMENT={'WAVE_SIZE': 2}, CACHES=CACHES)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.staff = User.objects.create_user(email='staff@example.com', phone='', password='password',
+                                              permissions=[PermissionEnum.order_list, PermissionEnum.order_update])
+        category = Category.objects.create(label='Shirts')
+        product = Product.objects.create(name='Shirt', base_price=100, stock_quantity=10, category=category)
+        for i in range(3):
+            order = Order.objects.create(user=self.staff, subtotal=100, city='Dhaka', area=f'Area {i % 2}',
+                                         address_line1=f'House {i}', phone_number='01711111111',
+                                         status=OrderStatusChoices.PROCESSING)
+            OrderItem.objects.create(order=order, product=product, quantity=i + 1, unit_price=Decimal('100'))
+        self.batch = create_batch(user=self.staff)
+        generate_documents(self.batch.id)
+        self.batch.refresh_from_db()
+
+    def test_documents_are_generated(self):
+        self.assertEqual(self.batch.status, PickingBatchStatusChoices.READY)
+        self.assertEqual((self.batch.order_count, self.batch.wave_count), (3, 2))
+        with self.batch.picking_csv.open('r') as file:
+            self.assertEqual(sum(1 for _ in file), 1 + self.batch.line_count)
+
+    def test_documents_are_kept_out_of_public_media(self):
+        path = os.path.realpath(self.batch.picking_csv.path)
+        self.assertTrue(path.startswith(os.path.realpath(settings.PRIVATE_MEDIA_ROOT)))
+        self.assertFalse(path.startswith(os.path.realpath(settings.MEDIA_ROOT)))
+        with self.assertRaises(ValueError):
+            self.batch.picking_csv.url
+
+    def test_download_requires_permission(self):
+        url = f'/api/fulfillment/picking-batch/{self.batch.id}/download/?document=packing_csv'
+        response = client_for(self.staff).get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'order_number', b''.join(response.streaming_content))
+
+        customer = User.objects.create_user(email='customer@example.com', phone='', password='password')
+        self.assertEqual(client_for(customer).get(url).status_code, 403)
+
+    def test_orders_are_batched_once(self):
+        self.assertEqual(PickingBatch.objects.count(), 1)
+        response = client_for(self.staff).post('/api/fulfillment/picking-batch/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,12 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import PickingBatchViewSet
+
+app_name = 'fulfillment'
+
+router = DefaultRouter()
+router.register(r'picking-batch', PickingBatchViewSet, basename='picking-batch')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
@@ -0,0 +1,66 @@
+from django.http import FileResponse, Http404
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from core.Utiilties.enum import PermissionEnum
+from core.Utiilties.idempotency import idempotent
+from core.Utiilties.permission_chacker import HasPermissionMixin
+from .models import PickingBatch, PickingBatchStatusChoices
+from .picking import create_batch, schedule_documents, NothingToPick, DOCUMENTS
+from .serializers import PickingBatchSerializer, PickingBatchCreateSerializer
+
+
+class PickingBatchViewSet(HasPermissionMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Picking batches for the warehouse. POST claims the PROCESSING orders of a window and
+    answers 202 right away, the documents are generated in the background
+    (fulfillment.picking); poll the batch until its status is Ready, then download them.
+    """
+    serializer_class = PickingBatchSerializer
+    permission_classes = [IsAuthenticated]
+
+    method_permissions = {
+        'GET': PermissionEnum.order_list,
+        'POST': PermissionEnum.order_update,
+    }
+
+    def get_queryset(self):
+        return PickingBatch.objects.order_by('-created_at')
+
+    @idempotent(scope='fulfillment:picking-batch:create')
+    def create(self, request, *args, **kwargs):
+        serializer = PickingBatchCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            batch = create_batch(user=request.user, **serializer.validated_data)
+        except NothingToPick as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(PickingBatchSerializer(batch).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['post'])
+    def regenerate(self, request, pk=None):
+        """
+        Generate the documents of a failed batch again.
+        """
+        batch = self.get_object()
+        if batch.status != PickingBatchStatusChoices.FAILED:
+            return Response({'error': 'Only failed batches are regenerated.'}, status=status.HTTP_400_BAD_REQUEST)
+        schedule_documents(batch.id)
+        return Response(PickingBatchSerializer(batch).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        ?document=picking_csv (default), packing_csv or picking_pdf.
+        """
+        batch = self.get_object()
+        document = request.query_params.get('document', 'picking_csv')
+        if document not in DOCUMENTS:
+            return Response({'document': [f"Use one of {', '.join(DOCUMENTS)}."]}, status=status.HTTP_400_BAD_REQUEST)
+        file = getattr(batch, document)
+        if not file:
+            raise Http404
+        return FileResponse(file.open('rb'), as_attachment=True, filename=file.name.rsplit('/', 1)[-1])
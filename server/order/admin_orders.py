@@ -0,0 +1,68 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Case, When, Value, F, Q, CharField
+from django.utils import timezone
+
+from .models import Order
+from .state_machine import record_transitions
+
+
+def local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_orders(queryset, filters):
+    """
+    Apply the validated admin listing filters (AdminOrderFilterSerializer). Each one maps
+    to a column leading one of Order's indexes.
+    """
+    if filters.get('status'):
+        queryset = queryset.filter(status__in=filters['status'])
+    if filters.get('payment_status'):
+        queryset = queryset.filter(payment_status__in=filters['payment_status'])
+    # plain bounds on created_at, a __date lookup would wrap the column and skip the index
+    if filters.get('created_from'):
+        queryset = queryset.filter(created_at__gte=local_midnight(filters['created_from']))
+    if filters.get('created_to'):
+        queryset = queryset.filter(created_at__lt=local_midnight(filters['created_to'] + timedelta(days=1)))
+    if filters.get('city'):
+        queryset = queryset.filter(city=filters['city'])
+    search = filters.get('search', '').strip()
+    if search:
+        # prefix matches, so both can use their index
+        queryset = queryset.filter(Q(order_number__startswith=search.upper()) | Q(phone_number__startswith=search))
+    return queryset.order_by('-created_at')
+
+
+def bulk_transition(order_ids, from_status, to_status, tracking_numbers=None, actor=None, note=''):
+    """
+    Move the orders of `order_ids` that are still in `from_status` to `to_status`, setting
+    tracking numbers ({order_id: number}) on the way, with one UPDATE. The transition log
+    and outbox events are written with one INSERT each. The caller checks the move against
+    order.state_machine. Returns the ids that were moved.
+    """
+    tracking_numbers = tracking_numbers or {}
+    updates = {'status': to_status, 'updated_at': timezone.now()}
+    if tracking_numbers:
+        updates['tracking_number'] = Case(
+            *[When(id=order_id, then=Value(number)) for order_id, number in tracking_numbers.items()],
+            default=F('tracking_number'),
+            output_field=CharField(),
+        )
+
+    with transaction.atomic():
+        # lock the rows in id order so concurrent bulk moves can't deadlock each other
+        rows = list(
+            Order.objects.select_for_update().filter(id__in=order_ids, status=from_status)
+            .order_by('id').values_list('id', 'user_id', 'order_number', 'tracking_number')
+        )
+        moved = [row[0] for row in rows]
+        if moved:
+            Order.objects.filter(id__in=moved).update(**updates)
+            record_transitions([
+                (order_id, user_id, order_number, 'status', from_status, to_status,
+                 {'tracking_number': tracking_numbers.get(order_id, tracking_number)})
+                for order_id, user_id, order_number, tracking_number in rows
+            ], actor=actor, note=note)
+    return moved
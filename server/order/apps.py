@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class OrderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'order'
+
+    def ready(self):
+        try:
+            import order.signals
+            import order.outbox_handlers
+        except Exception as e:
+            print(f"Error registering signals: {e}")
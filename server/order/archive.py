@@ -0,0 +1,89 @@
+"""
+Archival of closed orders.
+
+Old delivered/cancelled/refunded orders are moved in batches from the order tables to
+ArchivedOrder, one row per order with its detail as compressed JSON. The hot tables (and
+their indexes) then only grow with the recent orders, while the archived ones are still
+found by id for order detail (OrderViewSet.retrieve) and counted where history matters
+(first-order vouchers, per-user voucher limits via VoucherRedemption).
+"""
+import json
+import zlib
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from .models import Order, OrderItem, OrderTransition, ArchivedOrder, OrderStatusChoices
+from .serializers import AdminOrderDetailSerializer, OrderTransitionSerializer
+
+CLOSED_STATUSES = (OrderStatusChoices.DELIVERED, OrderStatusChoices.CANCELLED, OrderStatusChoices.REFUNDED)
+DEFAULT_BATCH_SIZE = 500
+COMPRESSION_LEVEL = 6
+
+
+def archive_cutoff(months):
+    return timezone.now() - timedelta(days=30 * months)
+
+
+def archivable_orders(cutoff):
+    return Order.objects.filter(created_at__lt=cutoff, status__in=CLOSED_STATUSES)
+
+
+def order_payload(order):
+    data = AdminOrderDetailSerializer(order).data
+    data['transitions'] = OrderTransitionSerializer(order.transitions.all(), many=True).data
+    return zlib.compress(json.dumps(data, cls=DjangoJSONEncoder).encode(), COMPRESSION_LEVEL)
+
+
+def archive_batch(cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Move up to `batch_size` archivable orders to ArchivedOrder in one transaction: one
+    read per table, one insert, one delete per table. Rows locked by someone else are
+    skipped for this run. Returns the number of orders archived.
+    """
+    with transaction.atomic():
+        orders = list(archivable_orders(cutoff).select_for_update(skip_locked=True).order_by('id')[:batch_size])
+        if not orders:
+            return 0
+        prefetch_related_objects(orders, 'items', 'transitions')
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(id=order.id, user_id=order.user_id, order_number=order.order_number, status=order.status,
+                          total=order.total, created_at=order.created_at, payload=order_payload(order))
+            for order in orders
+        ])
+        order_ids = [order.id for order in orders]
+        OrderTransition.objects.filter(order_id__in=order_ids).delete()
+        OrderItem.objects.filter(order_id__in=order_ids).delete()
+        Order.objects.filter(id__in=order_ids).delete()
+    return len(orders)
+
+
+def archive_orders(cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Archive every closed order created before `cutoff`, yielding the running total after
+    each batch.
+    """
+    archived = 0
+    while True:
+        count = archive_batch(cutoff, batch_size)
+        if not count:
+            return
+        archived += count
+        yield archived
+
+
+def get_archived_order(pk, user=None):
+    """
+    Detail of an archived order (None when there is none), limited to `user`'s orders
+    when given.
+    """
+    if not str(pk).isdigit():
+        return None
+    archived = ArchivedOrder.objects.filter(id=pk)
+    if user is not None:
+        archived = archived.filter(user=user)
+    archived = archived.first()
+    return archived.data if archived is not None else None
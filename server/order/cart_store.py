@@ -0,0 +1,474 @@
+import logging
+import re
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from redis.exceptions import WatchError
+from rest_framework.exceptions import NotAuthenticated
+
+from products.models import Product, SKU
+from .models import Cart, CartItem
+from .serializers import CartSerializer, CartItemSerializer
+
+logger = logging.getLogger(__name__)
+
+default_settings = {
+    'BACKEND': 'order.cart_store.RedisCartStore',
+    'ALIAS': 'default',
+    'USER_CART_TTL': 60 * 60 * 24 * 7,
+    'GUEST_CART_TTL': 60 * 60 * 24 * 30,
+}
+GUEST_TOKEN_RE = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+
+def get_cart_store_settings():
+    return {**default_settings, **getattr(settings, 'CART_STORE', {})}
+
+
+class CartOwner:
+    """
+    Who a cart belongs to: an authenticated user or a guest identified by a token.
+    """
+
+    def __init__(self, user_id=None, token=None):
+        self.user_id = user_id
+        self.token = token
+
+    @property
+    def is_guest(self):
+        return self.user_id is None
+
+    @property
+    def key(self):
+        return f"guest:{self.token}" if self.is_guest else f"user:{self.user_id}"
+
+    @classmethod
+    def from_request(cls, request):
+        if request.user.is_authenticated:
+            return cls(user_id=request.user.id)
+        token = request.META.get('HTTP_X_CART_TOKEN', '')
+        if not GUEST_TOKEN_RE.match(token):
+            token = secrets.token_urlsafe(24)
+        return cls(token=token)
+
+
+def line_id(product_id, sku_id):
+    return f"{product_id}-{sku_id or 0}"
+
+
+def parse_line_id(value):
+    product_id, sku_id = (int(part) for part in str(value).split('-'))
+    return product_id, sku_id or None
+
+
+def cart_item_lookup(item_id):
+    """
+    Filter kwargs for a CartItem addressed either by its id or by its line id.
+    """
+    item_id = str(item_id)
+    if item_id.isdigit():
+        return {'id': int(item_id)}
+    product_id, sku_id = parse_line_id(item_id)
+    return {'product_id': product_id, 'sku_id': sku_id}
+
+
+def hydrate_lines(lines):
+    """
+    Turn {(product_id, sku_id): quantity} into unsaved CartItems with product and SKU
+    loaded in two queries. Lines pointing at deleted products/SKUs are dropped.
+    """
+    products = Product.objects.in_bulk({product_id for product_id, _ in lines})
+    skus = SKU.objects.in_bulk({sku_id for _, sku_id in lines if sku_id})
+    items = []
+    for (product_id, sku_id), quantity in lines.items():
+        product = products.get(product_id)
+        sku = skus.get(sku_id) if sku_id else None
+        if product is None or (sku_id and sku is None):
+            continue
+        items.append(CartItem(product=product, sku=sku, quantity=quantity))
+    return items
+
+
+def serialize_items(items):
+    data = CartItemSerializer(items, many=True).data
+    for item, item_data in zip(items, data):
+        item_data['id'] = line_id(item.product_id, item.sku_id)
+    return data
+
+
+def upsert_cart_items(cart, lines, replace=False):
+    """
+    Apply {(product_id, sku_id): quantity} to a cart's rows with one bulk_update and one
+    bulk_create. With replace=True rows missing from `lines` are deleted as well.
+    """
+    items = cart.items.all()
+    if not replace:
+        items = items.filter(product_id__in={product_id for product_id, _ in lines})
+    existing = {(item.product_id, item.sku_id): item for item in items}
+    to_create, to_update = [], []
+    now = timezone.now()
+    for (product_id, sku_id), quantity in lines.items():
+        item = existing.pop((product_id, sku_id), None)
+        if item is None:
+            to_create.append(CartItem(cart=cart, product_id=product_id, sku_id=sku_id, quantity=quantity))
+        elif item.quantity != quantity:
+            item.quantity = quantity
+            item.updated_at = now
+            to_update.append(item)
+    if replace and existing:
+        CartItem.objects.filter(id__in=[item.id for item in existing.values()]).delete()
+    CartItem.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+    CartItem.objects.bulk_create(to_create)
+
+
+def lines_from_entries(entries):
+    """
+    Validated {product, sku, quantity} entries to {(product_id, sku_id): quantity}; the last entry wins.
+    """
+    return {(entry['product'].id, entry['sku'].id if entry['sku'] else None): entry['quantity'] for entry in entries}
+
+
+class DatabaseCartStore:
+    """
+    Carts kept as Cart/CartItem rows and written on every change. Authenticated users only.
+    """
+    supports_guests = False
+
+    def get_cart(self, owner, with_totals=False):
+        queryset = Cart.objects.with_totals() if with_totals else Cart.objects.all()
+        cart = queryset.filter(user_id=owner.user_id).first()
+        if cart is None:
+            cart = Cart.objects.create(user_id=owner.user_id)
+        return cart
+
+    @staticmethod
+    def version_key(owner):
+        return f"cart:{owner.key}:version"
+
+    def version(self, owner):
+        """
+        Counter bumped on every change of the cart (kept in the cache, the rows have no version).
+        """
+        return cache.get(self.version_key(owner), 0)
+
+    def _bump_version(self, owner):
+        cache.add(self.version_key(owner), 0, timeout=None)
+        try:
+            cache.incr(self.version_key(owner))
+        except ValueError:
+            cache.set(self.version_key(owner), 1, timeout=None)
+
+    def cart_data(self, owner):
+        return CartSerializer(self.get_cart(owner, with_totals=True)).data
+
+    def items_data(self, owner):
+        return CartItemSerializer(self.get_cart(owner).items.with_pricing(), many=True).data
+
+    def lines(self, owner):
+        rows = CartItem.objects.filter(cart__user_id=owner.user_id).values_list('product_id', 'sku_id', 'quantity')
+        return {(product_id, sku_id): quantity for product_id, sku_id, quantity in rows}
+
+    def checkout_items(self, owner):
+        return list(CartItem.objects.filter(cart__user_id=owner.user_id).select_related('product', 'sku'))
+
+    def set_items(self, owner, entries):
+        with transaction.atomic():
+            upsert_cart_items(self.get_cart(owner), lines_from_entries(entries))
+        self._bump_version(owner)
+
+    def update_quantity(self, owner, item_id, quantity):
+        try:
+            lookup = cart_item_lookup(item_id)
+        except ValueError:
+            return None
+        cart_item = CartItem.objects.with_pricing().filter(cart__user_id=owner.user_id, **lookup).first()
+        if cart_item is None:
+            return None
+        cart_item.quantity = quantity
+        cart_item.save(update_fields=['quantity', 'updated_at'])
+        self._bump_version(owner)
+        return CartItemSerializer(cart_item).data
+
+    def remove_item(self, owner, item_id):
+        try:
+            lookup = cart_item_lookup(item_id)
+        except ValueError:
+            return False
+        deleted, _ = CartItem.objects.filter(cart__user_id=owner.user_id, **lookup).delete()
+        self._bump_version(owner)
+        return bool(deleted)
+
+    def clear(self, owner):
+        CartItem.objects.filter(cart__user_id=owner.user_id).delete()
+        self._bump_version(owner)
+
+    def merge(self, guest_owner, user_owner):
+        pass
+
+    def persist(self, owner):
+        pass
+
+    def persist_dirty(self, batch_size=500):
+        return 0
+
+
+class RedisCartStore:
+    """
+    Hot carts live in one Redis hash per owner ("cart:user:42", "cart:guest:<token>")
+    with a field per line ("<product_id>-<sku_id or 0>" -> quantity), plus "_"-prefixed
+    fields for the Cart row id and the created/updated times shown in the cart response
+    (same shape as CartSerializer; guest carts have no id). Changes only touch
+    Redis: user carts are flagged dirty and written to Cart/CartItem rows later by the
+    persist_dirty_carts task, or right away at checkout. Guest carts live in Redis only
+    and are merged into the user's cart at login.
+    """
+    supports_guests = True
+    DIRTY_KEY = 'cart:dirty'
+    LOADED_FIELD = '_loaded'
+    CART_ID_FIELD = '_cart_id'
+    CREATED_FIELD = '_created_at'
+    UPDATED_FIELD = '_updated_at'
+
+    def __init__(self):
+        conf = get_cart_store_settings()
+        self.alias = conf['ALIAS']
+        self.user_ttl = conf['USER_CART_TTL']
+        self.guest_ttl = conf['GUEST_CART_TTL']
+
+    def connection(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection(self.alias)
+
+    @staticmethod
+    def cart_key(owner):
+        return f"cart:{owner.key}"
+
+    @staticmethod
+    def version_key(owner):
+        return f"cart:{owner.key}:version"
+
+    def ttl(self, owner):
+        return self.guest_ttl if owner.is_guest else self.user_ttl
+
+    @staticmethod
+    def timestamp(value=None):
+        return CartSerializer().fields['created_at'].to_representation(value or timezone.now())
+
+    def _decode(self, raw):
+        """
+        ({(product_id, sku_id): quantity}, {metadata field: value}) of a raw cart hash.
+        """
+        lines, meta = {}, {}
+        for field, value in raw.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            if field.startswith('_'):
+                meta[field] = value.decode() if isinstance(value, bytes) else value
+            else:
+                lines[parse_line_id(field)] = int(value)
+        return lines, meta
+
+    def _ensure_loaded(self, owner):
+        """
+        Warm a user cart that is not in Redis (evicted or never loaded) from its CartItem rows.
+        """
+        conn = self.connection()
+        key = self.cart_key(owner)
+        if owner.is_guest or conn.exists(key):
+            return
+        cart = Cart.objects.filter(user_id=owner.user_id).values('id', 'created_at', 'updated_at').first()
+        rows = CartItem.objects.filter(cart__user_id=owner.user_id).values_list('product_id', 'sku_id', 'quantity')
+        mapping = {line_id(product_id, sku_id): quantity for product_id, sku_id, quantity in rows}
+        mapping[self.LOADED_FIELD] = 1
+        if cart is not None:
+            mapping[self.CART_ID_FIELD] = cart['id']
+            mapping[self.CREATED_FIELD] = self.timestamp(cart['created_at'])
+            mapping[self.UPDATED_FIELD] = self.timestamp(cart['updated_at'])
+        with conn.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(key)
+                # a concurrent request already warmed (and maybe changed) the cart
+                if pipe.exists(key):
+                    return
+                pipe.multi()
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, self.ttl(owner))
+                pipe.execute()
+            except WatchError:
+                pass
+
+    def _pipeline(self):
+        return self.connection().pipeline(transaction=True)
+
+    def _commit(self, pipe, owner):
+        """
+        Queue the bookkeeping every change needs (TTL, version bump, dirty flag) and execute.
+        """
+        key = self.cart_key(owner)
+        now = self.timestamp()
+        pipe.hset(key, mapping={self.LOADED_FIELD: 1, self.UPDATED_FIELD: now})
+        pipe.hsetnx(key, self.CREATED_FIELD, now)
+        pipe.expire(key, self.ttl(owner))
+        pipe.incr(self.version_key(owner))
+        pipe.expire(self.version_key(owner), self.ttl(owner))
+        if not owner.is_guest:
+            pipe.sadd(self.DIRTY_KEY, owner.user_id)
+        return pipe.execute()
+
+    def _resolve_line(self, owner, item_id):
+        """
+        Line key for a line id, or for the id of a CartItem row (ids handed out before the
+        cart moved to Redis). Returns None when the item cannot be found.
+        """
+        try:
+            lookup = cart_item_lookup(item_id)
+        except ValueError:
+            return None
+        if 'id' in lookup:
+            if owner.is_guest:
+                return None
+            return CartItem.objects.filter(cart__user_id=owner.user_id, **lookup).values_list('product_id', 'sku_id').first()
+        return lookup['product_id'], lookup['sku_id']
+
+    def _read(self, owner):
+        self._ensure_loaded(owner)
+        return self._decode(self.connection().hgetall(self.cart_key(owner)))
+
+    def lines(self, owner):
+        return self._read(owner)[0]
+
+    def version(self, owner):
+        return int(self.connection().get(self.version_key(owner)) or 0)
+
+    def items_data(self, owner):
+        return serialize_items(hydrate_lines(self.lines(owner)))
+
+    def cart_data(self, owner):
+        lines, meta = self._read(owner)
+        items = hydrate_lines(lines)
+        total_amount = CartSerializer().fields['total_amount']
+        cart_id = meta.get(self.CART_ID_FIELD)
+        return {
+            'id': int(cart_id) if cart_id else None,
+            'user': owner.user_id,
+            'token': owner.token,
+            'items': serialize_items(items),
+            'total_amount': total_amount.to_representation(sum(item.subtotal for item in items)),
+            'total_items': sum(item.quantity for item in items),
+            'created_at': meta.get(self.CREATED_FIELD),
+            'updated_at': meta.get(self.UPDATED_FIELD),
+        }
+
+    def checkout_items(self, owner):
+        return hydrate_lines(self.lines(owner))
+
+    def set_items(self, owner, entries):
+        self._ensure_loaded(owner)
+        pipe = self._pipeline()
+        mapping = {line_id(product_id, sku_id): quantity for (product_id, sku_id), quantity in lines_from_entries(entries).items()}
+        pipe.hset(self.cart_key(owner), mapping=mapping)
+        self._commit(pipe, owner)
+
+    def update_quantity(self, owner, item_id, quantity):
+        line = self._resolve_line(owner, item_id)
+        if line is None:
+            return None
+        product_id, sku_id = line
+        self._ensure_loaded(owner)
+        field = line_id(product_id, sku_id)
+        if not self.connection().hexists(self.cart_key(owner), field):
+            return None
+        pipe = self._pipeline()
+        pipe.hset(self.cart_key(owner), field, quantity)
+        self._commit(pipe, owner)
+        items = hydrate_lines({(product_id, sku_id): quantity})
+        return serialize_items(items)[0] if items else None
+
+    def remove_item(self, owner, item_id):
+        line = self._resolve_line(owner, item_id)
+        if line is None:
+            return False
+        product_id, sku_id = line
+        self._ensure_loaded(owner)
+        pipe = self._pipeline()
+        pipe.hdel(self.cart_key(owner), line_id(product_id, sku_id))
+        return bool(self._commit(pipe, owner)[0])
+
+    def clear(self, owner):
+        pipe = self._pipeline()
+        pipe.delete(self.cart_key(owner))
+        self._commit(pipe, owner)
+
+    def merge(self, guest_owner, user_owner):
+        """
+        Add the guest cart's quantities to the user's cart and drop the guest cart.
+        """
+        guest_lines = self.lines(guest_owner)
+        if guest_lines:
+            self._ensure_loaded(user_owner)
+            pipe = self._pipeline()
+            for (product_id, sku_id), quantity in guest_lines.items():
+                pipe.hincrby(self.cart_key(user_owner), line_id(product_id, sku_id), quantity)
+            self._commit(pipe, user_owner)
+        self.connection().delete(self.cart_key(guest_owner), self.version_key(guest_owner))
+
+    def persist(self, owner):
+        """
+        Write a user's Redis cart to its Cart/CartItem rows in one transaction.
+        """
+        if owner.is_guest:
+            return
+        version = self.version(owner)
+        lines = self.lines(owner)
+
+        product_ids = set(Product.objects.filter(id__in={p for p, _ in lines}).values_list('id', flat=True))
+        sku_ids = set(SKU.objects.filter(id__in={s for _, s in lines if s}).values_list('id', flat=True))
+        lines = {
+            (product_id, sku_id): quantity for (product_id, sku_id), quantity in lines.items()
+            if product_id in product_ids and (sku_id is None or sku_id in sku_ids)
+        }
+
+        with transaction.atomic():
+            cart = Cart.objects.filter(user_id=owner.user_id).first() or Cart.objects.create(user_id=owner.user_id)
+            upsert_cart_items(cart, lines, replace=True)
+        if self.connection().exists(self.cart_key(owner)):
+            self.connection().hset(self.cart_key(owner), self.CART_ID_FIELD, cart.id)
+
+        # Only drop the dirty flag if the cart did not change while it was being written.
+        with self.connection().pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(self.version_key(owner))
+                if int(pipe.get(self.version_key(owner)) or 0) == version:
+                    pipe.multi()
+                    pipe.srem(self.DIRTY_KEY, owner.user_id)
+                    pipe.execute()
+            except WatchError:
+                logger.info(f"Cart {owner.key} changed while persisting, keeping it dirty")
+
+    def persist_dirty(self, batch_size=500):
+        persisted = 0
+        for user_id in self.connection().srandmember(self.DIRTY_KEY, batch_size) or []:
+            owner = CartOwner(user_id=int(user_id))
+            try:
+                self.persist(owner)
+                persisted += 1
+            except Exception as e:
+                logger.error(f"Failed to persist cart {owner.key}: {e}")
+        return persisted
+
+
+def get_cart_store():
+    return import_string(get_cart_store_settings()['BACKEND'])()
+
+
+cart_store = get_cart_store()
+
+
+def get_request_cart_owner(request):
+    owner = CartOwner.from_request(request)
+    if owner.is_guest and not cart_store.supports_guests:
+        raise NotAuthenticated('Authentication required.')
+    return owner
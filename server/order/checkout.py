@@ -0,0 +1,139 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, When, F
+
+from core.Utiilties.outbox import emit
+from products.cache import invalidate_product_stock
+from products.models import Product, SKU
+from .cart_store import cart_store
+from .models import CartItem, Order, OrderItem, variant_snapshot
+from .state_machine import ORDER_PLACED, order_payload
+from .vouchers import redeem_voucher
+
+
+class InsufficientStock(Exception):
+    def __init__(self, lines):
+        self.lines = lines
+        super().__init__('Not enough stock for some items in the cart')
+
+
+def stock_decrements(items):
+    """
+    Quantities to take from SKU rows and from Product rows (products sold without a SKU).
+    """
+    skus, products = defaultdict(int), defaultdict(int)
+    for item in items:
+        if item.sku_id:
+            skus[item.sku_id] += item.quantity
+        else:
+            products[item.product_id] += item.quantity
+    return skus, products
+
+
+def decrement_stock(model, quantities):
+    """
+    Lock the rows (in id order, so concurrent checkouts can't deadlock), check them in
+    memory and take all quantities with one UPDATE. Rows with no stock tracked (NULL) are
+    left alone. Returns the shortages as {id: available}.
+    """
+    if not quantities:
+        return {}
+    available = dict(
+        model.objects.select_for_update().filter(id__in=quantities).order_by('id').values_list('id', 'stock_quantity')
+    )
+    tracked = {pk: quantity for pk, quantity in quantities.items() if available.get(pk) is not None}
+    shortages = {pk: available[pk] for pk, quantity in tracked.items() if available[pk] < quantity}
+    if shortages or not tracked:
+        return shortages
+    model.objects.filter(id__in=tracked).update(stock_quantity=Case(
+        *(When(id=pk, then=F('stock_quantity') - quantity) for pk, quantity in tracked.items()),
+        default=F('stock_quantity'),
+        output_field=model._meta.get_field('stock_quantity'),
+    ))
+    return {}
+
+
+def increment_stock(model, quantities):
+    if quantities:
+        model.objects.filter(id__in=quantities).update(stock_quantity=Case(
+            *(When(id=pk, then=F('stock_quantity') + quantity) for pk, quantity in quantities.items()),
+            default=F('stock_quantity'),
+            output_field=model._meta.get_field('stock_quantity'),
+        ))
+
+
+def reserve_stock(items):
+    sku_quantities, product_quantities = stock_decrements(items)
+    sku_shortages = decrement_stock(SKU, sku_quantities)
+    product_shortages = {} if sku_shortages else decrement_stock(Product, product_quantities)
+    if sku_shortages or product_shortages:
+        raise InsufficientStock([
+            {'product': item.product_id, 'sku': item.sku_id, 'quantity': item.quantity,
+             'available': sku_shortages[item.sku_id] if item.sku_id else product_shortages[item.product_id]}
+            for item in items
+            if (item.sku_id in sku_shortages) or (not item.sku_id and item.product_id in product_shortages)
+        ])
+
+
+def sku_variants(sku_ids):
+    """
+    {sku_id: [VariantValue with attribute]} for the ordered SKUs, in one query.
+    """
+    through = SKU.variants.through
+    variants = defaultdict(list)
+    for row in through.objects.filter(sku_id__in=set(sku_ids)).select_related('variantvalue__attribute'):
+        variants[row.sku_id].append(row.variantvalue)
+    return variants
+
+
+@transaction.atomic
+def place_order(user, owner, items, serializer):
+    """
+    Set-based checkout: `items` are the cart's CartItems with product/SKU loaded (one read),
+    priced in memory. Stock is taken in one UPDATE per table, the order items are written
+    with one bulk_create and the cart is emptied with one DELETE. Confirmation email and the
+    like go through the outbox (order.outbox_handlers).
+    """
+    reserve_stock(items)
+
+    order = serializer.save(user=user, subtotal=sum(item.subtotal for item in items))
+    if order.voucher_id:
+        redeem_voucher(serializer.compiled_voucher, user, order)
+    variants = sku_variants(item.sku_id for item in items if item.sku_id)
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product_id=item.product_id,
+            sku_id=item.sku_id,
+            quantity=item.quantity,
+            unit_price=item.unit_price,
+            subtotal=item.subtotal,
+            variant_info=variant_snapshot(item.product, item.sku, variants.get(item.sku_id, ())),
+        )
+        for item in items
+    ])
+
+    CartItem.objects.filter(cart__user_id=user.id).delete()
+    emit(ORDER_PLACED, order_payload(order.id, user.id, order.order_number, total=str(order.total)))
+    product_ids = {item.product_id for item in items}
+    transaction.on_commit(lambda: cart_store.clear(owner))
+    transaction.on_commit(lambda: invalidate_product_stock(*product_ids))
+    return order
+
+
+@transaction.atomic
+def release_stock(order_id):
+    """
+    Give the stock of a cancelled order back, at most once per order (two UPDATEs however
+    many items). Returns whether anything was released.
+    """
+    if not Order.objects.filter(id=order_id, stock_released=False).update(stock_released=True):
+        return False
+    items = list(OrderItem.objects.filter(order_id=order_id).only('product_id', 'sku_id', 'quantity'))
+    sku_quantities, product_quantities = stock_decrements(items)
+    increment_stock(SKU, sku_quantities)
+    increment_stock(Product, product_quantities)
+    product_ids = {item.product_id for item in items}
+    transaction.on_commit(lambda: invalidate_product_stock(*product_ids))
+    return True
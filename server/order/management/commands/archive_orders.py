@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from order.archive import archive_cutoff, archivable_orders, archive_orders, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Move delivered, cancelled and refunded orders older than N months to the compressed archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=12, help="Archive orders created more than this many months ago.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Only count the orders that would be archived.")
+
+    def handle(self, *args, **options):
+        if options['months'] < 1:
+            raise CommandError("--months must be at least 1.")
+        cutoff = archive_cutoff(options['months'])
+        if options['dry_run']:
+            self.stdout.write(f"{archivable_orders(cutoff).count()} orders created before {cutoff:%Y-%m-%d} would be archived")
+            return
+
+        started = time.monotonic()
+        archived = 0
+        for archived in archive_orders(cutoff, options['batch_size']):
+            self.stderr.write(f"{archived} orders archived", ending='\r')
+        self.stderr.write(f"\nArchived {archived} orders created before {cutoff:%Y-%m-%d} in {time.monotonic() - started:.1f}s")
@@ -0,0 +1,62 @@
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.models import User, Address
+from order.cart_store import DatabaseCartStore, CartOwner
+from order.checkout import place_order
+from order.serializers import OrderSerializer
+from products.models import Product, Category
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Measure checkout latency and query count against cart size. Everything runs in a transaction that is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,10,50,100,200', help="Comma separated cart sizes.")
+        parser.add_argument('--repeat', type=int, default=5, help="Checkouts per cart size.")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        try:
+            with transaction.atomic():
+                self.run(sizes, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, sizes, repeat):
+        store = DatabaseCartStore()
+        category = Category.objects.create(label=f'benchmark-{uuid.uuid4().hex[:8]}')
+        products = Product.objects.bulk_create([
+            Product(name=f'benchmark product {i}', base_price=100 + i, stock_quantity=10 ** 6, category=category)
+            for i in range(max(sizes))
+        ])
+
+        self.stdout.write(f"{'items':>6} {'median ms':>10} {'min ms':>8} {'queries':>8}")
+        for size in sizes:
+            timings, queries = [], 0
+            for _ in range(repeat):
+                user = User.objects.create_user(email=f'{uuid.uuid4().hex}@benchmark.local', phone='')
+                Address.objects.create(user=user, name='benchmark', address_line1='-', phone_number='-')
+                owner = CartOwner(user_id=user.id)
+                store.set_items(owner, [{'product': product, 'sku': None, 'quantity': 1} for product in products[:size]])
+
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    items = store.checkout_items(owner)
+                    serializer = OrderSerializer(data={}, context={'user': user})
+                    serializer.is_valid(raise_exception=True)
+                    place_order(user, owner, items, serializer)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries = len(captured.captured_queries)
+
+            self.stdout.write(f"{size:>6} {statistics.median(timings):>10.2f} {min(timings):>8.2f} {queries:>8}")
@@ -0,0 +1,62 @@
+import sys
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from order.models import DiscountTypeChoices
+from order.serializers import VoucherGenerateSerializer
+from order.voucher_codes import generate_vouchers
+
+
+class Command(BaseCommand):
+    help = "Bulk generate single-use voucher codes and write them as CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int)
+        parser.add_argument('--discount-type', choices=['percentage', 'fixed'], default='fixed')
+        parser.add_argument('--value', required=True, help="Discount value (amount, or percent).")
+        parser.add_argument('--max-discount', help="Maximum discount amount, defaults to --value.")
+        parser.add_argument('--valid-days', type=int, default=30)
+        parser.add_argument('--usage-limit', type=int, default=1)
+        parser.add_argument('--per-user-limit', type=int, default=1)
+        parser.add_argument('--min-subtotal')
+        parser.add_argument('--campaign', type=int, help="Campaign id the codes belong to.")
+        parser.add_argument('--prefix', default='')
+        parser.add_argument('--length', type=int, default=12)
+        parser.add_argument('--output', help="CSV file to write, stdout by default.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        serializer = VoucherGenerateSerializer(data={
+            'count': options['count'],
+            'prefix': options['prefix'],
+            'length': options['length'],
+            'discount_type': DiscountTypeChoices[options['discount_type'].upper()].value,
+            'discount_value': options['value'],
+            'max_discount_amount': options['max_discount'] or options['value'],
+            'valid_from': now,
+            'valid_to': now + timedelta(days=options['valid_days']),
+            'usage_limit': options['usage_limit'],
+            'per_user_limit': options['per_user_limit'],
+            'min_subtotal': options['min_subtotal'],
+            'campaign': options['campaign'],
+        })
+        if not serializer.is_valid():
+            raise CommandError(serializer.errors)
+
+        count, prefix, length, template, scopes = serializer.split()
+        output = open(options['output'], 'w') if options['output'] else sys.stdout
+        started = time.monotonic()
+        created = 0
+        try:
+            output.write('code\n')
+            for codes in generate_vouchers(count, template, scopes=scopes, prefix=prefix, length=length):
+                output.write(''.join(f'{code}\n' for code in codes))
+                created += len(codes)
+                self.stderr.write(f"{created}/{count} codes", ending='\r')
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        self.stderr.write(f"\nCreated {created} vouchers in {time.monotonic() - started:.1f}s")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from order.checkout import sku_variants
+from order.models import OrderItem, variant_snapshot
+
+
+class Command(BaseCommand):
+    help = "Fill variant_info on order items placed before it was snapshotted at checkout."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        last_id = 0
+        updated = 0
+        while True:
+            items = list(
+                OrderItem.objects.filter(id__gt=last_id, variant_info={})
+                .select_related('product', 'sku').order_by('id')[:options['batch_size']]
+            )
+            if not items:
+                break
+            variants = sku_variants(item.sku_id for item in items if item.sku_id)
+            for item in items:
+                item.variant_info = variant_snapshot(item.product, item.sku, variants.get(item.sku_id, ()))
+            OrderItem.objects.bulk_update(items, ['variant_info'])
+            updated += len(items)
+            last_id = items[-1].id
+            self.stderr.write(f"{updated} order items", ending='\r')
+        self.stderr.write(f"\nSnapshotted {updated} order items")
@@ -1,10 +1,16 @@
-import time
+import json
+import zlib
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Case, When, F, Q, Sum, Prefetch
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 from products.models import Product, SKU
+from .order_number import generate_order_number
 
 User = get_user_model()
 
@@ -30,6 +36,16 @@ class DiscountTypeChoices(models.IntegerChoices):
     FIXED = 2, 'Fixed'
 
 
+def calculate_discount(discount_type, discount_value, max_discount_amount, subtotal):
+    if discount_type == DiscountTypeChoices.PERCENTAGE:
+        discount = (subtotal * discount_value) / 100
+        if max_discount_amount:
+            discount = min(discount, max_discount_amount)
+    else:  # Fixed amount
+        discount = discount_value
+    return min(discount, subtotal).quantize(Decimal('0.01'))
+
+
 class Voucher(models.Model):
     # DISCOUNT_TYPE_CHOICES = (
     #     ('PERCENTAGE', 'Percentage'),
@@ -48,6 +64,27 @@ class Voucher(models.Model):
     usage_limit = models.PositiveIntegerField(null=True, blank=True,
                                               help_text="Maximum number of times the voucher can be used.")
     times_used = models.PositiveIntegerField(default=0)
+    per_user_limit = models.PositiveIntegerField(null=True, blank=True,
+                                                 help_text="Maximum number of times one customer can use the voucher.")
+    use_flash_counter = models.BooleanField(
+        default=False,
+        help_text="Gate redemptions with a Redis counter before touching the database (flash sale codes)."
+    )
+
+    # Eligibility rules, evaluated by order.voucher_engine
+    min_subtotal = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                                       help_text="Minimum cart subtotal for the voucher to apply.")
+    categories = models.ManyToManyField('products.Category', blank=True, related_name='vouchers',
+                                        help_text="Limit the discount to products of these categories.")
+    brands = models.ManyToManyField('products.Brand', blank=True, related_name='vouchers',
+                                    help_text="Limit the discount to products of these brands.")
+    products = models.ManyToManyField(Product, blank=True, related_name='vouchers',
+                                      help_text="Limit the discount to these products.")
+    campaign = models.ForeignKey('campaign.Campaign', related_name='vouchers', on_delete=models.SET_NULL,
+                                 null=True, blank=True, help_text="Campaign the voucher was generated for.")
+    first_order_only = models.BooleanField(default=False, help_text="Only valid on a customer's first order.")
+    is_stackable = models.BooleanField(default=True,
+                                       help_text="Also discount items that already have a sale price.")
 
     def is_valid(self):
         """
@@ -64,30 +101,86 @@ class Voucher(models.Model):
         """
         Calculate the discount amount based on the subtotal.
         """
-        if self.discount_type == 'PERCENTAGE':
-            discount = (subtotal * self.discount_value) / 100
-            if self.max_discount_amount:
-                discount = min(discount, self.max_discount_amount)
-        else:  # Fixed amount
-            discount = self.discount_value
-        return discount
+        return calculate_discount(self.discount_type, self.discount_value, self.max_discount_amount, subtotal)
 
     def __str__(self):
         return f"{self.code} ({self.get_discount_type_display()})"
 
 
+PRICE_FIELD = models.DecimalField(max_digits=10, decimal_places=2)
+AMOUNT_FIELD = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+def effective_price_expression(prefix, price_field):
+    """
+    SQL version of SKU.get_price / Product.get_price: the discount price when set, else the regular price.
+    """
+    discount_field = f'{prefix}discount_price'
+    return Case(
+        When(Q(**{f'{discount_field}__isnull': False}) & ~Q(**{discount_field: 0}), then=F(discount_field)),
+        default=F(f'{prefix}{price_field}'),
+        output_field=PRICE_FIELD,
+    )
+
+
+def unit_price_expression(prefix=''):
+    """
+    SQL version of CartItem.unit_price, `prefix` is the path to the cart item (e.g. 'items__').
+    """
+    return Case(
+        When(**{f'{prefix}sku__isnull': False}, then=effective_price_expression(f'{prefix}sku__', 'price')),
+        default=effective_price_expression(f'{prefix}product__', 'base_price'),
+        output_field=PRICE_FIELD,
+    )
+
+
+def cart_totals_expressions(prefix=''):
+    return {
+        'total_amount': Coalesce(
+            Sum(unit_price_expression(prefix) * F(f'{prefix}quantity'), output_field=AMOUNT_FIELD), 0,
+            output_field=AMOUNT_FIELD,
+        ),
+        'total_items': Coalesce(Sum(f'{prefix}quantity'), 0),
+    }
+
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotate totals in the cart query and prefetch priced items, so a cart
+        serializes in a fixed number of queries whatever its size.
+        """
+        totals = cart_totals_expressions('items__')
+        return self.annotate(
+            annotated_total_amount=totals['total_amount'],
+            annotated_total_items=totals['total_items'],
+        ).prefetch_related(Prefetch('items', queryset=CartItem.objects.with_pricing()))
+
+
+class CartItemQuerySet(models.QuerySet):
+    def with_pricing(self):
+        return self.select_related('product', 'sku').annotate(annotated_unit_price=unit_price_expression())
+
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
+    def get_totals(self):
+        if hasattr(self, 'annotated_total_amount'):
+            return {'total_amount': self.annotated_total_amount, 'total_items': self.annotated_total_items}
+        return self.items.aggregate(**cart_totals_expressions())
+
     @property
     def total_amount(self):
-        return sum(item.subtotal for item in self.items.all())
+        return self.get_totals()['total_amount']
 
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.get_totals()['total_items']
 
     def __str__(self):
         return f"Cart {self.id} - {'User: ' + str(self.user)}"
@@ -101,6 +194,8 @@ class CartItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         unique_together = [['cart', 'product', 'sku']]
 
@@ -109,6 +204,8 @@ class CartItem(models.Model):
         """
         Calculate the unit price based on SKU or product.
         """
+        if hasattr(self, 'annotated_unit_price'):
+            return self.annotated_unit_price
 
         return self.sku.get_price if self.sku else self.product.get_price
         # if self.sku:
@@ -172,25 +269,34 @@ class Order(models.Model):
     # Optional fields
     notes = models.TextField(blank=True, default='')
     tracking_number = models.CharField(max_length=100, blank=True, null=True)
+    stock_released = models.BooleanField(default=False, help_text="Stock of a cancelled order was given back.")
+
+    class Meta:
+        # Back the admin order listing (order.admin_orders): every filter narrows on its
+        # column and reads the newest orders first straight from the index.
+        indexes = [
+            models.Index(fields=['-created_at'], name='order_created_idx'),
+            # a customer's order history, newest first
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+            models.Index(fields=['payment_status', '-created_at'], name='order_payment_created_idx'),
+            models.Index(fields=['status', 'payment_status', '-created_at'], name='order_status_payment_idx'),
+            models.Index(fields=['city', '-created_at'], name='order_city_created_idx'),
+            # prefix search (LIKE 'x%') on PostgreSQL needs the pattern operator class
+            models.Index(fields=['order_number'], name='order_number_prefix_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['phone_number'], name='order_phone_prefix_idx', opclasses=['varchar_pattern_ops']),
+            # orders changed since a watermark, for the analytics rollups and exports
+            models.Index(fields=['updated_at'], name='order_updated_at_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.order_number:
-            # Generate order number based on timestamp and user ID
-            timestamp = int(time.time())
-            self.order_number = f"ORD-{timestamp}-{self.user.id}"
-
-        # Calculate discount if voucher exists and is valid
-        if self.voucher:
-            if self.voucher.is_valid():
-                self.discount_amount = self.voucher.calculate_discount(self.subtotal)
-                # Increment usage count only for new orders
-                if not self.pk:
-                    self.voucher.times_used += 1
-                    self.voucher.save()
-            else:
-                # Don't automatically remove invalid voucher, let serializer handle it
-                self.discount_amount = 0
-        else:
+            # Time ordered and unique across workers, see order.order_number
+            self.order_number = generate_order_number()
+
+        # The discount is worked out by the voucher engine when the order is placed
+        # (order.voucher_engine) and usage is counted by order.vouchers.redeem_voucher
+        if not self.voucher_id:
             self.discount_amount = 0
 
         # Calculate final total
@@ -202,6 +308,105 @@ class Order(models.Model):
         return f"Order {self.order_number} - {self.status}"
 
 
+class OrderTransition(models.Model):
+    """
+    Append-only log of status and payment status changes, written by order.state_machine.
+    """
+    order = models.ForeignKey(Order, related_name='transitions', on_delete=models.CASCADE)
+    field = models.CharField(max_length=20, help_text="status or payment_status")
+    from_value = models.IntegerField()
+    to_value = models.IntegerField()
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    note = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'created_at']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Order transitions can't be changed once written.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.order_id} {self.field}: {self.from_value} -> {self.to_value}"
+
+
+class ShippingRule(models.Model):
+    """
+    Shipping cost for a zone (city/area, blank = any) and a weight/quantity tier.
+    The most specific zone with a matching rule wins, then the highest priority.
+    """
+    name = models.CharField(max_length=100)
+    city = models.CharField(max_length=100, blank=True, default="", help_text="Blank matches every city.")
+    area = models.CharField(max_length=100, blank=True, default="", help_text="Blank matches every area of the city.")
+    min_weight = models.DecimalField(max_digits=8, decimal_places=3, default=0, help_text="kg, inclusive")
+    max_weight = models.DecimalField(max_digits=8, decimal_places=3, null=True, blank=True, help_text="kg, exclusive")
+    min_quantity = models.PositiveIntegerField(default=0)
+    max_quantity = models.PositiveIntegerField(null=True, blank=True, help_text="exclusive")
+    base_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+    cost_per_kg = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+    cost_per_item = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+    free_shipping_threshold = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True,
+        help_text="Shipping is free when the discounted subtotal reaches this amount."
+    )
+    priority = models.IntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.city or '*'}/{self.area or '*'})"
+
+
+class TaxRule(models.Model):
+    """
+    Tax rate (percent) for a zone, optionally only for one category.
+    """
+    name = models.CharField(max_length=100)
+    city = models.CharField(max_length=100, blank=True, default="", help_text="Blank matches every city.")
+    area = models.CharField(max_length=100, blank=True, default="", help_text="Blank matches every area of the city.")
+    category = models.ForeignKey('products.Category', on_delete=models.CASCADE, null=True, blank=True,
+                                 help_text="Blank applies to every category.")
+    rate = models.DecimalField(max_digits=5, decimal_places=2, validators=[MinValueValidator(0)])
+    applies_to_shipping = models.BooleanField(default=False)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.name} {self.rate}% ({self.city or '*'}/{self.area or '*'})"
+
+
+class VoucherRedemption(models.Model):
+    voucher = models.ForeignKey(Voucher, related_name='redemptions', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # kept when the order is archived (order.archive), per-user limits still count it
+    order = models.OneToOneField(Order, related_name='voucher_redemption', on_delete=models.SET_NULL,
+                                 null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['voucher', 'user']),
+        ]
+
+    def __str__(self):
+        return f"{self.voucher.code} - {self.order.order_number if self.order_id else 'archived order'}"
+
+
+def variant_snapshot(product, sku=None, variants=()):
+    """
+    What an order item shows of its product and SKU, frozen when it is ordered so order
+    pages need no product queries and don't change when the catalog is edited later.
+    `variants` are the SKU's VariantValues with their attribute loaded.
+    """
+    return {
+        'product_name': product.name,
+        'sku_code': sku.sku_code if sku is not None else None,
+        'variants': {variant.attribute.name: variant.value for variant in variants},
+    }
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.PROTECT)
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
@@ -210,25 +415,20 @@ class OrderItem(models.Model):
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
 
-    # Store variant information at the time of order
-    # variant_info = models.JSONField(default=dict, blank=True)
+    # Product/SKU as they were at the time of order, see variant_snapshot
+    variant_info = models.JSONField(default=dict, blank=True)
 
     class Meta:
         unique_together = [['order', 'product', 'sku']]
 
-    @property
-    def variant_info(self):
-        if self.sku:
-            return  self.sku.variants_dict
-        return None
-
     def save(self, *args, **kwargs):
         # Calculate subtotal
         self.subtotal = self.quantity * self.unit_price
 
-        # Store variant information if SKU exists
-        # if self.sku:
-        #     self.variant_info = self.sku.variants_dict
+        # Store variant information at the time of order (checkout fills it in bulk)
+        if not self.variant_info:
+            variants = self.sku.variants.select_related('attribute') if self.sku_id else ()
+            self.variant_info = variant_snapshot(self.product, self.sku, variants)
 
         super().save(*args, **kwargs)
 
@@ -236,3 +436,31 @@ class OrderItem(models.Model):
         if self.sku:
             return f"{self.order.order_number} - {self.product.name} - {self.sku.sku_code} (x{self.quantity})"
         return f"{self.order.order_number} - {self.product.name} (x{self.quantity})"
+
+
+class ArchivedOrder(models.Model):
+    """
+    Cold storage for closed orders moved out of the order tables by order.archive: a few
+    columns to find them by and the full order detail (items, status history) as
+    compressed JSON. Keeps the id the order had, so detail URLs stay valid.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.PROTECT, related_name='archived_orders')
+    order_number = models.CharField(max_length=50, unique=True)
+    status = models.IntegerField(choices=OrderStatusChoices.choices)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    payload = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archived_order_user_idx'),
+        ]
+
+    @property
+    def data(self):
+        return {**json.loads(zlib.decompress(self.payload)), 'archived': True}
+
+    def __str__(self):
+        return f"Archived order {self.order_number}"
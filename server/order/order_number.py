@@ -0,0 +1,180 @@
+"""
+Order numbers without a database round trip.
+
+Snowflake-style 63-bit ids: milliseconds since ORDER_NUMBER_EPOCH (41 bits), a worker id
+(10 bits) and a per-millisecond sequence (12 bits), written as 13 base36 digits after the
+order date (local time): ORD-261019-0A1B2C3D4E5F6. Numbers are unique across processes
+as long as workers hold different ids, and sort by creation time as plain strings.
+
+Worker ids are leased in the cache for WORKER_LEASE_TTL seconds and renewed while the
+process issues numbers; a process that lost its lease (stalled longer than the TTL) takes
+a new id before its next number. At most 1024 processes can hold an id at once. Without
+the cache, the id is derived from the host name and pid: collisions between hosts are
+then unlikely but possible, and a lease is taken again as soon as the cache is back.
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+import zlib
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+DEFAULT_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+BASE36_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+WIDTH = 13  # 36 ** 13 > 2 ** 63
+WORKER_COUNTER_KEY = 'order_number:worker_counter'
+WORKER_LEASE_KEY = 'order_number:worker:{}'
+WORKER_LEASE_TTL = getattr(settings, 'ORDER_NUMBER_WORKER_LEASE_TTL', 600)
+
+
+def to_base36(number, width=WIDTH):
+    digits = []
+    while number:
+        number, remainder = divmod(number, 36)
+        digits.append(BASE36_ALPHABET[remainder])
+    return ''.join(reversed(digits)).rjust(width, '0')
+
+
+def fallback_worker_id():
+    return zlib.crc32(f"{socket.gethostname()}:{os.getpid()}".encode()) & MAX_WORKER_ID
+
+
+def lease_worker_id(token):
+    """
+    Lease a free worker id for `token`, None when all of them are taken. The shared counter
+    only spreads the starting point of the search.
+    """
+    cache.add(WORKER_COUNTER_KEY, 0, timeout=None)
+    start = cache.incr(WORKER_COUNTER_KEY)
+    for offset in range(MAX_WORKER_ID + 1):
+        worker_id = (start + offset) & MAX_WORKER_ID
+        if cache.add(WORKER_LEASE_KEY.format(worker_id), token, timeout=WORKER_LEASE_TTL):
+            return worker_id
+    return None
+
+
+def renew_worker_id(worker_id, token):
+    """
+    Extend the lease of `worker_id`, False when it expired and another process took it.
+    """
+    key = WORKER_LEASE_KEY.format(worker_id)
+    holder = cache.get(key)
+    if holder is None:
+        return cache.add(key, token, timeout=WORKER_LEASE_TTL)
+    if holder != token:
+        return False
+    cache.set(key, token, timeout=WORKER_LEASE_TTL)
+    return True
+
+
+def allocate_worker_id(token):
+    """
+    (worker id, leased?) for this process; falls back to a host and pid derived id when
+    the cache is unavailable or every id is leased.
+    """
+    try:
+        worker_id = lease_worker_id(token)
+        if worker_id is not None:
+            return worker_id, True
+        logger.warning("All order number worker ids are leased, deriving one from the host and pid")
+    except Exception as e:
+        logger.warning(f"Could not lease an order number worker id, deriving one from the host and pid: {e}")
+    return fallback_worker_id(), False
+
+
+class OrderNumberGenerator:
+    def __init__(self, prefix='ORD', epoch=DEFAULT_EPOCH):
+        self.prefix = prefix
+        self.epoch_ms = int(epoch.timestamp() * 1000)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._token = None
+        self._worker_id = None
+        self._leased = False
+        self._renew_at = 0
+        self._last_ms = -1  # timestamp of the last id, may run ahead of the clock
+        self._last_clock_ms = -1  # last clock reading
+        self._sequence = 0
+
+    @property
+    def worker_id(self):
+        # a forked child (gunicorn/celery prefork) must not share its parent's id
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._token = uuid.uuid4().hex
+            self._last_ms, self._last_clock_ms, self._sequence = -1, -1, 0
+            self._acquire()
+        elif time.monotonic() >= self._renew_at:
+            self._renew()
+        return self._worker_id
+
+    def _acquire(self):
+        self._worker_id, self._leased = allocate_worker_id(self._token)
+        # renew well before the lease runs out; retry a failed lease sooner
+        self._renew_at = time.monotonic() + WORKER_LEASE_TTL / (3 if self._leased else 10)
+
+    def _renew(self):
+        if not self._leased:
+            self._acquire()
+            return
+        try:
+            renewed = renew_worker_id(self._worker_id, self._token)
+        except Exception as e:
+            # keep the id: nobody else can lease it before it expires
+            logger.warning(f"Could not renew order number worker id {self._worker_id}: {e}")
+            renewed = True
+        if renewed:
+            self._renew_at = time.monotonic() + WORKER_LEASE_TTL / 3
+        else:
+            logger.warning(f"Order number worker id {self._worker_id} was taken over, leasing a new one")
+            self._acquire()
+
+    def next_id(self):
+        with self._lock:
+            worker_id = self.worker_id
+            now_ms = int(time.time() * 1000) - self.epoch_ms
+            # ids borrowing milliseconds after a sequence overflow run ahead of the clock on
+            # purpose, only a clock reading below the previous one is a rollback
+            if now_ms < self._last_clock_ms:
+                logger.warning(f"Clock moved back {self._last_clock_ms - now_ms}ms, keeping the last timestamp")
+            self._last_clock_ms = now_ms
+            # never go back in time: on rollback keep counting on the last millisecond
+            ms = max(now_ms, self._last_ms)
+            if ms == self._last_ms:
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    # sequence exhausted, borrow the next millisecond
+                    ms += 1
+                    self._sequence = 0
+            else:
+                self._sequence = 0
+            self._last_ms = ms
+            return (ms << (WORKER_BITS + SEQUENCE_BITS)) | (worker_id << SEQUENCE_BITS) | self._sequence
+
+    def timestamp_of(self, snowflake):
+        ms = (snowflake >> (WORKER_BITS + SEQUENCE_BITS)) + self.epoch_ms
+        return datetime.fromtimestamp(ms / 1000, tz=dt_timezone.utc)
+
+    def next_order_number(self):
+        snowflake = self.next_id()
+        date = timezone.localtime(self.timestamp_of(snowflake)).strftime('%y%m%d')
+        return f"{self.prefix}-{date}-{to_base36(snowflake)}"
+
+
+order_number_generator = OrderNumberGenerator(prefix=getattr(settings, 'ORDER_NUMBER_PREFIX', 'ORD'))
+
+
+def generate_order_number():
+    return order_number_generator.next_order_number()
@@ -0,0 +1,93 @@
+"""
+Side effects of order changes, delivered from the outbox (core.Utiilties.outbox) after the
+request that caused them has returned. Delivery is at least once, so every handler is safe
+to run twice for the same event.
+"""
+import logging
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from core.models import User
+from core.Utiilties.config import ConfData
+from core.Utiilties.outbox import outbox_handler
+from core.Utiilties.utilities_functions import email_sender
+from .checkout import release_stock
+from .models import OrderStatusChoices
+from .state_machine import ORDER_PLACED, STATUS_CHANGED
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_COUNTER_TTL = 60 * 60 * 24 * 7
+
+STATUS_MESSAGES = {
+    OrderStatusChoices.PROCESSING: "We are preparing your order.",
+    OrderStatusChoices.SHIPPED: "Your order is on its way.",
+    OrderStatusChoices.DELIVERED: "Your order was delivered.",
+    OrderStatusChoices.CANCELLED: "Your order was cancelled.",
+    OrderStatusChoices.REFUNDED: "Your order was refunded.",
+}
+
+
+def send_order_email(payload, subject, message):
+    email = User.objects.filter(id=payload['user_id']).values_list('email', flat=True).first()
+    if not email:
+        return
+    body = render_to_string('emails/order_status.html', {
+        'subject': subject,
+        'message': message,
+        'order_number': payload['order_number'],
+        'tracking_number': payload.get('tracking_number'),
+        'logo_url': ConfData.get_data()['logo_url'],
+    })
+    if not email_sender(email=email, subject=subject, body=body):
+        # raising makes the outbox retry later
+        raise RuntimeError(f"Could not send the order email for order {payload['order_id']}")
+
+
+@outbox_handler(ORDER_PLACED)
+def order_placed_email(payload):
+    send_order_email(payload, f"Order {payload['order_number']} received", "Thank you for your order.")
+
+
+@outbox_handler(STATUS_CHANGED)
+def order_status_email(payload):
+    message = STATUS_MESSAGES.get(payload['to'])
+    if message:
+        label = OrderStatusChoices(payload['to']).label
+        send_order_email(payload, f"Order {payload['order_number']} {label.lower()}", message)
+
+
+@outbox_handler(STATUS_CHANGED)
+def release_cancelled_stock(payload):
+    if payload['to'] == OrderStatusChoices.CANCELLED:
+        release_stock(payload['order_id'])
+
+
+def count(name, amount=1):
+    key = f"analytics:live:{timezone.localdate().isoformat()}:{name}"
+    cache.add(key, 0, timeout=ANALYTICS_COUNTER_TTL)
+    cache.incr(key, amount)
+
+
+def first_delivery(topic, payload):
+    return cache.add(f"analytics:seen:{topic}:{payload['order_id']}:{payload.get('to', '')}", 1,
+                     timeout=ANALYTICS_COUNTER_TTL)
+
+
+@outbox_handler(ORDER_PLACED)
+def count_order_placed(payload):
+    """
+    Live counters of today's orders and revenue (in cents) for dashboards.
+    """
+    if first_delivery(ORDER_PLACED, payload):
+        count('orders')
+        count('revenue_cents', int(Decimal(payload['total']) * 100))
+
+
+@outbox_handler(STATUS_CHANGED)
+def count_status_change(payload):
+    if first_delivery(STATUS_CHANGED, payload):
+        count(f"status:{OrderStatusChoices(payload['to']).name.lower()}")
@@ -0,0 +1,86 @@
+from decimal import Decimal
+
+from django.conf import settings
+
+from core.Utiilties.cache import tiered_cache
+from core.models import Address
+from products.cache import PRODUCTS_TAG
+from .cart_store import serialize_items
+from .shipping import get_zone_rules, ZONE_RULES_TAG
+from .voucher_engine import apply_voucher, voucher_tag
+
+ZERO = Decimal('0.00')
+
+
+def price_cart(items, user, voucher_code=None, address=None):
+    """
+    The amounts an order placed from `items` would get, computed in memory without writing
+    anything (shipping and tax come from the in-memory zone rules). Raises
+    VoucherUnavailable when the voucher does not apply.
+    """
+    subtotal = sum((item.subtotal for item in items), ZERO)
+    voucher, discount_amount = None, ZERO
+    if voucher_code:
+        voucher, discount_amount = apply_voucher(voucher_code, items, user)
+
+    city, area = (address.city, address.area) if address is not None else ('', '')
+    zone_rules = get_zone_rules()
+    shipping_cost = zone_rules.shipping_cost(city, area, items, subtotal - discount_amount)
+    tax = zone_rules.tax_amount(city, area, items, subtotal, discount_amount, shipping_cost)
+    return {
+        'subtotal': subtotal,
+        'discount_amount': discount_amount,
+        'shipping_cost': shipping_cost,
+        'tax': tax,
+        'total': subtotal + shipping_cost + tax - discount_amount,
+        'voucher': voucher,
+    }
+
+
+def addresses_tag(user_id):
+    return f"addresses:user:{user_id}"
+
+
+def quote_cache_key(owner, version, voucher_code, address_id):
+    return f"order:quote:{owner.key}:{version}:{voucher_code or '-'}:{address_id or 'default'}"
+
+
+def quote_tags(owner, voucher_code):
+    tags = [PRODUCTS_TAG, ZONE_RULES_TAG, addresses_tag(owner.user_id)]
+    return tags + ([voucher_tag(voucher_code)] if voucher_code else [])
+
+
+def build_quote(items, user, voucher_code=None, address=None):
+    amounts = price_cart(items, user, voucher_code, address)
+    amounts.pop('voucher')
+    return {
+        'items': serialize_items(items),
+        'voucher_code': voucher_code,
+        'address': address.id if address is not None else None,
+        **{name: f'{amount:.2f}' for name, amount in amounts.items()},
+    }
+
+
+def get_quote(owner, user, store, voucher_code=None, address_id=None):
+    """
+    Quote of the owner's cart, cached per cart version: as long as the cart, its products,
+    the voucher, the shipping/tax rules and the user's addresses are unchanged, asking
+    again costs a cache read.
+    Returns None for an empty cart, raises VoucherUnavailable and Address.DoesNotExist.
+    """
+    key = quote_cache_key(owner, store.version(owner), voucher_code, address_id)
+    quote = tiered_cache.get(key)
+    if quote is None:
+        tags = quote_tags(owner, voucher_code)
+        versions = tiered_cache.tag_versions(tags)
+        items = store.checkout_items(owner)
+        if not items:
+            return None
+        if address_id:
+            address = Address.objects.get(id=address_id, user=user)
+        else:
+            address = Address.get_default_for_user(user)
+        quote = build_quote(items, user, voucher_code, address)
+        tiered_cache.set(key, quote, timeout=getattr(settings, 'ORDER_QUOTE_CACHE_TTL', 60 * 10),
+                         tags=tags, versions=versions)
+    return quote
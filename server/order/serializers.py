@@ -5,7 +5,13 @@ from rest_framework import serializers
 
 from core.models import Address
 from products.models import Product
-from .models import Cart, CartItem, Order, OrderItem, Voucher
+from .models import (
+    Cart, CartItem, Order, OrderItem, Voucher, ShippingRule, TaxRule, OrderStatusChoices, PaymentStatusChoices,
+    OrderTransition,
+)
+from .state_machine import can_transition
+from .voucher_codes import DEFAULT_CODE_LENGTH, SCOPE_FIELDS
+from .vouchers import VoucherUnavailable
 
 from rest_framework import serializers
 from .models import Product, SKU, CartItem
@@ -39,43 +45,60 @@ class CartItemSerializer(serializers.ModelSerializer):
         if not product:
             raise serializers.ValidationError({"product": "Product is required."})
 
-        if not product.has_variants:
-            return attrs
+        # same checks as CartLineListSerializer, so both cart item paths accept the same lines
+        if sku and sku.product_id != product.id:
+            raise serializers.ValidationError({"sku": "Invalid SKU for the selected product."})
 
         if product.has_variants and not sku:
             raise serializers.ValidationError({"sku": "SKU ID is required for products with variants."})
 
-        if sku and sku.product != product:
-            raise serializers.ValidationError({"sku": "Invalid SKU for the selected product."})
-
         return attrs
 
-    def create(self, validated_data):
-        product = validated_data['product']
-        sku = validated_data.get('sku')
-        quantity = validated_data['quantity']
-
 
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=self.context['cart'],
-            product=product,
-            sku=sku,
-            defaults={'quantity': quantity}
-        )
-
-        if not created:
-            cart_item.quantity = quantity
-            cart_item.save()
-
-        return cart_item
-
-    def update(self, instance, validated_data):
-        # Only update quantity if that's all that was provided
-        quantity = validated_data.get('quantity', instance.quantity)
-        instance.quantity = quantity
-        instance.save()
-        return instance
+class CartItemQuantitySerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CartLineListSerializer(serializers.ListSerializer):
+    """
+    Validates a whole list of cart lines against one product and one SKU lookup.
+    """
+
+    def to_internal_value(self, data):
+        # errors stay a list aligned with the input, like field errors of many=True serializers
+        attrs = super().to_internal_value(data)
+        products = Product.objects.in_bulk({line['product'] for line in attrs})
+        skus = SKU.objects.in_bulk({line['sku'] for line in attrs if line.get('sku')})
+
+        errors, lines = [], []
+        for line in attrs:
+            product = products.get(line['product'])
+            sku = skus.get(line['sku']) if line.get('sku') else None
+            error = {}
+            if product is None:
+                error['product'] = f"Invalid pk \"{line['product']}\" - object does not exist."
+            elif line.get('sku') and sku is None:
+                error['sku'] = f"Invalid pk \"{line['sku']}\" - object does not exist."
+            elif product.has_variants and not sku:
+                error['sku'] = "SKU ID is required for products with variants."
+            elif sku and sku.product_id != product.id:
+                error['sku'] = "Invalid SKU for the selected product."
+            errors.append(error)
+            lines.append({'product': product, 'sku': sku if product and product.has_variants else None,
+                          'quantity': line['quantity']})
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return lines
+
+
+class CartLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    sku = serializers.IntegerField(required=False, allow_null=True)
+    quantity = serializers.IntegerField(min_value=1, default=1)
 
+    class Meta:
+        list_serializer_class = CartLineListSerializer
 
 
 class CartSerializer(serializers.ModelSerializer):
@@ -97,15 +120,18 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 class OrderSerializer(serializers.ModelSerializer):
     voucher_code = serializers.CharField(write_only=True, required=False)
+    address_id = serializers.IntegerField(write_only=True, required=False)
 
     class Meta:
         model = Order
         fields = [
             'id', 'order_number', 'status', 'payment_status', 'city','area','address_line1','address_line2',
             'subtotal', 'shipping_cost','phone_number','notes',
-            'tax', 'discount_amount', 'total', 'voucher', 'voucher_code', 'created_at', 'updated_at'
+            'tax', 'discount_amount', 'total', 'voucher', 'voucher_code', 'address_id', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'order_number', 'discount_amount', 'total', 'created_at', 'updated_at']
+        # status and payment_status only move through order.state_machine
+        read_only_fields = ['id', 'order_number', 'status', 'payment_status', 'voucher', 'shipping_cost', 'tax',
+                            'discount_amount', 'total', 'created_at', 'updated_at']
         extra_kwargs = {
             'city': {'required': False},  # Make shipping_city optional
             'area': {'required': False},  # Make shipping_area optional
@@ -135,19 +161,22 @@ class OrderSerializer(serializers.ModelSerializer):
         attrs['address_line2'] = address.address_line2
         attrs['phone_number'] = address.phone_number
         voucher_code = attrs.pop('voucher_code', None)
-        if voucher_code:
-            voucher = self.voucher_code_to_id(voucher_code)
-            if not voucher.is_valid():
-                raise serializers.ValidationError({"voucher_code": "Invalid or expired voucher code."})
-            attrs['voucher'] = voucher
-        return attrs
-
-    def voucher_code_to_id(self, value):
+        attrs.pop('address_id', None)
+        # order.pricing builds on order.cart_store, which imports this module
+        from .pricing import price_cart
         try:
-            voucher = Voucher.objects.get(code=value)
-        except Voucher.DoesNotExist:
-            raise serializers.ValidationError({"voucher_code": "Invalid voucher code."})
-        return voucher
+            # same pricing as the checkout quote
+            amounts = price_cart(self.context.get('items', []), user, voucher_code, address)
+        except VoucherUnavailable as e:
+            raise serializers.ValidationError({"voucher_code": str(e)})
+        attrs['shipping_cost'] = amounts['shipping_cost']
+        attrs['tax'] = amounts['tax']
+        if amounts['voucher'] is not None:
+            attrs['discount_amount'] = amounts['discount_amount']
+            attrs['voucher_id'] = amounts['voucher'].id
+            # redeemed by order.checkout.place_order once the order exists
+            self.compiled_voucher = amounts['voucher']
+        return attrs
 
 
 
@@ -156,14 +185,117 @@ class OrderSerializer(serializers.ModelSerializer):
         return order
 
 
+class OrderQuoteSerializer(serializers.Serializer):
+    voucher_code = serializers.CharField(required=False, allow_blank=True)
+    address_id = serializers.IntegerField(required=False)
+
+
 class OrderDetailSerializer(OrderSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
 
     class Meta(OrderSerializer.Meta):
         fields = OrderSerializer.Meta.fields + ['items']
 
+class AdminOrderSerializer(OrderSerializer):
+    class Meta(OrderSerializer.Meta):
+        fields = OrderSerializer.Meta.fields + ['user', 'tracking_number']
+
+
+class AdminOrderDetailSerializer(AdminOrderSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta(AdminOrderSerializer.Meta):
+        fields = AdminOrderSerializer.Meta.fields + ['items']
+
+
+class AdminOrderFilterSerializer(serializers.Serializer):
+    status = serializers.MultipleChoiceField(choices=OrderStatusChoices.choices, required=False)
+    payment_status = serializers.MultipleChoiceField(choices=PaymentStatusChoices.choices, required=False)
+    created_from = serializers.DateField(required=False)
+    created_to = serializers.DateField(required=False)
+    city = serializers.CharField(required=False)
+    search = serializers.CharField(required=False, help_text="Order number or phone number prefix.")
+
+
+class OrderTransitionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderTransition
+        fields = ['id', 'field', 'from_value', 'to_value', 'actor', 'note', 'created_at']
+
+
+class OrderStatusChangeSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=OrderStatusChoices.choices, required=False)
+    payment_status = serializers.ChoiceField(choices=PaymentStatusChoices.choices, required=False)
+    note = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate(self, attrs):
+        if 'status' not in attrs and 'payment_status' not in attrs:
+            raise serializers.ValidationError("Provide status or payment_status.")
+        return attrs
+
+
+class OrderBulkTransitionSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+    from_status = serializers.ChoiceField(choices=OrderStatusChoices.choices)
+    to_status = serializers.ChoiceField(choices=OrderStatusChoices.choices)
+    tracking_numbers = serializers.DictField(child=serializers.CharField(max_length=100), required=False,
+                                             help_text="Order id to tracking number.")
+    note = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate(self, attrs):
+        if not can_transition('status', attrs['from_status'], attrs['to_status']):
+            raise serializers.ValidationError("Orders can't be moved between these statuses.")
+        try:
+            tracking_numbers = {int(order_id): number for order_id, number in attrs.get('tracking_numbers', {}).items()}
+        except ValueError:
+            raise serializers.ValidationError({"tracking_numbers": "Keys must be order ids."})
+        if not set(tracking_numbers) <= set(attrs['ids']):
+            raise serializers.ValidationError({"tracking_numbers": "Every order must also be listed in ids."})
+        attrs['tracking_numbers'] = tracking_numbers
+        return attrs
+
+
 class VoucherSerializer(serializers.ModelSerializer):
     class Meta:
         model = Voucher
         fields = ['id', 'code', 'discount_type', 'discount_value', 'valid_from', 'valid_to', 'usage_limit','max_discount_amount',
-                  'times_used']
+                  'times_used', 'per_user_limit', 'use_flash_counter', 'min_subtotal', 'categories', 'brands', 'products',
+                  'first_order_only', 'is_stackable', 'campaign']
+
+
+class ShippingRuleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ShippingRule
+        fields = ['id', 'name', 'city', 'area', 'min_weight', 'max_weight', 'min_quantity', 'max_quantity',
+                  'base_cost', 'cost_per_kg', 'cost_per_item', 'free_shipping_threshold', 'priority', 'is_active']
+
+
+class TaxRuleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TaxRule
+        fields = ['id', 'name', 'city', 'area', 'category', 'rate', 'applies_to_shipping', 'is_active']
+
+
+class VoucherGenerateSerializer(VoucherSerializer):
+    """
+    Template for bulk generated vouchers: every field of a voucher except its code.
+    Generated codes are single use unless usage_limit says otherwise.
+    """
+    count = serializers.IntegerField(min_value=1, max_value=1_000_000, write_only=True)
+    prefix = serializers.RegexField(r'^[A-Z0-9-]{0,20}$', required=False, allow_blank=True, default='', write_only=True)
+    length = serializers.IntegerField(min_value=8, max_value=30, required=False, default=DEFAULT_CODE_LENGTH,
+                                      write_only=True)
+
+    class Meta(VoucherSerializer.Meta):
+        fields = [field for field in VoucherSerializer.Meta.fields if field not in ('id', 'code', 'times_used')] + [
+            'count', 'prefix', 'length']
+        extra_kwargs = {'usage_limit': {'default': 1}, 'per_user_limit': {'default': 1}}
+
+    def split(self):
+        """
+        (count, prefix, length, field values, M2M scopes) of the validated data.
+        """
+        data = dict(self.validated_data)
+        count, prefix, length = data.pop('count'), data.pop('prefix'), data.pop('length')
+        scopes = {field: [obj.pk for obj in data.pop(field, [])] for field in SCOPE_FIELDS}
+        return count, prefix, length, data, scopes
@@ -0,0 +1,129 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+
+from core.Utiilties.cache import tiered_cache
+from .models import ShippingRule, TaxRule
+
+ZONE_RULES_CACHE_KEY = 'order:zone_rules'
+ZONE_RULES_TAG = 'zone_rules'
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+
+def normalize(value):
+    return (value or '').strip().lower()
+
+
+def zone_keys(city, area):
+    """
+    Zones an address falls in, most specific first.
+    """
+    city, area = normalize(city), normalize(area)
+    return [(city, area), (city, ''), ('', '')]
+
+
+def item_weight(item):
+    return (item.product.weight or 0) * item.quantity
+
+
+class CompiledShippingRule:
+    def __init__(self, rule):
+        self.min_weight = rule.min_weight
+        self.max_weight = rule.max_weight
+        self.min_quantity = rule.min_quantity
+        self.max_quantity = rule.max_quantity
+        self.base_cost = rule.base_cost
+        self.cost_per_kg = rule.cost_per_kg
+        self.cost_per_item = rule.cost_per_item
+        self.free_shipping_threshold = rule.free_shipping_threshold
+        self.priority = rule.priority
+
+    def matches(self, weight, quantity):
+        return (self.min_weight <= weight and (self.max_weight is None or weight < self.max_weight)
+                and self.min_quantity <= quantity and (self.max_quantity is None or quantity < self.max_quantity))
+
+    def cost(self, weight, quantity, amount):
+        if self.free_shipping_threshold is not None and amount >= self.free_shipping_threshold:
+            return ZERO
+        return self.base_cost + self.cost_per_kg * weight + self.cost_per_item * quantity
+
+
+class ZoneRules:
+    """
+    Active shipping and tax rules indexed by (city, area) zone, built with two queries and
+    kept in the tiered cache: every process serves lookups from its in-memory copy until a
+    rule changes and the zone_rules tag is invalidated, then the next lookup reloads it.
+    """
+
+    def __init__(self, shipping_rules, tax_rules):
+        self.shipping = defaultdict(list)
+        for rule in shipping_rules:
+            self.shipping[(normalize(rule.city), normalize(rule.area))].append(CompiledShippingRule(rule))
+        for rules in self.shipping.values():
+            rules.sort(key=lambda rule: -rule.priority)
+
+        # {zone: {category_id or None: (rate, applies_to_shipping)}}
+        self.tax = defaultdict(dict)
+        for rule in tax_rules:
+            self.tax[(normalize(rule.city), normalize(rule.area))][rule.category_id] = (rule.rate, rule.applies_to_shipping)
+
+    @classmethod
+    def load(cls):
+        return cls(ShippingRule.objects.filter(is_active=True), TaxRule.objects.filter(is_active=True))
+
+    def shipping_rule(self, city, area, weight, quantity):
+        for zone in zone_keys(city, area):
+            for rule in self.shipping.get(zone, ()):
+                if rule.matches(weight, quantity):
+                    return rule
+        return None
+
+    def shipping_cost(self, city, area, items, amount):
+        """
+        Shipping for cart items going to city/area, `amount` is the discounted subtotal used
+        for free-shipping thresholds. No matching rule means free shipping.
+        """
+        weight = sum((item_weight(item) for item in items), Decimal(0))
+        quantity = sum(item.quantity for item in items)
+        rule = self.shipping_rule(city, area, weight, quantity)
+        return rule.cost(weight, quantity, amount).quantize(CENT) if rule else ZERO
+
+    def tax_rate(self, city, area, category_id):
+        """
+        (rate, applies_to_shipping) of the most specific zone, a category rule beating the
+        zone's general rule.
+        """
+        for zone in zone_keys(city, area):
+            rates = self.tax.get(zone)
+            if rates:
+                if category_id in rates:
+                    return rates[category_id]
+                if None in rates:
+                    return rates[None]
+        return ZERO, False
+
+    def tax_amount(self, city, area, items, subtotal, discount_amount, shipping_cost):
+        """
+        Tax on the items after the order discount (spread over the items pro rata), plus on
+        shipping where the zone's rule says so.
+        """
+        share = (subtotal - discount_amount) / subtotal if subtotal else 0
+        tax = sum(
+            (item.subtotal * share * self.tax_rate(city, area, item.product.category_id)[0] / 100 for item in items),
+            Decimal(0)
+        )
+        rate, applies_to_shipping = self.tax_rate(city, area, None)
+        if applies_to_shipping:
+            tax += shipping_cost * rate / 100
+        return Decimal(tax).quantize(CENT)
+
+
+def get_zone_rules():
+    return tiered_cache.get_or_set(
+        ZONE_RULES_CACHE_KEY,
+        ZoneRules.load,
+        timeout=getattr(settings, 'ZONE_RULES_CACHE_TTL', 60 * 60 * 24),
+        tags=[ZONE_RULES_TAG],
+    )
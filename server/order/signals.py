@@ -0,0 +1,51 @@
+import logging
+
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from core.signals import user_logged_in
+from core.Utiilties.cache import invalidate_on_change, tiered_cache
+from order.cart_store import cart_store, CartOwner, GUEST_TOKEN_RE
+from core.models import Address
+from order.models import Voucher, ShippingRule, TaxRule
+from order.pricing import addresses_tag
+from order.shipping import ZONE_RULES_TAG
+from order.voucher_engine import voucher_tag
+
+logger = logging.getLogger(__name__)
+
+invalidate_on_change(Voucher, lambda instance: ['voucher', f'voucher:{instance.code}'])
+invalidate_on_change(ShippingRule, lambda instance: ['shipping_rule', ZONE_RULES_TAG])
+invalidate_on_change(TaxRule, lambda instance: ['tax_rule', ZONE_RULES_TAG])
+# cached quotes are priced for the user's (default) address
+invalidate_on_change(Address, lambda instance: [addresses_tag(instance.user_id)])
+
+
+def invalidate_voucher_scope(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        codes = [instance.code]
+    elif pk_set:
+        codes = Voucher.objects.filter(id__in=pk_set).values_list('code', flat=True)
+    else:
+        codes = instance.vouchers.values_list('code', flat=True)
+    tiered_cache.invalidate_tags(*(voucher_tag(code) for code in codes))
+
+
+for through in (Voucher.categories.through, Voucher.brands.through, Voucher.products.through):
+    m2m_changed.connect(invalidate_voucher_scope, sender=through, dispatch_uid=f'invalidate_voucher_scope_{through.__name__}')
+
+
+@receiver(user_logged_in)
+def merge_guest_cart(sender, request, user, **kwargs):
+    """
+    Move the cart a guest built before logging in (X-Cart-Token header) into the user's cart.
+    """
+    token = request.META.get('HTTP_X_CART_TOKEN', '')
+    if not cart_store.supports_guests or not GUEST_TOKEN_RE.match(token):
+        return
+    try:
+        cart_store.merge(CartOwner(token=token), CartOwner(user_id=user.id))
+    except Exception as e:
+        logger.error(f"Failed to merge guest cart into user {user.id}: {e}")
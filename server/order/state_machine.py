@@ -0,0 +1,85 @@
+from django.db import transaction
+
+from core.Utiilties.outbox import emit_many
+from .models import Order, OrderTransition, OrderStatusChoices as Status, PaymentStatusChoices as Payment
+
+# {field: {from: allowed targets}}, anything else is refused
+TRANSITIONS = {
+    'status': {
+        Status.PENDING: {Status.PROCESSING, Status.CANCELLED},
+        Status.PROCESSING: {Status.SHIPPED, Status.CANCELLED},
+        Status.SHIPPED: {Status.DELIVERED},
+        Status.DELIVERED: {Status.REFUNDED},
+        Status.CANCELLED: set(),
+        Status.REFUNDED: set(),
+    },
+    'payment_status': {
+        Payment.PENDING: {Payment.PAID, Payment.FAILED},
+        Payment.FAILED: {Payment.PENDING, Payment.PAID},
+        Payment.PAID: {Payment.REFUNDED},
+        Payment.REFUNDED: set(),
+    },
+}
+
+ORDER_PLACED = 'order.placed'
+STATUS_CHANGED = 'order.status_changed'
+PAYMENT_STATUS_CHANGED = 'order.payment_status_changed'
+TOPICS = {'status': STATUS_CHANGED, 'payment_status': PAYMENT_STATUS_CHANGED}
+CHOICES = {'status': Status, 'payment_status': Payment}
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def can_transition(field, from_value, to_value):
+    return to_value in TRANSITIONS[field].get(from_value, ())
+
+
+def order_payload(order_id, user_id, order_number, **extra):
+    return {'order_id': order_id, 'user_id': user_id, 'order_number': order_number, **extra}
+
+
+def record_transitions(changes, actor=None, note=''):
+    """
+    Write the log rows and outbox events of already applied changes, given as
+    (order_id, user_id, order_number, field, from_value, to_value, extra payload).
+    """
+    OrderTransition.objects.bulk_create([
+        OrderTransition(order_id=order_id, field=field, from_value=from_value, to_value=to_value,
+                        actor=actor, note=note)
+        for order_id, _, _, field, from_value, to_value, _ in changes
+    ])
+    emit_many([
+        (TOPICS[field], order_payload(order_id, user_id, order_number, **{'from': from_value, 'to': to_value}, **extra))
+        for order_id, user_id, order_number, field, from_value, to_value, extra in changes
+    ])
+
+
+def transition_order(order, actor=None, note='', **targets):
+    """
+    Move an order to new `status` and/or `payment_status` values, e.g.
+    transition_order(order, status=OrderStatusChoices.SHIPPED, actor=request.user).
+    The row is locked and re-read, the move checked against TRANSITIONS (raises
+    InvalidTransition), then saved with its log rows and outbox events in one transaction.
+    Setting a field to its current value is a no-op.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        changes = []
+        for field, to_value in targets.items():
+            from_value = getattr(order, field)
+            if to_value == from_value:
+                continue
+            if not can_transition(field, from_value, to_value):
+                choices = CHOICES[field]
+                raise InvalidTransition(
+                    f"Can't change {field.replace('_', ' ')} from {choices(from_value).label} to {choices(to_value).label}."
+                )
+            setattr(order, field, to_value)
+            changes.append((order.id, order.user_id, order.order_number, field, from_value, to_value,
+                            {'tracking_number': order.tracking_number}))
+        if changes:
+            order.save(update_fields=[change[3] for change in changes] + ['updated_at'])
+            record_transitions(changes, actor=actor, note=note)
+    return order
@@ -0,0 +1,11 @@
+from celery import shared_task
+
+from order.cart_store import cart_store
+
+
+@shared_task(name='persist_dirty_carts')
+def persist_dirty_carts(batch_size=500):
+    """
+    Write-behind for RedisCartStore: flush user carts changed since the last run to the database.
+    """
+    return cart_store.persist_dirty(batch_size)
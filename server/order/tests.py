@@ -1,3 +1,320 @@
-from django.test import TestCase
+import uuid
+from datetime import datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.Utiilties import idempotency
+from core.Utiilties.enum import PermissionEnum, TokenType
+from core.Utiilties.idempotency import idempotency_cache_key
+from core.Utiilties.utilities_functions import token_generator
+from core.models import User, Address
+from products.models import Category, Product
+from .admin_orders import filter_orders
+from .archive import archive_batch, archive_cutoff
+from .cart_store import DatabaseCartStore, CartOwner
+from .models import (
+    Order, OrderItem, OrderStatusChoices, PaymentStatusChoices, OrderTransition, ArchivedOrder, Voucher, VoucherRedemption, DiscountTypeChoices,
+)
+from .order_number import OrderNumberGenerator, MAX_SEQUENCE
+from .state_machine import transition_order
+
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'order-tests'}}
+
+
+def make_customer(email='customer@example.com'):
+    user = User.objects.create_user(email=email, phone='', password='password')
+    Address.objects.create(user=user, name='Home', address_line1='House 1', city='Dhaka', area='Gulshan',
+                           phone_number='01711111111')
+    return user
+
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Bearer ' + token_generator(user.id, TokenType.access))
+    return client
+
+
+@override_settings(CACHES=CACHES)
+class CartTestCase(TestCase):
+    """
+    Base for tests placing orders through the API, with the carts kept in the database.
+    """
+
+    def setUp(self):
+        self.cart_store = DatabaseCartStore()
+        for target in ('order.views.cart_store', 'order.checkout.cart_store'):
+            patcher = mock.patch(target, self.cart_store)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        category = Category.objects.create(label='Shirts')
+        self.product = Product.objects.create(name='Shirt', base_price=100, stock_quantity=10, category=category)
+        self.user = make_customer()
+        self.client = client_for(self.user)
+
+    def fill_cart(self, quantity=2, user=None):
+        self.cart_store.set_items(CartOwner(user_id=(user or self.user).id),
+                                  [{'product': self.product, 'sku': None, 'quantity': quantity}])
+
+    def make_voucher(self, **fields):
+        now = timezone.now()
+        return Voucher.objects.create(**{
+            'code': 'SAVE10', 'discount_type': DiscountTypeChoices.FIXED, 'discount_value': 10,
+            'max_discount_amount': 10, 'valid_from': now - timedelta(days=1), 'valid_to': now + timedelta(days=1),
+            **fields,
+        })
+
+
+class CheckoutTestCase(CartTestCase):
+    def test_checkout_takes_stock_and_empties_cart(self):
+        self.fill_cart(quantity=3)
+        response = self.client.post('/api/order/', {}, format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.items.get().quantity, 3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 7)
+        self.assertEqual(self.cart_store.checkout_items(CartOwner(user_id=self.user.id)), [])
+
+    def test_checkout_rejects_insufficient_stock(self):
+        self.fill_cart(quantity=11)
+        response = self.client.post('/api/order/', {}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 10)
+
+    def test_checkout_redeems_voucher(self):
+        voucher = self.make_voucher()
+        self.fill_cart()
+        response = self.client.post('/api/order/', {'voucher_code': 'SAVE10'}, format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.voucher_id, voucher.id)
+        self.assertEqual(order.discount_amount, 10)
+        voucher.refresh_from_db()
+        self.assertEqual(voucher.times_used, 1)
+        self.assertTrue(VoucherRedemption.objects.filter(voucher=voucher, user=self.user, order=order).exists())
+
+    def test_checkout_enforces_per_user_voucher_limit(self):
+        voucher = self.make_voucher(per_user_limit=1)
+        self.fill_cart()
+        self.assertEqual(self.client.post('/api/order/', {'voucher_code': 'SAVE10'}, format='json').status_code, 201)
+
+        self.fill_cart()
+        response = self.client.post('/api/order/', {'voucher_code': 'SAVE10'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('voucher_code', response.data)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+
+        # the limit is per customer
+        other = make_customer('other@example.com')
+        self.fill_cart(user=other)
+        self.assertEqual(client_for(other).post('/api/order/', {'voucher_code': 'SAVE10'}, format='json').status_code, 201)
+        voucher.refresh_from_db()
+        self.assertEqual(voucher.times_used, 2)
+
+    def test_checkout_respects_voucher_usage_limit(self):
+        voucher = self.make_voucher(usage_limit=1)
+        self.fill_cart()
+        self.assertEqual(self.client.post('/api/order/', {'voucher_code': 'SAVE10'}, format='json').status_code, 201)
+
+        other = make_customer('other@example.com')
+        self.fill_cart(user=other)
+        response = client_for(other).post('/api/order/', {'voucher_code': 'SAVE10'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        voucher.refresh_from_db()
+        self.assertEqual(voucher.times_used, 1)
+
+    def test_checkout_ignores_status_fields(self):
+        self.fill_cart()
+        response = self.client.post('/api/order/', {'status': OrderStatusChoices.DELIVERED,
+                                                    'payment_status': PaymentStatusChoices.PAID}, format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.status, OrderStatusChoices.PENDING)
+        self.assertNotEqual(order.payment_status, PaymentStatusChoices.PAID)
+
+    def test_checkout_replays_idempotency_key(self):
+        self.fill_cart()
+        key = uuid.uuid4().hex
+        first = self.client.post('/api/order/', {}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        self.assertEqual(first.status_code, 201, first.data)
+
+        # the retry gets the first response back, the cart being empty by now
+        retry = self.client.post('/api/order/', {}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['order_number'], first.data['order_number'])
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+
+    def test_response_stored_while_taking_the_lock_is_replayed(self):
+        self.fill_cart()
+        key = uuid.uuid4().hex
+        first = self.client.post('/api/order/', {}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        cache_key = idempotency_cache_key(mock.Mock(user=self.user), 'order:create', key)
+        record = cache.get(cache_key)
+        cache.delete(cache_key)
+        take_lock = idempotency.acquire_lock
+
+        def acquire_lock(*args):
+            # the first request stores its response and releases the lock right after our read
+            cache.set(cache_key, record)
+            return take_lock(*args)
+
+        self.fill_cart()
+        with mock.patch('core.Utiilties.idempotency.acquire_lock', side_effect=acquire_lock):
+            retry = self.client.post('/api/order/', {}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['order_number'], first.data['order_number'])
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+        self.assertIsNone(cache.get(f"{cache_key}:lock"))
+
+    def test_idempotency_key_is_bound_to_the_request(self):
+        self.make_voucher()
+        self.fill_cart()
+        key = uuid.uuid4().hex
+        self.assertEqual(self.client.post('/api/order/', {}, format='json', HTTP_IDEMPOTENCY_KEY=key).status_code, 201)
+
+        self.fill_cart()
+        response = self.client.post('/api/order/', {'voucher_code': 'SAVE10'}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        self.assertEqual(response.status_code, 422)
+        # without a key every request is an order of its own
+        self.assertEqual(self.client.post('/api/order/', {}, format='json').status_code, 201)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 2)
+
+
+@override_settings(CACHES=CACHES)
+class OrderCancelTestCase(TestCase):
+    def setUp(self):
+        self.user = make_customer()
+        self.client = client_for(self.user)
+        self.order = Order.objects.create(user=self.user, subtotal=100, city='Dhaka', area='Gulshan',
+                                          address_line1='House 1', phone_number='01711111111')
+
+    def test_cancel_is_idempotent(self):
+        for _ in range(2):
+            response = self.client.post(f'/api/order/{self.order.id}/cancel/')
+            self.assertEqual(response.status_code, 200, response.data)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, OrderStatusChoices.CANCELLED)
+        self.assertEqual(OrderTransition.objects.filter(order_id=self.order.id).count(), 1)
+
+    def test_customers_cannot_set_the_status(self):
+        Order.objects.filter(id=self.order.id).update(status=OrderStatusChoices.PROCESSING)
+        for method in (self.client.put, self.client.patch):
+            response = method(f'/api/order/{self.order.id}/', {'status': OrderStatusChoices.DELIVERED}, format='json')
+            self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.delete(f'/api/order/{self.order.id}/').status_code, 403)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, OrderStatusChoices.PROCESSING)
+
+    def test_cancel_after_processing_is_refused(self):
+        Order.objects.filter(id=self.order.id).update(status=OrderStatusChoices.PROCESSING)
+        response = self.client.post(f'/api/order/{self.order.id}/cancel/')
+        self.assertEqual(response.status_code, 400)
+
+
+class VoucherPermissionTestCase(CartTestCase):
+    def test_codes_are_listed_for_staff_only(self):
+        self.make_voucher()
+        staff = User.objects.create_user(email='staff@example.com', phone='', password='password',
+                                         permissions=[PermissionEnum.voucher_details])
+        response = client_for(staff).get('/api/voucher/')
+        self.assertEqual(response.status_code, 200)
+
+        # the cached list is not served to customers either
+        for url in ('/api/voucher/', f'/api/voucher/{Voucher.objects.get().id}/'):
+            self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.patch(f'/api/voucher/{Voucher.objects.get().id}/', {'usage_limit': 1},
+                                           format='json').status_code, 403)
+
+
+class OrderArchiveTestCase(CartTestCase):
+    """
+    Orders placed with a voucher, cancelled, then archived.
+    """
+
+    def place_cancelled_order(self):
+        self.fill_cart()
+        response = self.client.post('/api/order/', {'voucher_code': 'SAVE10'}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        order = Order.objects.get(order_number=response.data['order_number'])
+        return transition_order(order, status=OrderStatusChoices.CANCELLED)
+
+    def test_archive_moves_order_with_related_rows(self):
+        voucher = self.make_voucher(per_user_limit=2)
+        order = self.place_cancelled_order()
+        recent = Order.objects.create(user=self.user, subtotal=100, city='Dhaka', area='Gulshan',
+                                      address_line1='House 1', phone_number='01711111111',
+                                      status=OrderStatusChoices.CANCELLED)
+        Order.objects.filter(id=order.id).update(created_at=timezone.now() - timedelta(days=400))
+
+        self.assertEqual(archive_batch(archive_cutoff(12)), 1)
+        self.assertEqual(list(Order.objects.values_list('id', flat=True)), [recent.id])
+        self.assertFalse(OrderItem.objects.filter(order_id=order.id).exists())
+        self.assertFalse(OrderTransition.objects.filter(order_id=order.id).exists())
+        # the redemption outlives the order and still counts for the per-user limit
+        redemption = VoucherRedemption.objects.get(voucher=voucher)
+        self.assertIsNone(redemption.order_id)
+
+        data = ArchivedOrder.objects.get(id=order.id).data
+        self.assertEqual(data['order_number'], order.order_number)
+        self.assertEqual(len(data['items']), 1)
+        self.assertEqual(data['transitions'][0]['to_value'], OrderStatusChoices.CANCELLED)
+
+        response = self.client.get(f'/api/order/{order.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['order_number'], order.order_number)
+        other = make_customer('other@example.com')
+        self.assertEqual(client_for(other).get(f'/api/order/{order.id}/').status_code, 404)
+
+    def test_open_orders_are_not_archived(self):
+        self.fill_cart()
+        self.client.post('/api/order/', {}, format='json')
+        Order.objects.update(created_at=timezone.now() - timedelta(days=400))
+        self.assertEqual(archive_batch(archive_cutoff(12)), 0)
+
+
+class AdminOrderFilterTestCase(TestCase):
+    def test_date_filters_cover_whole_local_days(self):
+        user = make_customer()
+        day = timezone.localdate()
+        late = Order.objects.create(user=user, subtotal=100, city='Dhaka', area='Gulshan',
+                                    address_line1='House 1', phone_number='01711111111')
+        Order.objects.filter(id=late.id).update(
+            created_at=timezone.make_aware(datetime.combine(day, time(23, 59, 59))))
+
+        def matches(**filters):
+            return list(filter_orders(Order.objects.all(), filters).values_list('id', flat=True))
+
+        self.assertEqual(matches(created_from=day, created_to=day), [late.id])
+        self.assertEqual(matches(created_to=day - timedelta(days=1)), [])
+        self.assertEqual(matches(created_from=day + timedelta(days=1)), [])
+
+
+@override_settings(CACHES=CACHES)
+class OrderNumberTestCase(TestCase):
+    def setUp(self):
+        self.generator = OrderNumberGenerator()
+
+    def test_sequence_overflow_is_not_a_clock_rollback(self):
+        with mock.patch('order.order_number.time.time', return_value=1_800_000_000.0), \
+                self.assertNoLogs('order.order_number', level='WARNING'):
+            ids = [self.generator.next_id() for _ in range(3 * (MAX_SEQUENCE + 1))]
+        self.assertEqual(ids, sorted(set(ids)))
+
+    def test_clock_rollback_keeps_ids_increasing(self):
+        with mock.patch('order.order_number.time.time', return_value=1_800_000_000.0):
+            first = self.generator.next_id()
+        with mock.patch('order.order_number.time.time', return_value=1_799_999_999.0), \
+                self.assertLogs('order.order_number', level='WARNING'):
+            second = self.generator.next_id()
+        self.assertGreater(second, first)
@@ -1,5 +1,5 @@
 from rest_framework.routers import DefaultRouter
-from .views import CartViewSet, OrderViewSet, VoucherViewSet
+from .views import CartViewSet, OrderViewSet, VoucherViewSet, ShippingRuleViewSet, TaxRuleViewSet, AdminOrderViewSet
 from django.urls import path, include
 
 app_name = 'order'
@@ -7,7 +7,10 @@ app_name = 'order'
 router = DefaultRouter()
 router.register(r'order', OrderViewSet, basename='order-view')
 router.register(r'cart', CartViewSet, basename='cart')
+router.register(r'admin/order', AdminOrderViewSet, basename='admin-order')
 router.register(r'voucher', VoucherViewSet, basename='voucher')
+router.register(r'shipping-rule', ShippingRuleViewSet, basename='shipping-rule')
+router.register(r'tax-rule', TaxRuleViewSet, basename='tax-rule')
 
 # urlpatterns = router.urls
 urlpatterns = [
@@ -1,186 +1,247 @@
-from django.db import transaction
+from itertools import chain
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from django.shortcuts import get_object_or_404
 
+from core.Utiilties.cache import CacheResponseMixin
+from core.Utiilties.idempotency import idempotent
 from core.Utiilties.permission_chacker import HasPermissionMixin
 from core.Utiilties.enum import PermissionEnum
-from .models import Cart, CartItem, Order, OrderItem, Voucher, OrderStatusChoices
+from core.models import Address
+from .models import Cart, CartItem, Order, OrderItem, Voucher, OrderStatusChoices, ShippingRule, TaxRule
 from .serializers import (
     CartSerializer,
     OrderSerializer, CartItemSerializer, VoucherSerializer, OrderDetailSerializer,
-
+    CartItemQuantitySerializer, CartLineSerializer, VoucherGenerateSerializer, OrderQuoteSerializer,
+    ShippingRuleSerializer, TaxRuleSerializer, AdminOrderSerializer, AdminOrderDetailSerializer,
+    AdminOrderFilterSerializer, OrderBulkTransitionSerializer, OrderStatusChangeSerializer, OrderTransitionSerializer,
 )
+from .admin_orders import filter_orders, bulk_transition
+from .archive import get_archived_order
+from .cart_store import cart_store, get_request_cart_owner, CartOwner
+from .checkout import place_order, InsufficientStock
+from .pricing import get_quote
+from .state_machine import transition_order, InvalidTransition
+from .voucher_codes import generate_vouchers
+from .vouchers import VoucherUnavailable
 
 
 class CartViewSet(viewsets.ModelViewSet):
+    """
+    Cart of the authenticated user, or of a guest identified by the X-Cart-Token header
+    (issued on the first response). Storage is delegated to order.cart_store.
+
+    Cart items are identified by line ids, "<product_id>-<sku_id or 0>", not CartItem row
+    ids; item_details accepts both. Guest carts have no id and carry their token.
+    """
     serializer_class = CartSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [AllowAny]
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
             return Cart.objects.filter(user=self.request.user)
         return Cart.objects.none()
 
-    def get_cart(self):
-        cart, _ = Cart.objects.get_or_create(user=self.request.user)
-        return cart
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.cart_owner = get_request_cart_owner(request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        owner = getattr(self, 'cart_owner', None)
+        if owner is not None and owner.is_guest:
+            response['X-Cart-Token'] = owner.token
+        return super().finalize_response(request, response, *args, **kwargs)
 
     def create(self, request, *args, **kwargs):
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+        return Response(cart_store.cart_data(self.cart_owner))
 
     def retrieve(self, request, *args, **kwargs):
         """
         Override the default retrieve method to ensure a cart is always returned.
         """
-        cart, _ = Cart.objects.get_or_create(user=self.request.user)
-        if not cart:
-            return Response({"detail": "Authentication required."}, status=status.HTTP_401_UNAUTHORIZED)
-
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data)
+        return Response(cart_store.cart_data(self.cart_owner))
 
     @action(detail=False, methods=['post','get','delete'])
     def item(self, request):
-        cart = self.get_cart()
+        owner = self.cart_owner
 
         if request.method == 'POST':
-            serializer = CartItemSerializer(data=request.data, context={'cart': cart})
+            # a list of {product, sku, quantity} adds/updates many lines at once (reorder, shared lists)
+            if isinstance(request.data, list):
+                serializer = CartLineSerializer(data=request.data, many=True)
+                if serializer.is_valid():
+                    cart_store.set_items(owner, serializer.validated_data)
+                    return Response({'detail': f'{len(serializer.validated_data)} items added to cart'},
+                                    status=status.HTTP_200_OK)
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            serializer = CartItemSerializer(data=request.data)
             if serializer.is_valid():
-                serializer.save()
+                data = serializer.validated_data
+                # like the list path (CartLineListSerializer): a SKU only counts for products with variants
+                sku = data.get('sku') if data['product'].has_variants else None
+                cart_store.set_items(owner, [{'product': data['product'], 'sku': sku,
+                                              'quantity': data.get('quantity', 1)}])
                 return Response({'detail': 'Item added to cart'}, status=status.HTTP_200_OK)
 
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         elif request.method == 'GET':
-            cart_items = cart.items.all()
-            serializer = CartItemSerializer(cart_items, many=True)
-            return Response(serializer.data)
+            return Response(cart_store.items_data(owner))
         elif request.method == 'DELETE':
-            cart.items.all().delete()
+            cart_store.clear(owner)
             return Response({'detail': 'All items removed from cart'}, status=status.HTTP_200_OK)
         return Response({'detail': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
     @action(detail=False, methods=['put','delete'], url_path='item_details/(?P<item_id>[^/.]+)')
     def item_details(self, request, pk=None,item_id=None):
-        cart = self.get_cart()
+        """
+        item_id is the line id ("<product_id>-<sku_id or 0>") with the Redis store, the CartItem id otherwise.
+        """
+        owner = self.cart_owner
         if request.method == 'PUT':
-            cart_item = get_object_or_404(
-                CartItem,
-                cart=cart,
-                id=item_id
-            )
-            serializer = CartItemSerializer(cart_item, data=request.data, partial=True)
-            if serializer.is_valid():
-                serializer.save()
-                return Response(serializer.data)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            serializer = CartItemQuantitySerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            data = cart_store.update_quantity(owner, item_id, serializer.validated_data['quantity'])
+            if data is None:
+                raise Http404
+            return Response(data)
 
         elif request.method == 'DELETE':
-    
-            cart_item = get_object_or_404(
-                CartItem,
-                cart=cart,
-                id=item_id
-            )
-            cart_item.delete()
+            if not cart_store.remove_item(owner, item_id):
+                raise Http404
             return Response({'status': 'Item removed from cart'})
 
         return Response({'detail': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(HasPermissionMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
 
+    # customers only cancel their pending orders (the cancel action)
+    method_permissions = {
+        'PUT': PermissionEnum.order_update,
+        'PATCH': PermissionEnum.order_update,
+        'DELETE': PermissionEnum.order_delete,
+    }
+
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).prefetch_related('items')
+        orders = Order.objects.filter(user=self.request.user).order_by('-created_at')
+        if self.action == 'retrieve':
+            # items carry their product/variant snapshot (OrderItem.variant_info), one query for all
+            orders = orders.prefetch_related('items')
+        return orders
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return OrderDetailSerializer
         return super().get_serializer_class()
 
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            # moved to the archive by order.archive
+            archived = get_archived_order(kwargs['pk'], user=request.user)
+            if archived is None:
+                raise
+            return Response(archived)
+
+    @idempotent(scope='order:create')
     def create(self, request, *args, **kwargs):
         """
-        Create an order from the user's cart within a database transaction.
+        Create an order from the user's cart, see order.checkout.place_order.
+        Retries carrying the same Idempotency-Key get the first response back.
         """
-        # Start a database transaction
-        with transaction.atomic():
-            # Get the user's cart
-            cart = get_object_or_404(Cart, user=request.user)
+        owner = CartOwner(user_id=request.user.id)
+        items = cart_store.checkout_items(owner)
+
+        # Ensure the cart is not empty
+        if not items:
+            return Response(
+                {'error': 'Cannot create order from an empty cart'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            # Ensure the cart is not empty
-            if not cart.items.exists():
-                return Response(
-                    {'error': 'Cannot create order from an empty cart'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        serializer = self.get_serializer(data=request.data, context={'user': request.user, 'items': items})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-            # Validate and create the order using the serializer
-            # import pdb;pdb.set_trace()
-            serializer = self.get_serializer(data=request.data, context={'user': request.user})
-            if serializer.is_valid():
-                # Save the order with subtotal from the cart
-                order = serializer.save(
-                    user=request.user,
-                    subtotal=cart.total_amount
-                )
-
-                # Create order items from cart items
-                for cart_item in cart.items.all():
-                    OrderItem.objects.create(
-                        order=order,
-                        product=cart_item.product,
-                        sku=cart_item.sku,
-                        quantity=cart_item.quantity,
-                        unit_price=cart_item.unit_price,
-                        subtotal=cart_item.subtotal
-                    )
-
-                # Clear the cart after creating the order
-                cart.items.all().delete()
-
-                # Return the created order
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-            # If the serializer is invalid, return validation errors
+        try:
+            place_order(request.user, owner, items, serializer)
+        except InsufficientStock as e:
+            return Response({'error': str(e), 'items': e.lines}, status=status.HTTP_400_BAD_REQUEST)
+        except VoucherUnavailable as e:
+            return Response({'voucher_code': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def quote(self, request):
+        """
+        Totals the cart would be ordered at (voucher, shipping, tax), without writing anything.
+        """
+        serializer = OrderQuoteSerializer(data=request.data)
+        if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            quote = get_quote(CartOwner(user_id=request.user.id), request.user, cart_store,
+                              serializer.validated_data.get('voucher_code'), serializer.validated_data.get('address_id'))
+        except VoucherUnavailable as e:
+            return Response({'voucher_code': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        except Address.DoesNotExist:
+            return Response({'address_id': ['Address does not exist.']}, status=status.HTTP_400_BAD_REQUEST)
+        if quote is None:
+            return Response({'error': 'Cannot quote an empty cart'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(quote)
+
     def update(self, request, *args, **kwargs):
         """
-        Updates an existing order. Supports both full and partial updates.
-        Currently supports only updating top-level fields (e.g., status).
+        Updates an existing order, for staff holding order_update.
+        Currently supports only updating the status, through order.state_machine.
         """
-        with transaction.atomic():
-            order = self.get_object()
+        order = self.get_object()
 
-            # Example: Only allow updates to editable fields
-            allowed_fields = ['status']
-            invalid_keys = set(request.data.keys()) - set(allowed_fields)
-            if invalid_keys:
-                return Response(
-                    {"error": f"Updating the following fields is not allowed: {', '.join(invalid_keys)}"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        # Example: Only allow updates to editable fields
+        allowed_fields = ['status']
+        invalid_keys = set(request.data.keys()) - set(allowed_fields)
+        if invalid_keys:
+            return Response(
+                {"error": f"Updating the following fields is not allowed: {', '.join(invalid_keys)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            # Validate and partially update
-            serializer = self.get_serializer(order, data=request.data, partial=True, context={'user': request.user})
-            if not serializer.is_valid():
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer = OrderStatusChangeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            order = transition_order(order, actor=request.user, status=serializer.validated_data['status'])
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(order).data, status=status.HTTP_200_OK)
 
-            updated_order = serializer.save()
-            return Response(self.get_serializer(updated_order).data, status=status.HTTP_200_OK)
-            
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         order = self.get_object()
-        if order.status == OrderStatusChoices.PENDING or order.status == OrderStatusChoices.CANCELLED:
-            order.status = OrderStatusChoices.CANCELLED
-            order.save()
+        if order.status == OrderStatusChoices.CANCELLED:
+            # cancelling twice (e.g. a retried request) is a no-op
             return Response({'status': 'Order cancelled'})
+        if order.status == OrderStatusChoices.PENDING:
+            try:
+                transition_order(order, actor=request.user, note='Cancelled by the customer',
+                                 status=OrderStatusChoices.CANCELLED)
+            except InvalidTransition:
+                # picked up by staff in the meantime
+                pass
+            else:
+                return Response({'status': 'Order cancelled'})
         return Response(
             {'error': 'Cannot cancel order in current status'},
             status=status.HTTP_400_BAD_REQUEST
@@ -188,12 +249,90 @@ class OrderViewSet(viewsets.ModelViewSet):
 
 
 
-class VoucherViewSet(HasPermissionMixin, viewsets.ModelViewSet):
+class AdminOrderViewSet(HasPermissionMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Every customer's orders for ops staff, filtered by status, payment status, date range,
+    city and order/phone number prefix.
+    """
+    serializer_class = AdminOrderSerializer
+    permission_classes = [IsAuthenticated]
+
+    method_permissions = {
+        'GET': PermissionEnum.order_list,
+        'POST': PermissionEnum.order_update,
+    }
+
+    def get_queryset(self):
+        if self.action == 'retrieve':
+            return Order.objects.prefetch_related('items')
+        if self.detail:
+            return Order.objects.all()
+        filters = AdminOrderFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        return filter_orders(Order.objects.all(), filters.validated_data)
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return AdminOrderDetailSerializer
+        return super().get_serializer_class()
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            archived = get_archived_order(kwargs['pk'])
+            if archived is None:
+                raise
+            return Response(archived)
+
+    @action(detail=True, methods=['get', 'post'], serializer_class=OrderStatusChangeSerializer)
+    def transitions(self, request, pk=None):
+        """
+        GET: the order's status history. POST: change its status and/or payment status.
+        """
+        order = self.get_object()
+        if request.method == 'POST':
+            serializer = self.get_serializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            data = serializer.validated_data
+            targets = {field: data[field] for field in ('status', 'payment_status') if field in data}
+            try:
+                transition_order(order, actor=request.user, note=data['note'], **targets)
+            except InvalidTransition as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        transitions = order.transitions.order_by('created_at', 'id')
+        return Response(OrderTransitionSerializer(transitions, many=True).data)
+
+    @action(detail=False, methods=['post'], url_path='bulk-transition', serializer_class=OrderBulkTransitionSerializer)
+    def bulk_transition(self, request):
+        """
+        Move many orders from one status to the next at once, e.g. PROCESSING to SHIPPED
+        with their tracking numbers. Orders no longer in from_status are skipped.
+        """
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        moved = bulk_transition(data['ids'], data['from_status'], data['to_status'], data['tracking_numbers'],
+                                actor=request.user, note=data['note'])
+        moved_ids = set(moved)
+        return Response({
+            'updated': moved,
+            'skipped': [order_id for order_id in dict.fromkeys(data['ids']) if order_id not in moved_ids],
+        })
+
+
+class VoucherViewSet(HasPermissionMixin, CacheResponseMixin, viewsets.ModelViewSet):
     serializer_class = VoucherSerializer
     permission_classes = [IsAuthenticated]
+    cache_tags = ('voucher',)
 
     method_permissions = {
+        'GET': PermissionEnum.voucher_details,
         'PUT': PermissionEnum.voucher_update,
+        'PATCH': PermissionEnum.voucher_update,
         'DELETE': PermissionEnum.voucher_delete,
         'POST': PermissionEnum.voucher_create
     }
@@ -212,3 +351,50 @@ class VoucherViewSet(HasPermissionMixin, viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], serializer_class=VoucherGenerateSerializer)
+    def generate(self, request):
+        """
+        Bulk create vouchers from a template and stream their codes back as CSV while they are written.
+        """
+        serializer = VoucherGenerateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        count, prefix, length, template, scopes = serializer.split()
+        batches = generate_vouchers(count, template, scopes=scopes, prefix=prefix, length=length)
+        rows = (''.join(f'{code}\n' for code in codes) for codes in batches)
+        response = StreamingHttpResponse(chain(['code\n'], rows), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="vouchers-{timezone.now():%Y%m%d%H%M%S}.csv"'
+        return response
+
+
+class ShippingRuleViewSet(HasPermissionMixin, CacheResponseMixin, viewsets.ModelViewSet):
+    serializer_class = ShippingRuleSerializer
+    permission_classes = [IsAuthenticated]
+    cache_tags = ('shipping_rule',)
+
+    method_permissions = {
+        'PUT': PermissionEnum.shipping_rule_update,
+        'PATCH': PermissionEnum.shipping_rule_update,
+        'DELETE': PermissionEnum.shipping_rule_delete,
+        'POST': PermissionEnum.shipping_rule_create
+    }
+
+    def get_queryset(self):
+        return ShippingRule.objects.all()
+
+
+class TaxRuleViewSet(HasPermissionMixin, CacheResponseMixin, viewsets.ModelViewSet):
+    serializer_class = TaxRuleSerializer
+    permission_classes = [IsAuthenticated]
+    cache_tags = ('tax_rule',)
+
+    method_permissions = {
+        'PUT': PermissionEnum.tax_rule_update,
+        'PATCH': PermissionEnum.tax_rule_update,
+        'DELETE': PermissionEnum.tax_rule_delete,
+        'POST': PermissionEnum.tax_rule_create
+    }
+
+    def get_queryset(self):
+        return TaxRule.objects.all()
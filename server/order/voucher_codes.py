@@ -0,0 +1,71 @@
+import secrets
+
+from django.db import IntegrityError, transaction
+
+from core.Utiilties.cache import tiered_cache
+from .models import Voucher
+
+# 32 symbols without look-alikes (0/O, 1/I): every random byte maps to one symbol
+# without bias (256 % 32 == 0), 5 bits of entropy per character.
+CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+CODE_TRANSLATION = bytes(ord(CODE_ALPHABET[byte % len(CODE_ALPHABET)]) for byte in range(256))
+DEFAULT_CODE_LENGTH = 12
+DEFAULT_BATCH_SIZE = 5000
+SCOPE_FIELDS = ('categories', 'brands', 'products')
+
+
+def random_codes(count, length=DEFAULT_CODE_LENGTH, prefix=''):
+    """
+    `count` distinct random codes from the OS CSPRNG, generated in one call.
+    """
+    codes = set()
+    while len(codes) < count:
+        missing = count - len(codes)
+        raw = secrets.token_bytes(missing * length).translate(CODE_TRANSLATION).decode()
+        codes.update(prefix + raw[i:i + length] for i in range(0, len(raw), length))
+    return codes
+
+
+def generate_vouchers(count, template, scopes=None, prefix='', length=DEFAULT_CODE_LENGTH,
+                      batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Create `count` vouchers sharing the `template` field values and yield the new codes
+    batch by batch. Each batch is checked against the code index with one query, written
+    with one bulk_create (plus one per scope M2M) and committed on its own, so the caller
+    can stream codes while the rest is generated.
+    """
+    scopes = {field: list(ids) for field, ids in (scopes or {}).items() if ids}
+    remaining = count
+    try:
+        while remaining:
+            codes = random_codes(min(batch_size, remaining), length=length, prefix=prefix)
+            codes -= set(Voucher.objects.filter(code__in=codes).values_list('code', flat=True))
+            try:
+                with transaction.atomic():
+                    vouchers = Voucher.objects.bulk_create([Voucher(code=code, **template) for code in codes])
+                    create_scopes(vouchers, scopes)
+            except IntegrityError:
+                # a code was taken concurrently between the check and the insert, draw the batch again
+                continue
+            remaining -= len(vouchers)
+            yield [voucher.code for voucher in vouchers]
+    finally:
+        # bulk_create sends no signals
+        tiered_cache.invalidate_tags('voucher')
+
+
+def create_scopes(vouchers, scopes):
+    if not scopes:
+        return
+    if any(voucher.pk is None for voucher in vouchers):
+        # databases that don't return ids from bulk inserts
+        ids = dict(Voucher.objects.filter(code__in=[voucher.code for voucher in vouchers]).values_list('code', 'id'))
+        for voucher in vouchers:
+            voucher.pk = ids[voucher.code]
+    for field, ids in scopes.items():
+        through = getattr(Voucher, field).through
+        source = getattr(Voucher, field).field.m2m_field_name()
+        target = getattr(Voucher, field).field.m2m_reverse_field_name()
+        through.objects.bulk_create([
+            through(**{f'{source}_id': voucher.pk, f'{target}_id': pk}) for voucher in vouchers for pk in ids
+        ])
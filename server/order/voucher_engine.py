@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.utils import timezone
+
+from core.Utiilties.cache import tiered_cache
+from .models import Voucher, Order, ArchivedOrder, OrderStatusChoices, calculate_discount
+from .vouchers import VoucherUnavailable
+
+
+def voucher_cache_key(code):
+    return f"order:voucher:{code}"
+
+
+def voucher_tag(code):
+    return f"voucher:{code}"
+
+
+class CompiledVoucher:
+    """
+    A voucher's rules flattened into plain values (scope ids as sets), so it can be cached
+    and checked against a cart in memory. times_used is left out on purpose: it changes on
+    every redemption and is enforced by order.vouchers.redeem_voucher.
+    """
+    fields = (
+        'id', 'code', 'discount_type', 'discount_value', 'max_discount_amount', 'valid_from', 'valid_to',
+        'usage_limit', 'per_user_limit', 'use_flash_counter', 'min_subtotal', 'first_order_only', 'is_stackable',
+    )
+
+    def __init__(self, category_ids=(), brand_ids=(), product_ids=(), **values):
+        for field in self.fields:
+            setattr(self, field, values[field])
+        self.category_ids = frozenset(category_ids)
+        self.brand_ids = frozenset(brand_ids)
+        self.product_ids = frozenset(product_ids)
+
+    @classmethod
+    def compile(cls, voucher):
+        return cls(
+            category_ids=voucher.categories.values_list('id', flat=True),
+            brand_ids=voucher.brands.values_list('id', flat=True),
+            product_ids=voucher.products.values_list('id', flat=True),
+            **{field: getattr(voucher, field) for field in cls.fields}
+        )
+
+    @property
+    def is_scoped(self):
+        return bool(self.category_ids or self.brand_ids or self.product_ids)
+
+    def applies_to(self, item):
+        """
+        Whether a cart item (with product/sku loaded) is part of the discount base.
+        """
+        product = item.product
+        if not self.is_stackable:
+            price_holder = item.sku if item.sku_id else product
+            if price_holder.discount_price:
+                return False
+        if not self.is_scoped:
+            return True
+        return (product.id in self.product_ids
+                or product.category_id in self.category_ids
+                or product.brand_id in self.brand_ids)
+
+    def evaluate(self, items, user, now=None):
+        """
+        Discount for a cart, raises VoucherUnavailable with the reason when the rules don't
+        allow it. Costs no query, except for first_order_only (live and archived orders).
+        """
+        now = now or timezone.now()
+        if now < self.valid_from or now > self.valid_to:
+            raise VoucherUnavailable("Invalid or expired voucher code.")
+
+        subtotal = sum(item.subtotal for item in items)
+        if self.min_subtotal and subtotal < self.min_subtotal:
+            raise VoucherUnavailable(f"This voucher requires a minimum order of {self.min_subtotal}.")
+
+        base = sum(item.subtotal for item in items if self.applies_to(item))
+        if not base:
+            raise VoucherUnavailable("This voucher does not apply to the items in your cart.")
+
+        if self.first_order_only and (
+                Order.objects.filter(user=user).exclude(status=OrderStatusChoices.CANCELLED).exists()
+                or ArchivedOrder.objects.filter(user=user).exclude(status=OrderStatusChoices.CANCELLED).exists()):
+            raise VoucherUnavailable("This voucher is only valid on your first order.")
+
+        return calculate_discount(self.discount_type, self.discount_value, self.max_discount_amount, base)
+
+
+def load_compiled_voucher(code):
+    voucher = Voucher.objects.filter(code=code).first()
+    return CompiledVoucher.compile(voucher) if voucher is not None else None
+
+
+def get_compiled_voucher(code):
+    """
+    Compiled voucher for a code (None for unknown codes, which are cached too), invalidated
+    through the voucher:<code> tag whenever the voucher or its scopes change.
+    """
+    return tiered_cache.get_or_set(
+        voucher_cache_key(code),
+        lambda: load_compiled_voucher(code),
+        timeout=getattr(settings, 'VOUCHER_CACHE_TTL', 60 * 60),
+        tags=[voucher_tag(code)],
+    )
+
+
+def apply_voucher(code, items, user):
+    """
+    (compiled voucher, discount) of a code for a cart, raises VoucherUnavailable.
+    """
+    voucher = get_compiled_voucher(code)
+    if voucher is None:
+        raise VoucherUnavailable("Invalid voucher code.")
+    return voucher, voucher.evaluate(items, user)
@@ -0,0 +1,85 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.Utiilties.cache import tiered_cache
+from .models import Voucher, VoucherRedemption
+
+logger = logging.getLogger(__name__)
+
+FLASH_COUNTER_TIMEOUT = 60
+
+
+class VoucherUnavailable(Exception):
+    pass
+
+
+def flash_counter_key(voucher):
+    return f"voucher:{voucher.id}:redemptions"
+
+
+def take_flash_slot(voucher):
+    """
+    Cheap Redis gate in front of the database for flash codes: once the counter is past the
+    usage limit the flood is turned away without touching the voucher row. The counter is
+    seeded from times_used and expires quickly, so drift from rolled back orders heals itself.
+    """
+    key = flash_counter_key(voucher)
+    try:
+        cache.add(key, Voucher.objects.filter(id=voucher.id).values_list('times_used', flat=True).first() or 0,
+                  timeout=FLASH_COUNTER_TIMEOUT)
+        if cache.incr(key) > voucher.usage_limit:
+            cache.decr(key)
+            return False
+    except ValueError:  # key expired between add and incr, let the database decide
+        pass
+    except Exception as e:
+        logger.warning(f"Voucher flash counter unavailable, falling back to the database: {e}")
+    return True
+
+
+def release_flash_slot(voucher):
+    try:
+        cache.decr(flash_counter_key(voucher))
+    except Exception:
+        pass
+
+
+def redeem_voucher(voucher, user, order):
+    """
+    Count one use of `voucher` (a Voucher or CompiledVoucher) by `user` for `order`; call it
+    inside the checkout transaction.
+
+    The usage limit is enforced by a conditional UPDATE (times_used < usage_limit), so
+    concurrent checkouts can never oversubscribe a code, and the per customer limit by one
+    indexed lookup on VoucherRedemption.
+    """
+    if voucher.per_user_limit is not None:
+        # serialize checkouts of this customer so two of them can't both pass the count
+        get_user_model().objects.select_for_update().filter(id=user.id).first()
+        used = VoucherRedemption.objects.filter(voucher_id=voucher.id, user=user).count()
+        if used >= voucher.per_user_limit:
+            raise VoucherUnavailable("You have already used this voucher.")
+
+    flash = voucher.use_flash_counter and voucher.usage_limit is not None
+    if flash and not take_flash_slot(voucher):
+        raise VoucherUnavailable("This voucher has been fully redeemed.")
+
+    now = timezone.now()
+    updated = Voucher.objects.filter(
+        Q(usage_limit__isnull=True) | Q(times_used__lt=F('usage_limit')),
+        id=voucher.id, valid_from__lte=now, valid_to__gte=now,
+    ).update(times_used=F('times_used') + 1)
+    if not updated:
+        if flash:
+            release_flash_slot(voucher)
+        raise VoucherUnavailable("Invalid or expired voucher code.")
+
+    VoucherRedemption.objects.create(voucher_id=voucher.id, user=user, order=order)
+    # the UPDATE sends no signal: drop the cached admin voucher responses showing times_used
+    # (the compiled rules under voucher:<code> leave times_used out and stay cached)
+    transaction.on_commit(lambda: tiered_cache.invalidate_tags('voucher'))
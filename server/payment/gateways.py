@@ -0,0 +1,153 @@
+"""
+Payment gateways.
+
+A gateway creates the payment of a PaymentIntent on the provider's side and turns the
+provider's webhook callbacks into GatewayEvents. Gateways are configured by name in
+PAYMENT['GATEWAYS'] (dotted paths); FakeGateway stands in for a real provider locally and
+in tests, with HMAC-signed callbacks built by FakeGateway.build_event(). It is only
+registered by the DEBUG settings and refuses to work without PAYMENT['FAKE_SECRET'].
+"""
+import hashlib
+import hmac
+import json
+import secrets
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .models import PaymentIntentStatusChoices
+
+default_settings = {
+    'GATEWAYS': {},
+    'DEFAULT_GATEWAY': None,
+    'CURRENCY': 'BDT',
+    'FAKE_SECRET': None,
+    'BATCH_SIZE': 200,  # webhook events applied per transaction
+    'MAX_ATTEMPTS': 10,  # events failing this often are left for inspection
+    'KICK_DELAY': 2,  # seconds a burst of callbacks is collected before a worker run
+}
+
+
+def get_payment_settings():
+    return {**default_settings, **getattr(settings, 'PAYMENT', {})}
+
+
+class UnknownGateway(Exception):
+    pass
+
+
+class InvalidWebhook(Exception):
+    pass
+
+
+class GatewayEvent:
+    """
+    A webhook callback in gateway independent terms.
+    """
+
+    def __init__(self, event_id, event_type, reference, status=None, amount=None, failure_reason=''):
+        self.event_id = event_id
+        self.event_type = event_type
+        self.reference = reference
+        self.status = status  # PaymentIntentStatusChoices, None for events without an outcome
+        self.amount = amount
+        self.failure_reason = failure_reason
+
+
+class PaymentGateway:
+    name = None
+
+    def create_payment(self, intent):
+        """
+        Register the payment on the provider's side, returns (reference, checkout_url).
+        """
+        raise NotImplementedError
+
+    def verify(self, body, headers):
+        """
+        Raise InvalidWebhook unless the raw callback `body` was sent by the provider.
+        """
+        raise NotImplementedError
+
+    def parse_event(self, payload):
+        """
+        GatewayEvent of a decoded callback payload, raises InvalidWebhook when malformed.
+        """
+        raise NotImplementedError
+
+    def load(self, body):
+        try:
+            return json.loads(body)
+        except (TypeError, ValueError):
+            raise InvalidWebhook("Callback body is not JSON.")
+
+
+class FakeGateway(PaymentGateway):
+    """
+    Local stand-in: payments are created without any network call and callbacks are
+    signed with PAYMENT['FAKE_SECRET'] in the X-Fake-Signature header.
+    """
+    name = 'fake'
+    SIGNATURE_HEADER = 'X-Fake-Signature'
+    EVENT_STATUSES = {
+        'payment.succeeded': PaymentIntentStatusChoices.SUCCEEDED,
+        'payment.failed': PaymentIntentStatusChoices.FAILED,
+        'payment.refunded': PaymentIntentStatusChoices.REFUNDED,
+    }
+
+    def __init__(self):
+        self.secret = get_payment_settings()['FAKE_SECRET']
+        if not self.secret:
+            raise ImproperlyConfigured("PAYMENT['FAKE_SECRET'] (FAKE_GATEWAY_SECRET) must be set to use the fake gateway.")
+
+    def sign(self, body):
+        return hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+
+    def create_payment(self, intent):
+        reference = f"fake_{secrets.token_hex(12)}"
+        return reference, f"https://fake-gateway.local/pay/{reference}"
+
+    def verify(self, body, headers):
+        signature = headers.get(self.SIGNATURE_HEADER, '')
+        if not hmac.compare_digest(signature, self.sign(body)):
+            raise InvalidWebhook("Invalid signature.")
+
+    def parse_event(self, payload):
+        try:
+            data = payload['data']
+            amount = data.get('amount')
+            return GatewayEvent(
+                event_id=str(payload['id']), event_type=payload['type'], reference=data['reference'],
+                status=self.EVENT_STATUSES.get(payload['type']),
+                amount=Decimal(str(amount)) if amount is not None else None,
+                failure_reason=data.get('failure_reason') or '',
+            )
+        except (KeyError, TypeError, AttributeError, InvalidOperation):
+            raise InvalidWebhook("Malformed event.")
+
+    def build_event(self, intent, event_type='payment.succeeded', amount=None, failure_reason='', event_id=None):
+        """
+        (body, headers) of a signed callback about `intent`, as the provider would post it.
+        """
+        body = json.dumps({
+            'id': event_id or f"evt_{uuid.uuid4().hex}",
+            'type': event_type,
+            'data': {
+                'reference': intent.reference,
+                'amount': str(intent.amount if amount is None else amount),
+                'currency': intent.currency,
+                'failure_reason': failure_reason,
+            },
+        }).encode()
+        return body, {self.SIGNATURE_HEADER: self.sign(body)}
+
+
+def get_gateway(name=None):
+    gateways = get_payment_settings()['GATEWAYS']
+    name = name or get_payment_settings()['DEFAULT_GATEWAY']
+    if not name or name not in gateways:
+        raise UnknownGateway(f"Unknown payment gateway {name}.")
+    return import_string(gateways[name])()
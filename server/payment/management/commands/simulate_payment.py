@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payment.gateways import FakeGateway, get_payment_settings
+from payment.models import PaymentIntent
+from payment.processing import receive_webhook, process_webhooks
+
+
+class Command(BaseCommand):
+    help = "Send a signed fake gateway callback for a payment intent, as the provider would."
+
+    def add_arguments(self, parser):
+        parser.add_argument('intent_id', type=int)
+        parser.add_argument('--event', choices=list(FakeGateway.EVENT_STATUSES), default='payment.succeeded')
+        parser.add_argument('--amount', help="Paid amount, defaults to the intent's.")
+        parser.add_argument('--process', action='store_true', help="Apply the event right away instead of leaving it to the workers.")
+
+    def handle(self, *args, **options):
+        if FakeGateway.name not in get_payment_settings()['GATEWAYS']:
+            raise CommandError("The fake gateway is only registered with DEBUG on.")
+        intent = PaymentIntent.objects.filter(pk=options['intent_id'], gateway=FakeGateway.name).first()
+        if intent is None:
+            raise CommandError(f"No fake gateway payment intent {options['intent_id']}.")
+        body, headers = FakeGateway().build_event(intent, options['event'], amount=options['amount'])
+        event = receive_webhook(FakeGateway.name, body, headers)
+        self.stdout.write(f"Queued {event.event_type} {event.event_id} for {intent.reference}")
+        if options['process']:
+            self.stdout.write(f"Applied {process_webhooks()} events")
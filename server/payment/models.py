@@ -0,0 +1,73 @@
+from django.db import models
+from django.utils import timezone
+
+from order.models import Order, PaymentStatusChoices
+
+
+class PaymentIntentStatusChoices(models.IntegerChoices):
+    PENDING = 1, 'Pending'
+    SUCCEEDED = 2, 'Succeeded'
+    FAILED = 3, 'Failed'
+    REFUNDED = 4, 'Refunded'
+
+
+# order payment status each intent outcome moves the order to
+ORDER_PAYMENT_STATUS = {
+    PaymentIntentStatusChoices.SUCCEEDED: PaymentStatusChoices.PAID,
+    PaymentIntentStatusChoices.FAILED: PaymentStatusChoices.FAILED,
+    PaymentIntentStatusChoices.REFUNDED: PaymentStatusChoices.REFUNDED,
+}
+
+
+class PaymentIntent(models.Model):
+    """
+    One attempt to collect an order's total through a gateway. The outcome arrives later
+    through the gateway's webhook (payment.processing).
+    """
+    # kept when the order is archived (order.archive), as the record of the payment
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='payment_intents')
+    gateway = models.CharField(max_length=50)
+    reference = models.CharField(max_length=255, help_text="The gateway's id of the payment.")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3)
+    status = models.IntegerField(choices=PaymentIntentStatusChoices.choices, default=PaymentIntentStatusChoices.PENDING)
+    checkout_url = models.URLField(max_length=500, blank=True, default='')
+    failure_reason = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['gateway', 'reference'], name='unique_payment_intent_reference'),
+        ]
+
+    def __str__(self):
+        return f"{self.gateway} {self.reference} ({self.get_status_display()})"
+
+
+class WebhookEvent(models.Model):
+    """
+    A gateway callback as received, stored by the webhook endpoint and applied later in
+    batches by payment.processing. The gateway's event id makes redeliveries no-ops.
+    """
+    gateway = models.CharField(max_length=50)
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=100)
+    reference = models.CharField(max_length=255, blank=True, default='', help_text="PaymentIntent.reference")
+    payload = models.JSONField(default=dict)
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['gateway', 'event_id'], name='unique_webhook_event'),
+        ]
+        indexes = [
+            # the workers only ever scan unprocessed events
+            models.Index(fields=['received_at', 'id'], name='webhook_pending_idx', condition=models.Q(processed_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.gateway} {self.event_type} {self.event_id}"
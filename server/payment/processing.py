@@ -0,0 +1,194 @@
+"""
+Payment intents and asynchronous webhook processing.
+
+The webhook endpoint only verifies a callback and stores it as a WebhookEvent (one insert,
+duplicates of an event id ignored), then schedules a worker run; callback bursts during
+sales therefore cost the web workers next to nothing. Workers (process_webhooks, Celery
+task payment.tasks.process_payment_webhooks) claim pending events in batches with SKIP
+LOCKED and apply them: the intent gets the outcome and the order's payment_status moves
+through order.state_machine. Applying an event twice changes nothing.
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from order.models import OrderStatusChoices, PaymentStatusChoices
+from order.state_machine import transition_order, can_transition, InvalidTransition
+from .gateways import get_gateway, get_payment_settings
+from .models import PaymentIntent, WebhookEvent, PaymentIntentStatusChoices as Intent, ORDER_PAYMENT_STATUS
+
+logger = logging.getLogger(__name__)
+
+KICK_KEY = 'payment:webhooks:kick'
+PAYABLE_STATUSES = (PaymentStatusChoices.PENDING, PaymentStatusChoices.FAILED)
+CLOSED_ORDER_STATUSES = (OrderStatusChoices.CANCELLED, OrderStatusChoices.REFUNDED)
+
+# {from: allowed targets} of PaymentIntent.status; a success may arrive after a failure
+INTENT_TRANSITIONS = {
+    Intent.PENDING: {Intent.SUCCEEDED, Intent.FAILED},
+    Intent.FAILED: {Intent.SUCCEEDED},
+    Intent.SUCCEEDED: {Intent.REFUNDED},
+    Intent.REFUNDED: set(),
+}
+
+
+class PaymentNotAllowed(Exception):
+    pass
+
+
+class IgnoredEvent(Exception):
+    """
+    An event that can never be applied (unknown intent, impossible move...): recorded as
+    processed with the reason instead of being retried.
+    """
+
+
+def create_intent(order, gateway_name=None, actor=None):
+    """
+    Start paying `order` through a gateway. A pending intent of the same gateway and
+    amount is reused; a failed order payment goes back to pending.
+    """
+    if order.payment_status not in PAYABLE_STATUSES or order.status in CLOSED_ORDER_STATUSES:
+        raise PaymentNotAllowed("This order can't be paid.")
+    conf = get_payment_settings()
+    gateway_name = gateway_name or conf['DEFAULT_GATEWAY']
+    gateway = get_gateway(gateway_name)
+
+    intent = order.payment_intents.filter(gateway=gateway_name, status=Intent.PENDING, amount=order.total).first()
+    if intent is None:
+        # the provider call happens outside of any transaction
+        intent = PaymentIntent(order=order, gateway=gateway_name, amount=order.total, currency=conf['CURRENCY'])
+        intent.reference, intent.checkout_url = gateway.create_payment(intent)
+        intent.save()
+    if order.payment_status == PaymentStatusChoices.FAILED:
+        transition_order(order, actor=actor, note='Payment retried', payment_status=PaymentStatusChoices.PENDING)
+    return intent
+
+
+def kick_processor():
+    """
+    Schedule a worker run, at most one per KICK_DELAY: the callbacks of a burst are
+    applied together by the run scheduled for the first one.
+    """
+    delay = get_payment_settings()['KICK_DELAY']
+    if not cache.add(KICK_KEY, 1, timeout=delay):
+        return
+    try:
+        from .tasks import process_payment_webhooks
+        process_payment_webhooks.apply_async(countdown=delay)
+    except Exception as e:
+        # the periodic run picks the events up
+        logger.warning(f"Could not schedule the payment webhook processor: {e}")
+
+
+def receive_webhook(gateway_name, body, headers):
+    """
+    Verify and store one gateway callback for the workers. Raises UnknownGateway or
+    InvalidWebhook. Returns the parsed GatewayEvent.
+    """
+    gateway = get_gateway(gateway_name)
+    gateway.verify(body, headers)
+    payload = gateway.load(body)
+    event = gateway.parse_event(payload)
+    # a redelivered event id is dropped by the unique constraint
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(gateway=gateway_name, event_id=event.event_id, event_type=event.event_type,
+                      reference=event.reference, payload=payload)],
+        ignore_conflicts=True,
+    )
+    transaction.on_commit(kick_processor)
+    return event
+
+
+def apply_event(webhook, intent):
+    """
+    Apply one stored callback to its intent and order. Returns a note for the event log
+    when the order was left alone.
+    """
+    if intent is None:
+        raise IgnoredEvent(f"No payment intent {webhook.reference}.")
+    if intent.order is None:
+        raise IgnoredEvent(f"The order of payment {intent.reference} was archived.")
+    event = get_gateway(webhook.gateway).parse_event(webhook.payload)
+    if event.status is None or event.status == intent.status:
+        return None
+    if event.status not in INTENT_TRANSITIONS[intent.status]:
+        raise IgnoredEvent(f"Can't move payment {intent.reference} from {intent.get_status_display()} "
+                           f"to {Intent(event.status).label}.")
+    if event.status == Intent.SUCCEEDED and event.amount is not None and event.amount != intent.amount:
+        raise IgnoredEvent(f"Paid amount {event.amount} does not match {intent.amount}.")
+
+    intent.status = event.status
+    intent.failure_reason = event.failure_reason[:255]
+    intent.save(update_fields=['status', 'failure_reason', 'updated_at'])
+
+    target = ORDER_PAYMENT_STATUS[event.status]
+    order = intent.order
+    if order.payment_status != target and not can_transition('payment_status', order.payment_status, target):
+        # e.g. a retried payment failing after another one went through
+        return f"Order {order.order_number} left {order.get_payment_status_display()}."
+    try:
+        # keep the batch's copy current for later events of the same order
+        intent.order = transition_order(order, note=f"{webhook.gateway} {webhook.event_type} {webhook.event_id}",
+                                        payment_status=target)
+    except InvalidTransition as e:
+        return str(e)
+    return None
+
+
+def process_batch(conf):
+    """
+    Apply one batch of pending events in one transaction, each in its own savepoint.
+    Rows are claimed with SKIP LOCKED, so workers can run side by side.
+    """
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, attempts__lt=conf['MAX_ATTEMPTS'])
+            .order_by('received_at', 'id')[:conf['BATCH_SIZE']]
+        )
+        if not events:
+            return events
+        intents = {
+            (intent.gateway, intent.reference): intent
+            for intent in PaymentIntent.objects.select_related('order')
+            .filter(reference__in={event.reference for event in events})
+        }
+        for event in events:
+            intent = intents.get((event.gateway, event.reference))
+            try:
+                with transaction.atomic():
+                    event.last_error = apply_event(event, intent) or ''
+                event.processed_at = timezone.now()
+            except IgnoredEvent as e:
+                event.last_error = str(e)
+                event.processed_at = timezone.now()
+            except Exception as e:
+                logger.exception(f"Failed to apply webhook event {event}")
+                event.attempts += 1
+                event.last_error = f"{type(e).__name__}: {e}"
+                if intent is not None:
+                    # the savepoint was rolled back, the batch's copies may not be
+                    intent.refresh_from_db()
+                    if intent.order is not None:
+                        intent.order.refresh_from_db()
+        WebhookEvent.objects.bulk_update(events, ['processed_at', 'attempts', 'last_error'])
+    return events
+
+
+def process_webhooks(max_batches=None):
+    """
+    Apply pending webhook events batch by batch until none are left. Returns how many
+    were handled.
+    """
+    conf = get_payment_settings()
+    handled = batches = 0
+    while max_batches is None or batches < max_batches:
+        events = process_batch(conf)
+        handled += len(events)
+        batches += 1
+        if len(events) < conf['BATCH_SIZE']:
+            break
+    return handled
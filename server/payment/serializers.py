@@ -0,0 +1,24 @@
+from rest_framework import serializers
+
+from .gateways import get_payment_settings
+from .models import PaymentIntent
+
+
+class PaymentIntentSerializer(serializers.ModelSerializer):
+    order_number = serializers.CharField(source='order.order_number', read_only=True)
+
+    class Meta:
+        model = PaymentIntent
+        fields = ['id', 'order', 'order_number', 'gateway', 'reference', 'amount', 'currency', 'status',
+                  'checkout_url', 'failure_reason', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class PaymentIntentCreateSerializer(serializers.Serializer):
+    order_id = serializers.IntegerField()
+    gateway = serializers.CharField(required=False)
+
+    def validate_gateway(self, value):
+        if value not in get_payment_settings()['GATEWAYS']:
+            raise serializers.ValidationError("Unknown payment gateway.")
+        return value
@@ -0,0 +1,11 @@
+from celery import shared_task
+
+from payment.processing import process_webhooks
+
+
+@shared_task(name='process_payment_webhooks')
+def process_payment_webhooks(max_batches=50):
+    """
+    Apply pending payment gateway callbacks in batches, see payment.processing.
+    """
+    return process_webhooks(max_batches=max_batches)
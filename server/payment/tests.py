@@ -0,0 +1,122 @@
+from decimal import Decimal
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.Utiilties.enum import TokenType
+from core.Utiilties.utilities_functions import token_generator
+from core.models import User
+from order.archive import archive_batch, archive_cutoff
+from order.models import Order, OrderStatusChoices, PaymentStatusChoices
+from .gateways import FakeGateway, get_gateway, UnknownGateway
+from .models import PaymentIntent, WebhookEvent, PaymentIntentStatusChoices as Intent
+from .processing import create_intent, process_webhooks
+
+PAYMENT = {
+    'GATEWAYS': {'fake': 'payment.gateways.FakeGateway'},
+    'DEFAULT_GATEWAY': 'fake',
+    'FAKE_SECRET': 'test-secret',
+    'KICK_DELAY': 0,
+}
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'payment-tests'}}
+
+
+@override_settings(PAYMENT=PAYMENT, CACHES=CACHES)
+class PaymentWebhookTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='customer@example.com', phone='', password='password')
+        self.order = Order.objects.create(user=self.user, subtotal=Decimal('500.00'), city='Dhaka', area='Gulshan',
+                                          address_line1='House 1', phone_number='01711111111')
+        self.intent = create_intent(self.order)
+        self.gateway = FakeGateway()
+        self.client = APIClient()
+
+    def post_event(self, body, headers):
+        return self.client.post('/api/payment/webhook/fake/', body, content_type='application/json',
+                                headers=headers)
+
+    def test_intent_is_created_through_the_api(self):
+        self.intent.delete()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + token_generator(self.user.id, TokenType.access))
+        response = client.post('/api/payment/intent/', {'order_id': self.order.id}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Decimal(response.data['amount']), self.order.total)
+
+    def test_invalid_signature_is_rejected(self):
+        body, _ = self.gateway.build_event(self.intent)
+        response = self.post_event(body, {FakeGateway.SIGNATURE_HEADER: 'forged'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_unknown_gateway_is_not_found(self):
+        body, headers = self.gateway.build_event(self.intent)
+        response = self.client.post('/api/payment/webhook/other/', body, content_type='application/json',
+                                    headers=headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_success_marks_order_paid(self):
+        body, headers = self.gateway.build_event(self.intent)
+        self.assertEqual(self.post_event(body, headers).status_code, 202)
+        self.assertEqual(process_webhooks(), 1)
+
+        self.intent.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.intent.status, Intent.SUCCEEDED)
+        self.assertEqual(self.order.payment_status, PaymentStatusChoices.PAID)
+        self.assertIsNotNone(WebhookEvent.objects.get().processed_at)
+
+    def test_redelivered_event_is_applied_once(self):
+        body, headers = self.gateway.build_event(self.intent, event_id='evt_1')
+        for _ in range(3):
+            self.assertEqual(self.post_event(body, headers).status_code, 202)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        process_webhooks()
+
+        # a later redelivery of an applied event changes nothing
+        self.post_event(body, headers)
+        self.assertEqual(process_webhooks(), 0)
+        self.assertEqual(self.order.transitions.filter(field='payment_status').count(), 1)
+
+    def test_amount_mismatch_is_ignored(self):
+        body, headers = self.gateway.build_event(self.intent, amount='1.00')
+        self.post_event(body, headers)
+        process_webhooks()
+
+        self.intent.refresh_from_db()
+        self.assertEqual(self.intent.status, Intent.PENDING)
+        event = WebhookEvent.objects.get()
+        self.assertIsNotNone(event.processed_at)
+        self.assertIn('does not match', event.last_error)
+
+    def test_refund_after_success(self):
+        for event_type in ('payment.succeeded', 'payment.refunded'):
+            self.post_event(*self.gateway.build_event(self.intent, event_type))
+        process_webhooks()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, PaymentStatusChoices.REFUNDED)
+
+    def test_archived_order_keeps_its_intents(self):
+        Order.objects.filter(id=self.order.id).update(status=OrderStatusChoices.CANCELLED)
+        self.assertEqual(archive_batch(archive_cutoff(-1)), 1)
+
+        self.intent.refresh_from_db()
+        self.assertIsNone(self.intent.order_id)
+        self.post_event(*self.gateway.build_event(self.intent))
+        process_webhooks()
+        self.assertIn('archived', WebhookEvent.objects.get().last_error)
+
+
+class PaymentGatewaySettingsTestCase(TestCase):
+    @override_settings(PAYMENT={'GATEWAYS': {}, 'DEFAULT_GATEWAY': None})
+    def test_no_gateway_without_configuration(self):
+        with self.assertRaises(UnknownGateway):
+            get_gateway()
+        with self.assertRaises(UnknownGateway):
+            get_gateway('fake')
+
+    @override_settings(PAYMENT={**PAYMENT, 'FAKE_SECRET': None})
+    def test_fake_gateway_requires_a_secret(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_gateway('fake')
@@ -0,0 +1,13 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import PaymentIntentViewSet, PaymentWebhookView
+
+app_name = 'payment'
+
+router = DefaultRouter()
+router.register(r'intent', PaymentIntentViewSet, basename='payment-intent')
+
+urlpatterns = [
+    path('', include(router.urls)),
+    path('webhook/<str:gateway>/', PaymentWebhookView.as_view(), name='payment-webhook'),
+]
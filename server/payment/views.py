@@ -0,0 +1,56 @@
+from django.shortcuts import get_object_or_404
+from rest_framework import viewsets, status
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.Utiilties.idempotency import idempotent
+from order.models import Order
+from .gateways import UnknownGateway, InvalidWebhook
+from .models import PaymentIntent
+from .processing import create_intent, receive_webhook, PaymentNotAllowed
+from .serializers import PaymentIntentSerializer, PaymentIntentCreateSerializer
+
+
+class PaymentIntentViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Payment intents of the user's orders. POST starts paying an order and returns the
+    gateway's checkout_url; the outcome arrives through the gateway's webhook.
+    """
+    serializer_class = PaymentIntentSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return (PaymentIntent.objects.filter(order__user=self.request.user)
+                .select_related('order').order_by('-created_at'))
+
+    @idempotent(scope='payment:intent:create')
+    def create(self, request, *args, **kwargs):
+        serializer = PaymentIntentCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        order = get_object_or_404(Order, pk=serializer.validated_data['order_id'], user=request.user)
+        try:
+            intent = create_intent(order, serializer.validated_data.get('gateway'), actor=request.user)
+        except (PaymentNotAllowed, UnknownGateway) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(PaymentIntentSerializer(intent).data, status=status.HTTP_201_CREATED)
+
+
+class PaymentWebhookView(APIView):
+    """
+    Gateway callbacks. The event is verified and stored, nothing more: it is applied by
+    the payment workers (payment.processing), so the response is 202 right away.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request, gateway):
+        try:
+            receive_webhook(gateway, request.body, request.headers)
+        except UnknownGateway as e:
+            return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except InvalidWebhook as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_202_ACCEPTED)
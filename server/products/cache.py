@@ -0,0 +1,74 @@
+from core.Utiilties.cache import tiered_cache
+
+PRODUCT_CACHE_KEY = 'products:product:{}'
+PRODUCT_TAG = 'product:{}'
+# Tag shared by every cached product listing, dropped whenever any product is edited
+# (stock-only changes keep it, see invalidate_product_stock).
+PRODUCTS_TAG = 'products'
+MEDIA_FIELDS = ('thumbnail',)
+
+
+def product_cache_key(product_id):
+    return PRODUCT_CACHE_KEY.format(product_id)
+
+
+def product_tag(product_id):
+    return PRODUCT_TAG.format(product_id)
+
+
+def get_cached_products(product_ids):
+    """
+    Return {product_id: serialized product} for the ids found in the cache, in one round trip.
+    """
+    keys = {product_cache_key(product_id): product_id for product_id in product_ids}
+    cached = tiered_cache.get_many(list(keys))
+    return {keys[key]: data for key, data in cached.items()}
+
+
+def product_tag_versions(product_ids):
+    """
+    Snapshot to take before loading products for cache_products().
+    """
+    return tiered_cache.tag_versions(product_tag(product_id) for product_id in product_ids)
+
+
+def cache_products(products_data, versions=None):
+    keys = {product_cache_key(product_id): product_id for product_id in products_data}
+    tiered_cache.set_many(
+        {key: products_data[product_id] for key, product_id in keys.items()},
+        tags=lambda key: (product_tag(keys[key]),),
+        versions=versions,
+    )
+
+
+def invalidate_products(*product_ids):
+    tiered_cache.invalidate_tags(PRODUCTS_TAG, *(product_tag(product_id) for product_id in product_ids if product_id))
+
+
+def invalidate_product_stock(*product_ids):
+    """
+    For stock-only changes (checkout, cancellations): drop the cached products themselves
+    but keep the shared listings under PRODUCTS_TAG, which would otherwise be rebuilt on
+    every order. Their stock figures are at most their TTL old (HOME_SECTION_TTLS).
+    """
+    tiered_cache.invalidate_tags(*(product_tag(product_id) for product_id in product_ids if product_id))
+
+
+def absolutize_media(data, request, fields=MEDIA_FIELDS):
+    """
+    Cached products are serialized without a request so they can be shared between hosts;
+    build absolute media URLs on the way out, like the serializer does when it has a request.
+    """
+    if request is None:
+        return data
+
+    data = dict(data)
+    for field in fields:
+        if data.get(field):
+            data[field] = request.build_absolute_uri(data[field])
+    if data.get('images'):
+        data['images'] = [
+            {**image, 'image': request.build_absolute_uri(image['image'])} if image.get('image') else image
+            for image in data['images']
+        ]
+    return data
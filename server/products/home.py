@@ -0,0 +1,139 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, models
+
+from campaign.models import Campaign
+from campaign.serializers import CampaignSerializer
+from core.Utiilties.cache import tiered_cache
+from order.models import OrderStatusChoices, PaymentStatusChoices, DiscountTypeChoices
+from .cache import absolutize_media, PRODUCTS_TAG
+from .models import Category, Brand, Tag, VariantAttribute, Product
+from .serializers import (
+    ProductSerializer, CategorySerializer, BrandSerializer, TagSerializer, VariantSerializer, FlatCategorySerializer
+)
+
+HOME_SECTION_KEY = 'products:home:{}'
+HOME_PRODUCT_LIST_SIZE = 12
+DEFAULT_SECTION_TTL = 300
+
+
+def text_choices_to_json(choices):
+    return [{"key": key, "value": value} for key, value in choices.choices]
+
+
+def build_context_data():
+    categories = Category.objects.all()
+    variants = VariantAttribute.objects.prefetch_related('values')
+    brands = Brand.objects.all()
+    tags = Tag.objects.all()
+    return {
+        'categories': FlatCategorySerializer(categories, many=True).data,
+        'variants': VariantSerializer(variants, many=True).data,
+        'brands': BrandSerializer(brands, many=True).data,
+        'tags': TagSerializer(tags, many=True).data,
+        'order_status': text_choices_to_json(OrderStatusChoices),
+        'payment_status': text_choices_to_json(PaymentStatusChoices),
+        'voucher_type': text_choices_to_json(DiscountTypeChoices),
+    }
+
+
+def build_campaign_section():
+    campaign = Campaign.objects.first()
+    if campaign is None:
+        return None
+    data = CampaignSerializer(campaign).data
+    data['image'] = campaign.image.url if campaign.image else None
+    return data
+
+
+def build_categories_section():
+    return CategorySerializer(Category.objects.filter(parent=None), many=True).data
+
+
+def storefront_products():
+    return Product.objects.with_listing_data().filter(is_active=True, is_deleted=False)
+
+
+def serialize_products(queryset):
+    return ProductSerializer(queryset[:HOME_PRODUCT_LIST_SIZE], many=True).data
+
+
+def build_new_arrivals_section():
+    return serialize_products(storefront_products().order_by('-created_at'))
+
+
+def build_on_sale_section():
+    return serialize_products(
+        storefront_products().filter(discount_price__isnull=False).exclude(discount_price=0).order_by('-updated_at')
+    )
+
+
+def build_top_rated_section():
+    return serialize_products(
+        storefront_products().filter(annotated_rating_count__gt=0).order_by(
+            models.F('annotated_average_rating').desc(), '-annotated_rating_count'
+        )
+    )
+
+
+# section name -> (builder, cache tags, media fields to absolutize on the way out, list of items?)
+# Product sections are not dropped on stock changes (invalidate_product_stock), their TTL bounds stock staleness.
+HOME_SECTIONS = {
+    'campaign': (build_campaign_section, ('campaign',), ('image',), False),
+    'context': (build_context_data, ('category', 'catalog'), (), False),
+    'categories': (build_categories_section, ('category',), ('image',), True),
+    'new_arrivals': (build_new_arrivals_section, (PRODUCTS_TAG,), ('thumbnail',), True),
+    'on_sale': (build_on_sale_section, (PRODUCTS_TAG,), ('thumbnail',), True),
+    'top_rated': (build_top_rated_section, (PRODUCTS_TAG,), ('thumbnail',), True),
+}
+
+
+def section_cache_key(name):
+    return HOME_SECTION_KEY.format(name)
+
+
+def section_ttl(name):
+    return getattr(settings, 'HOME_SECTION_TTLS', {}).get(name, DEFAULT_SECTION_TTL)
+
+
+def build_section(name):
+    builder = HOME_SECTIONS[name][0]
+    try:
+        return builder()
+    finally:
+        # Each worker thread gets its own DB connection, don't leak it.
+        connection.close()
+
+
+def load_home_sections():
+    """
+    Every section is cached on its own; on a miss the missing sections are built concurrently.
+    """
+    keys = {section_cache_key(name): name for name in HOME_SECTIONS}
+    sections = {keys[key]: value for key, value in tiered_cache.get_many(list(keys)).items()}
+    missing = [name for name in HOME_SECTIONS if name not in sections]
+
+    if missing:
+        versions = tiered_cache.tag_versions({tag for name in missing for tag in HOME_SECTIONS[name][1]})
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            built = dict(zip(missing, executor.map(build_section, missing)))
+        for name, value in built.items():
+            tiered_cache.set(section_cache_key(name), value, timeout=section_ttl(name), tags=HOME_SECTIONS[name][1],
+                             versions=versions)
+        sections.update(built)
+    return sections
+
+
+def build_home(request):
+    sections = load_home_sections()
+    response = {}
+    for name, (_, _, media_fields, many) in HOME_SECTIONS.items():
+        value = sections.get(name)
+        if value and media_fields:
+            if many:
+                value = [absolutize_media(item, request, media_fields) for item in value]
+            else:
+                value = absolutize_media(value, request, media_fields)
+        response[name] = value
+    return response
@@ -84,11 +84,29 @@ class Tag(models.Model):
         super(Tag, self).save(*args, **kwargs)
 
 
+class ProductQuerySet(models.QuerySet):
+    def with_listing_data(self):
+        """
+        Load everything ProductSerializer reads in a fixed number of queries,
+        regardless of how many products are in the queryset.
+        """
+        return self.annotate(
+            annotated_average_rating=models.Avg('reviews__rating'),
+            annotated_rating_count=models.Count('reviews'),
+        ).prefetch_related(
+            'images',
+            'tags',
+            models.Prefetch('skus', queryset=SKU.objects.prefetch_related('variants')),
+        )
+
+
 class Product(models.Model):
     name = models.CharField(max_length=255)
     base_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     stock_quantity = models.PositiveIntegerField(null=True, blank=True)
     has_variants = models.BooleanField(default=False)
+    weight = models.DecimalField(max_digits=8, decimal_places=3, null=True, blank=True,
+                                 validators=[MinValueValidator(0)], help_text="Shipping weight in kg.")
     short_description = models.TextField(blank=True, null=True)
     discount_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     category = models.ForeignKey(Category, related_name='products', on_delete=models.SET_NULL, null=True, blank=True)
@@ -108,6 +126,7 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False)
 
+    objects = ProductQuerySet.as_manager()
 
     @property
     def get_price(self):
@@ -115,6 +134,8 @@ class Product(models.Model):
 
     @property
     def average_rating(self):
+        if hasattr(self, 'annotated_average_rating'):
+            return self.annotated_average_rating or 0
         reviews = self.reviews.all()
         if reviews.exists():
             return reviews.aggregate(models.Avg('rating'))['rating__avg']
@@ -122,6 +143,8 @@ class Product(models.Model):
 
     @property
     def rating_count(self):
+        if hasattr(self, 'annotated_rating_count'):
+            return self.annotated_rating_count
         return self.reviews.count()
 
     def is_in_stock(self):
@@ -198,7 +221,7 @@ class SKU(models.Model):
     def variants_dict(self):
         variants_dict = {}
         for variant in self.variants.all():
-            variants_dict[variant.attribute.id] = variant.id
+            variants_dict[variant.attribute_id] = variant.id
         return variants_dict
 
 
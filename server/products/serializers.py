@@ -175,7 +175,7 @@ class ProductSerializer(serializers.ModelSerializer):
             'id', 'name', 'base_price', 'stock_quantity', 'has_variants', 'short_description',
             'discount_price', 'category', 'key_features', 'description', 'additional_info', 'thumbnail',
             'brand', 'tags', 'created_at', 'updated_at', 'is_active', 'is_deleted', 'images', 'skus', 'average_rating',
-            'rating_count'
+            'rating_count', 'weight'
         ]
         read_only_fields = ['created_at', 'updated_at','has_variants']
 
@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
+
+from core.Utiilties.cache import invalidate_on_change, tiered_cache
+from products.cache import invalidate_products, product_tag, PRODUCTS_TAG
+from products.models import Category, Brand, Tag, VariantAttribute, VariantValue, Product, ProductImage, SKU
+from products.review.models import Review
+
+invalidate_on_change(Category, lambda instance: ['category'])
+invalidate_on_change(Brand, lambda instance: ['catalog'])
+invalidate_on_change(VariantAttribute, lambda instance: ['catalog'])
+invalidate_on_change(VariantValue, lambda instance: ['catalog'])
+
+invalidate_on_change(Product, lambda instance: [PRODUCTS_TAG, product_tag(instance.pk)])
+invalidate_on_change(SKU, lambda instance: [PRODUCTS_TAG, product_tag(instance.product_id)])
+invalidate_on_change(ProductImage, lambda instance: [PRODUCTS_TAG, product_tag(instance.product_id)])
+invalidate_on_change(Review, lambda instance: [PRODUCTS_TAG, product_tag(instance.product_id)])
+
+
+def tag_cache_tags(instance):
+    # product responses nest their tags (TagSerializer)
+    return ['catalog', PRODUCTS_TAG, *(product_tag(pk) for pk in instance.products.values_list('id', flat=True))]
+
+
+invalidate_on_change(Tag, tag_cache_tags)
+
+
+@receiver(pre_delete, sender=Tag)
+def invalidate_deleted_tag_products(sender, instance, **kwargs):
+    # by post_delete the tag's product links are already gone
+    tags = tag_cache_tags(instance)
+    tiered_cache.invalidate_tags(*tags)
+    transaction.on_commit(lambda: tiered_cache.invalidate_tags(*tags))
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def invalidate_product_tags_cache(sender, instance, reverse, pk_set, **kwargs):
+    if reverse:
+        invalidate_products(*(pk_set or instance.products.values_list('id', flat=True)))
+    else:
+        invalidate_products(instance.pk)
+
+
+@receiver(m2m_changed, sender=SKU.variants.through)
+def invalidate_sku_variants_cache(sender, instance, reverse, **kwargs):
+    if not reverse:
+        invalidate_products(instance.product_id)
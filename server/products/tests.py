@@ -1,3 +1,49 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from core.Utiilties.cache import tiered_cache
+from .cache import PRODUCTS_TAG, product_tag, invalidate_products, invalidate_product_stock
+from .models import Category, Product, Tag
+
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'products-tests'}}
+
+
+@override_settings(CACHES=CACHES)
+class ProductCacheInvalidationTestCase(TestCase):
+    def setUp(self):
+        tiered_cache.set('listing', 'listing', tags=[PRODUCTS_TAG])
+        tiered_cache.set('product', 'product', tags=[product_tag(1)])
+
+    def tearDown(self):
+        tiered_cache.clear_local()
+        tiered_cache.shared.clear()
+
+    def test_stock_changes_keep_listings(self):
+        invalidate_product_stock(1)
+        self.assertEqual(tiered_cache.get_many(['listing', 'product']), {'listing': 'listing'})
+
+    def test_product_edits_drop_listings(self):
+        invalidate_products(1)
+        self.assertEqual(tiered_cache.get_many(['listing', 'product']), {})
+
+
+@override_settings(CACHES=CACHES)
+class TagInvalidationTestCase(TestCase):
+    def setUp(self):
+        category = Category.objects.create(label='Shirts')
+        self.tag = Tag.objects.create(name='Summer')
+        self.product = Product.objects.create(name='Shirt', base_price=100, stock_quantity=10, category=category)
+        self.product.tags.add(self.tag)
+        tiered_cache.set('product', 'product', tags=[product_tag(self.product.id)])
+
+    def tearDown(self):
+        tiered_cache.clear_local()
+        tiered_cache.shared.clear()
+
+    def test_renaming_a_tag_drops_its_products(self):
+        self.tag.name = 'Winter'
+        self.tag.save()
+        self.assertIsNone(tiered_cache.get('product'))
+
+    def test_deleting_a_tag_drops_its_products(self):
+        self.tag.delete()
+        self.assertIsNone(tiered_cache.get('product'))
@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     ProductViewSet, CategoryViewSet,
-    BrandViewSet, TagViewSet, VariantViewSet, context
+    BrandViewSet, TagViewSet, VariantViewSet, context, home
 )
 
 # Create a router and register the viewsets
@@ -18,4 +18,5 @@ router.register('variants', VariantViewSet, basename='variant')
 urlpatterns = [
     path('', include(router.urls)),
     path('context/',context),
+    path('home/', home),
 ]
\ No newline at end of file
@@ -1,25 +1,62 @@
+from django.conf import settings
+from rest_framework.exceptions import NotFound
 from rest_framework.viewsets import ModelViewSet
 from rest_framework import status
 from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 
+from core.Utiilties.cache import cache_compressed_page, CacheResponseMixin
 from core.Utiilties.permission_chacker import has_permissions, HasPermissionMixin
 from core.Utiilties.enum import PermissionEnum
-from order.models import OrderStatusChoices, PaymentStatusChoices, DiscountTypeChoices
+from .cache import get_cached_products, cache_products, product_tag_versions, absolutize_media
+from .home import build_context_data, build_home
 from .models import Product, ProductImage, SKU, Category, Brand, Tag, VariantAttribute
 from .review.models import Review
 from .review.serializers import ReviewSerializer
 from .serializers import (
     ProductSerializer, ProductImageSerializer, SKUSerializer, CategorySerializer,
-    BrandSerializer, TagSerializer, VariantSerializer, FlatCategorySerializer
+    BrandSerializer, TagSerializer, VariantSerializer
 )
 
+CONTEXT_CACHE_KEY = 'products:context'
+
 
 # Product ViewSet
 class ProductViewSet(ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
 
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve', 'batch'):
+            return Product.objects.with_listing_data()
+        return super().get_queryset()
+
+    def load_products(self, product_ids):
+        """
+        Serialized products by id, served from the product cache and loaded in one
+        prefetched query for whatever is missing.
+        """
+        products_data = get_cached_products(product_ids)
+        missing_ids = [product_id for product_id in product_ids if product_id not in products_data]
+        if missing_ids:
+            versions = product_tag_versions(missing_ids)
+            products = self.get_queryset().filter(id__in=missing_ids)
+            loaded = {item['id']: item for item in ProductSerializer(products, many=True).data}
+            cache_products(loaded, versions)
+            products_data.update(loaded)
+        return products_data
+
+    def retrieve(self, request, pk=None, *args, **kwargs):
+        try:
+            product_id = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound()
+
+        products_data = self.load_products([product_id])
+        if product_id not in products_data:
+            raise NotFound()
+        return Response(absolutize_media(products_data[product_id], request))
+
     @has_permissions(PermissionEnum.product_create)
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
@@ -32,6 +69,38 @@ class ProductViewSet(ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
 
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        raw_ids = request.query_params.get('ids', '')
+        try:
+            product_ids = list(dict.fromkeys(int(value) for value in raw_ids.split(',') if value.strip()))
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid product ID format. Please provide numbers separated by commas.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if not product_ids:
+            return Response({
+                'status': 'error',
+                'message': 'No product IDs provided'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        max_ids = getattr(settings, 'PRODUCT_BATCH_MAX_IDS', 300)
+        if len(product_ids) > max_ids:
+            return Response({
+                'status': 'error',
+                'message': f'At most {max_ids} products can be fetched at once'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        products_data = self.load_products(product_ids)
+        return Response({
+            'message': 'Products retrieved successfully',
+            'data': [absolutize_media(products_data[product_id], request)
+                     for product_id in product_ids if product_id in products_data],
+            'missing': [product_id for product_id in product_ids if product_id not in products_data],
+        })
+
     @action(detail=True, methods=['get', 'post'], url_name='images')
     @has_permissions(
         method_permissions={
@@ -403,9 +472,10 @@ class ProductViewSet(ModelViewSet):
 #             'POST':PermissionEnum.category_create
 #         }
 #     )
-class CategoryViewSet(HasPermissionMixin, ModelViewSet):
+class CategoryViewSet(HasPermissionMixin, CacheResponseMixin, ModelViewSet):
     # queryset = Category.objects.filter(parent=None).all()
     serializer_class = CategorySerializer
+    cache_tags = ('category',)
 
     method_permissions = {
         'PUT': PermissionEnum.category_update,
@@ -424,9 +494,10 @@ class CategoryViewSet(HasPermissionMixin, ModelViewSet):
 
 # Brand ViewSet
 
-class BrandViewSet(HasPermissionMixin, ModelViewSet):
+class BrandViewSet(HasPermissionMixin, CacheResponseMixin, ModelViewSet):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
+    cache_tags = ('catalog',)
 
     method_permissions = {
         'PUT': PermissionEnum.brand_update,
@@ -436,9 +507,10 @@ class BrandViewSet(HasPermissionMixin, ModelViewSet):
 
 
 # Tag ViewSet
-class TagViewSet(HasPermissionMixin, ModelViewSet):
+class TagViewSet(HasPermissionMixin, CacheResponseMixin, ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    cache_tags = ('catalog',)
     method_permissions = {
         'PUT': PermissionEnum.tag_update,
         'DELETE': PermissionEnum.tag_delete,
@@ -446,9 +518,10 @@ class TagViewSet(HasPermissionMixin, ModelViewSet):
     }
 
 # Variant ViewSet
-class VariantViewSet(HasPermissionMixin, ModelViewSet):
-    queryset = VariantAttribute.objects.all()
+class VariantViewSet(HasPermissionMixin, CacheResponseMixin, ModelViewSet):
+    queryset = VariantAttribute.objects.prefetch_related('values')
     serializer_class = VariantSerializer
+    cache_tags = ('catalog',)
     method_permissions = {
         'PUT': PermissionEnum.variant_update,
         'DELETE': PermissionEnum.variant_delete,
@@ -456,31 +529,16 @@ class VariantViewSet(HasPermissionMixin, ModelViewSet):
     }
 
 
+@cache_compressed_page(CONTEXT_CACHE_KEY, tags=('category', 'catalog'))
 @api_view(['GET'])
 def context(request):
     if request.method == 'GET':
-        categories = Category.objects.all()
-        category_serializer = FlatCategorySerializer(categories, many=True)
-        variants = VariantAttribute.objects.all()
-        variant_serializer = VariantSerializer(variants, many=True)
-
-        brands = Brand.objects.all()
-        brand_serializer = BrandSerializer(brands, many=True)
-        tags = Tag.objects.all()
-        tag_serializer = TagSerializer(tags, many=True)
-
-        return Response(
-            {'categories': category_serializer.data,
-             'variants': variant_serializer.data,
-             'brands': brand_serializer.data,
-             'tags': tag_serializer.data,
-             'order_status': text_choices_to_json(OrderStatusChoices),
-             'payment_status': text_choices_to_json(PaymentStatusChoices),
-             'voucher_type': text_choices_to_json(DiscountTypeChoices),
-             },
-            status=status.HTTP_200_OK)
+        return Response(build_context_data(), status=status.HTTP_200_OK)
     return None
 
 
-def text_choices_to_json(choices):
-    return [{"key": key, "value": value} for key, value in choices.choices]
\ No newline at end of file
+@api_view(['GET'])
+def home(request):
+    if request.method == 'GET':
+        return Response(build_home(request), status=status.HTTP_200_OK)
+    return None
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from datetime import timedelta
 from pathlib import Path
 import os
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -66,10 +67,14 @@ INSTALLED_APPS = [
     'products.review',
     
     'campaign',
+    'analytics',
+    'payment',
+    'fulfillment',
 ]
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'core.Utiilties.compression.CompressionMiddleware',
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -213,6 +218,8 @@ PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 STATIC_URL = 'static/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+# files only handed out by views that check permissions (fulfillment documents), never under MEDIA_URL
+PRIVATE_MEDIA_ROOT = os.path.join(BASE_DIR, 'private_media')
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 # SMTP Email Backend
@@ -252,8 +259,63 @@ CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 #     #     'schedule': timedelta(minutes=5)  # Run every 5 minutes
 #     # },
 # }
+CELERY_BEAT_SCHEDULE = {
+    'persist_dirty_carts': {
+        'task': 'persist_dirty_carts',
+        'schedule': timedelta(seconds=30),
+    },
+    # events are dispatched right after their commit, this catches what was missed or is due a retry
+    'dispatch_outbox_events': {
+        'task': 'dispatch_outbox_events',
+        'schedule': timedelta(seconds=15),
+    },
+    'update_sales_rollups': {
+        'task': 'update_sales_rollups',
+        'schedule': timedelta(minutes=5),
+    },
+    'export_order_lines': {
+        'task': 'export_order_lines',
+        'schedule': timedelta(hours=1),
+    },
+    # callbacks are processed right after they arrive, this catches what was missed or is due a retry
+    'process_payment_webhooks': {
+        'task': 'process_payment_webhooks',
+        'schedule': timedelta(seconds=15),
+    },
+    'compute_reorder_suggestions': {
+        'task': 'compute_reorder_suggestions',
+        'schedule': timedelta(days=1),
+    },
+}
 
 CACHE_TTL = 60 * 6 * 1
+
+# Tag-based L1 (in-process LRU) + L2 (CACHES['default']) cache, see core.Utiilties.cache
+TIERED_CACHE = {
+    'ALIAS': 'default',
+    'L1_MAX_ENTRIES': 2048,
+    'L1_TIMEOUT': 60 * 5,  # seconds an in-process entry is trusted without checking Redis
+    'L1_FALLBACK_TIMEOUT': 5,  # used instead while the invalidation bus is disconnected
+    'INVALIDATION_BUS': 'redis',  # 'redis' (pub/sub between workers), 'local' (tests) or None
+    'INVALIDATION_CHANNEL': 'cache:invalidation',
+}
+
+# Response compression (core.Utiilties.compression)
+COMPRESSION_MIN_SIZE = 1024  # bytes, smaller bodies are sent uncompressed
+COMPRESSION_BROTLI_QUALITY = 5
+COMPRESSION_MAX_RANDOM_BYTES = 100  # gzip length padding against BREACH, as in GZipMiddleware
+
+PRODUCT_BATCH_MAX_IDS = 300  # upper bound for /api/products/batch/?ids=
+
+# Cache lifetime (seconds) of every section of /api/home/
+HOME_SECTION_TTLS = {
+    'campaign': 60 * 5,
+    'context': 60 * 60,
+    'categories': 60 * 60,
+    'new_arrivals': 60 * 2,
+    'on_sale': 60 * 2,
+    'top_rated': 60 * 10,
+}
 CACHES = {
     'default': {
         'BACKEND': 'django_redis.cache.RedisCache',
@@ -273,3 +335,73 @@ SPECTACULAR_SETTINGS = {
     'SCHEMA_PATH_PREFIX': '/api/',
     'SCHEMA_COERCE_PATH_PK_SUFFIX': True,
 }
+
+# Cart storage (order.cart_store): RedisCartStore keeps hot carts in Redis, supports guest
+# carts (X-Cart-Token header) and writes user carts back to the database in the background.
+# Use 'order.cart_store.DatabaseCartStore' to keep carts in the database only.
+CART_STORE = {
+    'BACKEND': 'order.cart_store.RedisCartStore',
+    'ALIAS': 'default',
+    'USER_CART_TTL': 60 * 60 * 24 * 7,
+    'GUEST_CART_TTL': 60 * 60 * 24 * 30,
+}
+CORS_ALLOW_HEADERS = (*default_headers, 'x-cart-token', 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['X-Cart-Token', 'Idempotent-Replayed']
+
+# Idempotency-Key handling (core.Utiilties.idempotency), stored in CACHES[ALIAS]
+IDEMPOTENCY = {
+    'ALIAS': 'default',
+    'TTL': 60 * 60 * 24,  # seconds a response is replayed for the same key
+    'LOCK_TIMEOUT': 60,  # seconds before a lock of a crashed request expires
+    'WAIT_TIMEOUT': 10,  # seconds a concurrent duplicate waits before getting 409
+}
+
+VOUCHER_CACHE_TTL = 60 * 60  # compiled voucher rules by code (order.voucher_engine)
+ORDER_QUOTE_CACHE_TTL = 60 * 10  # /api/order/quote/ results per cart version
+ZONE_RULES_CACHE_TTL = 60 * 60 * 24  # shipping/tax rules by zone (order.shipping), dropped on rule changes
+
+# Transactional outbox (core.Utiilties.outbox)
+OUTBOX = {
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 10,
+    'RETRY_DELAY': 30,  # seconds, doubled after every failed attempt
+    'CLAIM_TIMEOUT': 300,  # seconds a dispatcher has to deliver what it claimed before others retry
+}
+
+# Parquet/Arrow datasets for BI (analytics.exports), needs pyarrow
+BI_EXPORT = {
+    'DIR': BASE_DIR / 'data' / 'exports',
+    'FORMAT': 'parquet',  # or 'arrow'
+    'CHUNK_SIZE': 50000,
+}
+
+# Demand forecasts and reorder suggestions (analytics.forecasting), needs numpy
+FORECAST = {
+    'HISTORY_DAYS': 56,
+    'METHOD': 'ema',  # exponential smoothing, or 'sma' for a moving average over SMA_DAYS
+    'ALPHA': 0.3,
+    'SMA_DAYS': 14,
+    'LEAD_TIME_DAYS': 7,
+    'REVIEW_DAYS': 7,
+    'SERVICE_Z': 1.65,
+}
+
+# Payment gateways and webhook processing (payment.processing)
+PAYMENT = {
+    'GATEWAYS': {},  # name -> dotted path of a payment.gateways.PaymentGateway
+    'DEFAULT_GATEWAY': None,
+    'CURRENCY': 'BDT',
+    'BATCH_SIZE': 200,
+    'MAX_ATTEMPTS': 10,
+    'KICK_DELAY': 2,  # seconds callbacks are collected before a worker run
+}
+if DEBUG:
+    # local stand-in for development and tests, its callbacks are signed with FAKE_GATEWAY_SECRET (no default)
+    PAYMENT['GATEWAYS']['fake'] = 'payment.gateways.FakeGateway'
+    PAYMENT['DEFAULT_GATEWAY'] = 'fake'
+    PAYMENT['FAKE_SECRET'] = os.getenv('FAKE_GATEWAY_SECRET')
+
+# Picking lists and packing slips (fulfillment.picking), the PDF needs reportlab
+FULFILLMENT = {
+    'WAVE_SIZE': 40,  # orders per wave, about one picking cart
+}
@@ -14,6 +14,9 @@ urlpatterns = [
                   # path('api/admin/', include('admin_panel.urls')),
                   path('api/auth/', include('core.urls')),
                   path('api/campaign/',include('campaign.urls')),
+                  path('api/analytics/', include('analytics.urls')),
+                  path('api/payment/', include('payment.urls')),
+                  path('api/fulfillment/', include('fulfillment.urls')),
 
                   path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
                   # Optional UI: